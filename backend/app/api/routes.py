@@ -1,5 +1,6 @@
 import random
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Request, Body
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect, Request, Body, Query, Response
+from fastapi.responses import StreamingResponse
 from fastapi.routing import APIRoute
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
@@ -7,11 +8,26 @@ from datetime import datetime
 import json
 import asyncio
 import websockets
+import websockets.exceptions
 import traceback
 
-from app.database import get_db
-from app.schemas import SimulationCreate, SimulationUpdate, SimulationResponse, SimulationList
+from app.config import settings
+from app.database import run_db
+from app.schemas import SimulationCreate, SimulationUpdate, SimulationResponse, SimulationList, BatchRunRequest, BatchRunResponse, SweepRequest, SweepResponse
 from app.services.simulation_service import SimulationService
+from app.services.batch_service import BatchRunService, summarize_runs
+from app.services.sweep_service import SweepService, FINISHED_STATUSES, expand_cells, load_sweep, list_sweeps
+from app.services.tick_scheduler import TickScheduler
+from app.services.simulation_recorder import SimulationRecorder, load_agent_keys
+from app.services.persistence_writer import PersistenceWriter
+from app.services.state_stream import PROTOCOLS, PROTOCOL_FULL, PROTOCOL_DELTA
+from app.services.simulation_listing import SimulationCountCache, list_simulations, parse_fields
+from app.services.snapshot_store import reconstruct_snapshot, attach_history
+from app.services.replay_service import load_replay
+from app.services.downsampling import METHODS, METHOD_LTTB
+from app.services.export_service import DATASETS, FORMATS, FORMAT_CSV, MEDIA_TYPES, stream_export
+from app.services.metrics import CONTENT_TYPE, FRAMES_SENT, BYTES_SENT, PhaseTimer, profiler, registry
+from app.services.frame_codec import ENCODINGS, ENCODING_JSON, ENCODING_BINARY, PRECISIONS, PRECISION_F32, binary_format
 from app.models.db_models import Simulation, Agent, AgentPosition, SimulationSnapshot
 
 import logging
@@ -24,68 +40,140 @@ class AllowAllMethodsRoute(APIRoute):
 
 # 首先创建 router 对象
 router = APIRouter(route_class=AllowAllMethodsRoute)
-simulation_service = SimulationService()
+# 不带版本前缀的运维接口（/api/metrics）
+metrics_router = APIRouter()
+persistence_writer = PersistenceWriter()
+simulation_service = SimulationService(persistence_writer, profiler)
+batch_run_service = BatchRunService()
+sweep_service = SweepService()
+tick_scheduler = TickScheduler(simulation_service, SimulationRecorder(persistence_writer))
+simulation_count_cache = SimulationCountCache(settings.SIMULATION_COUNT_CACHE_TTL)
 
-# 获取所有模拟列表
-@router.get("/simulations/", response_model=List[SimulationList])
-def get_simulations(db: Session = Depends(get_db)):
-    """获取所有模拟列表"""
+registry.callback("crowdsensing_dropped_ticks_total", "counter",
+                  "Ticks skipped because a simulation fell too far behind", lambda: tick_scheduler.dropped_ticks)
+registry.callback("crowdsensing_running_simulations", "gauge",
+                  "Simulations currently advanced by the tick scheduler", lambda: len(tick_scheduler.tasks))
+registry.callback("crowdsensing_websocket_subscribers", "gauge", "Open WebSocket subscriptions",
+                  lambda: sum(len(queues) for queues in tick_scheduler.subscribers.values()))
+registry.callback("crowdsensing_db_rows_dropped_total", "counter",
+                  "Rows dropped by the persistence writer", lambda: persistence_writer.dropped_rows)
+registry.callback("crowdsensing_persistence_queue_depth", "gauge",
+                  "Items waiting in the persistence writer queue", lambda: persistence_writer.queue.qsize())
+
+def _load_simulation(db: Session, simulation_id: int) -> Optional[Dict]:
+    """读取模拟记录，不存在时返回None"""
+    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    return simulation.to_dict() if simulation else None
+
+async def _rehydrate_simulation(simulation_id: int, simulation: Dict) -> Dict:
+    """按数据库记录在服务中重建模拟，并加载智能体主键映射"""
+    config = {
+        "environment_size": simulation["environment_size"],
+        "num_hunters": simulation["num_hunters"],
+        "num_targets": simulation["num_targets"],
+        "algorithm_type": simulation["algorithm_type"],
+        "max_steps": simulation["max_steps"],
+        "trail_length": simulation.get("trail_length"),
+        "seed": simulation.get("seed")
+    }
+    sim_data = simulation_service.create_simulation(simulation_id, config)
+    simulation_service.set_agent_keys(simulation_id, await run_db(load_agent_keys, simulation_id))
+    return sim_data
+
+# 获取模拟列表
+@router.get("/simulations/", response_model=List[Dict[str, Any]])
+async def get_simulations(
+    response: Response,
+    limit: int = Query(settings.SIMULATION_LIST_DEFAULT_LIMIT, ge=1, le=settings.SIMULATION_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    algorithm_type: Optional[str] = None,
+    is_captured: Optional[bool] = None,
+    escaped: Optional[bool] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    fields: Optional[str] = Query(None, description="逗号分隔的列名，默认返回列表的基本列")
+):
+    """
+    获取模拟列表（按创建时间倒序，键集分页）
+
+    响应体仍是记录数组；下一页游标放在响应头 X-Next-Cursor（没有更多时不返回），
+    满足过滤条件的总数放在 X-Total-Count（缓存的计数，可能略有滞后）
+    """
     try:
-        simulations = db.query(Simulation).all()
-        logger.info(f"成功获取{len(simulations)}个模拟")
-        return simulations
+        selected = parse_fields(fields)
+        simulations, next_cursor, total = await run_db(
+            list_simulations, simulation_count_cache, limit, cursor, selected,
+            algorithm_type=algorithm_type, is_captured=is_captured, escaped=escaped,
+            created_after=created_after, created_before=created_before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取模拟列表失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取模拟列表失败: {str(e)}")
+    
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["X-Total-Count"] = str(total)
+    logger.info(f"成功获取{len(simulations)}个模拟")
+    return simulations
 
 # 创建新模拟
 @router.post("/simulations/", response_model=SimulationResponse, status_code=201)
-def create_simulation(simulation_create: SimulationCreate, db: Session = Depends(get_db)):
+async def create_simulation(simulation_create: SimulationCreate):
     """创建新的模拟"""
     try:
         logger.info(f"创建新模拟: {simulation_create.name}")
-        # 创建新模拟记录
-        db_simulation = Simulation(
-            name=simulation_create.name,
-            description=simulation_create.description,
-            environment_size=simulation_create.environment_size,
-            num_hunters=simulation_create.num_hunters,
-            num_targets=simulation_create.num_targets,
-            algorithm_type=simulation_create.algorithm_type,
-            max_steps=simulation_create.max_steps,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
+        
+        def insert_simulation(db):
+            # 创建新模拟记录
+            db_simulation = Simulation(
+                name=simulation_create.name,
+                description=simulation_create.description,
+                environment_size=simulation_create.environment_size,
+                num_hunters=simulation_create.num_hunters,
+                num_targets=simulation_create.num_targets,
+                algorithm_type=simulation_create.algorithm_type,
+                max_steps=simulation_create.max_steps,
+                seed=simulation_create.seed,
+                trail_length=simulation_create.trail_length,
+                created_at=datetime.utcnow(),
+                updated_at=datetime.utcnow()
+            )
+            db.add(db_simulation)
+            db.commit()
+            db.refresh(db_simulation)
+            return db_simulation.to_dict()
         
         # 先保存数据库记录
-        db.add(db_simulation)
-        db.commit()
-        db.refresh(db_simulation)
+        db_simulation = await run_db(insert_simulation)
+        simulation_count_cache.invalidate()
+        simulation_id = db_simulation["id"]
         
         # 构建配置对象
         config = {
-            "environment_size": db_simulation.environment_size,
-            "num_hunters": db_simulation.num_hunters,
-            "num_targets": db_simulation.num_targets,
-            "algorithm_type": db_simulation.algorithm_type,
-            "max_steps": db_simulation.max_steps
+            "environment_size": db_simulation["environment_size"],
+            "num_hunters": db_simulation["num_hunters"],
+            "num_targets": db_simulation["num_targets"],
+            "algorithm_type": db_simulation["algorithm_type"],
+            "max_steps": db_simulation["max_steps"],
+            "trail_length": db_simulation["trail_length"],
+            "seed": simulation_create.seed
         }
         
         # 调用服务创建模拟
         try:
-            sim_data = simulation_service.create_simulation(db_simulation.id, config)
+            sim_data = simulation_service.create_simulation(simulation_id, config)
         except Exception as service_error:
             logger.error(f"调用模拟服务失败: {str(service_error)}")
-            db.delete(db_simulation)
-            db.commit()
+            await run_db(_delete_simulation_record, simulation_id)
             raise service_error
         
-        # 保存智能体记录
-        try:
+        def insert_agents(db):
+            agents = []
             # 创建猎手记录
             for hunter in sim_data["hunters"]:
                 hunter_agent = Agent(
-                    simulation_id=db_simulation.id,
+                    simulation_id=simulation_id,
                     agent_id=hunter["id"],
                     type="hunter",
                     start_position_x=hunter["position"][0],
@@ -95,11 +183,12 @@ def create_simulation(simulation_create: SimulationCreate, db: Session = Depends
                     communication_range=hunter["communication_range"]
                 )
                 db.add(hunter_agent)
+                agents.append(hunter_agent)
             
             # 创建目标记录
             for target in sim_data["targets"]:
                 target_agent = Agent(
-                    simulation_id=db_simulation.id,
+                    simulation_id=simulation_id,
                     agent_id=target["id"],
                     type="target",
                     start_position_x=target["position"][0],
@@ -109,84 +198,110 @@ def create_simulation(simulation_create: SimulationCreate, db: Session = Depends
                     communication_range=0
                 )
                 db.add(target_agent)
+                agents.append(target_agent)
+            
+            # 未指定种子时保存服务生成的种子，以便复现
+            if db_simulation["seed"] is None:
+                db.query(Simulation).filter(Simulation.id == simulation_id).update({"seed": sim_data["seed"]})
+            
+            # 写入后即可取得主键，作为映射供位置记录使用
+            db.flush()
+            agent_keys = {(agent.type, agent.agent_id): agent.id for agent in agents}
             
             # 提交事务
             db.commit()
-            
+            return agent_keys
+        
+        # 保存智能体记录
+        try:
+            simulation_service.set_agent_keys(simulation_id, await run_db(insert_agents))
         except Exception as agent_error:
             logger.error(f"创建智能体记录失败: {str(agent_error)}")
-            db.rollback()
             # 尝试清理服务中的模拟
             try:
-                simulation_service.delete_simulation(db_simulation.id)
+                simulation_service.delete_simulation(simulation_id)
             except:
                 pass
             raise agent_error
         
         # 记录成功并返回结果
-        logger.info(f"模拟创建成功，ID: {db_simulation.id}")
-        result_dict = db_simulation.to_dict()
+        logger.info(f"模拟创建成功，ID: {simulation_id}")
+        result_dict = dict(db_simulation)
         result_dict.update(sim_data)
         return result_dict
         
     except Exception as e:
-        db.rollback()
         logger.error(f"创建模拟失败: {str(e)}")
         # 添加详细的堆栈跟踪以便更好地诊断
         import traceback
         logger.error(f"错误详情: {traceback.format_exc()}")
         raise HTTPException(status_code=500, detail=f"创建模拟失败: {str(e)}")
 
+# 无头批量运行
+@router.post("/simulations/batch-run", response_model=BatchRunResponse)
+async def batch_run(request: BatchRunRequest):
+    """不经WebSocket节奏，在进程池中全速重复运行同一配置"""
+    config = request.model_dump(exclude={"repetitions", "max_workers"})
+    try:
+        runs = await batch_run_service.run_async(config, request.repetitions, request.max_workers)
+        return {"config": config, "summary": summarize_runs(runs), "runs": runs}
+    except Exception as e:
+        logger.error(f"批量运行失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"批量运行失败: {str(e)}")
+
 # 获取单个模拟详情
 @router.get("/simulations/{simulation_id}", response_model=SimulationResponse)
-def get_simulation(simulation_id: int, db: Session = Depends(get_db)):
+async def get_simulation(simulation_id: int):
     """获取单个模拟详情"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    simulation = await run_db(_load_simulation, simulation_id)
     if not simulation:
         raise HTTPException(status_code=404, detail="模拟不存在")
     
     try:
         # 获取模拟数据
         sim_data = simulation_service.get_simulation(simulation_id)
-        return {**simulation.to_dict(), **sim_data}
+        return {**simulation, **sim_data}
     except ValueError:
         # 如果服务中没有该模拟，创建一个
-        config = {
-            "environment_size": simulation.environment_size,
-            "num_hunters": simulation.num_hunters,
-            "num_targets": simulation.num_targets,
-            "algorithm_type": simulation.algorithm_type,
-            "max_steps": simulation.max_steps
-        }
-        sim_data = simulation_service.create_simulation(simulation_id, config)
-        return {**simulation.to_dict(), **sim_data}
+        sim_data = await _rehydrate_simulation(simulation_id, simulation)
+        return {**simulation, **sim_data}
+
+def _update_simulation_record(db: Session, simulation_id: int, **fields) -> Optional[Dict]:
+    """更新模拟记录的字段，不存在时返回None"""
+    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    if not simulation:
+        return None
+    for key, value in fields.items():
+        setattr(simulation, key, value)
+    db.commit()
+    return simulation.to_dict()
 
 # 启动模拟
 @router.post("/simulations/{simulation_id}/start")
-def start_simulation(simulation_id: int, db: Session = Depends(get_db)):
+async def start_simulation(simulation_id: int):
     """启动模拟"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    try:
+        # 设置开始时间
+        simulation = await run_db(_update_simulation_record, simulation_id, start_time=datetime.utcnow())
+    except Exception as e:
+        logger.error(f"启动模拟失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"启动模拟失败: {str(e)}")
     if not simulation:
         raise HTTPException(status_code=404, detail="模拟不存在")
     
     try:
-        # 设置开始时间
-        simulation.start_time = datetime.utcnow()
-        db.commit()
-        
         # 启动模拟
         logger.info(f"启动模拟 ID: {simulation_id}")
         return simulation_service.start_simulation(simulation_id)
     except Exception as e:
-        db.rollback()
         logger.error(f"启动模拟失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"启动模拟失败: {str(e)}")
 
 # 停止模拟
 @router.post("/simulations/{simulation_id}/stop")
-def stop_simulation(simulation_id: int, db: Session = Depends(get_db)):
+async def stop_simulation(simulation_id: int):
     """停止模拟"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    simulation = await run_db(_load_simulation, simulation_id)
     if not simulation:
         raise HTTPException(status_code=404, detail="模拟不存在")
     
@@ -194,70 +309,103 @@ def stop_simulation(simulation_id: int, db: Session = Depends(get_db)):
         logger.info(f"停止模拟 ID: {simulation_id}")
         result = simulation_service.stop_simulation(simulation_id)
         
-        # 更新数据库状态
-        if result["is_captured"] and not simulation.end_time:
-            simulation.end_time = datetime.utcnow()
-            simulation.is_captured = True
-            simulation.capture_time = (simulation.end_time - simulation.start_time).total_seconds() if simulation.start_time else None
+        def update_capture(db):
+            # 更新数据库状态
+            simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+            if simulation and result["is_captured"] and not simulation.end_time:
+                simulation.end_time = datetime.utcnow()
+                simulation.is_captured = True
+                simulation.capture_time = (simulation.end_time - simulation.start_time).total_seconds() if simulation.start_time else None
+                db.commit()
         
-        db.commit()
+        await run_db(update_capture)
         return result
     except Exception as e:
-        db.rollback()
         logger.error(f"停止模拟失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"停止模拟失败: {str(e)}")
 
 # 重置模拟
 @router.post("/simulations/{simulation_id}/reset")
-def reset_simulation(simulation_id: int, db: Session = Depends(get_db)):
+async def reset_simulation(simulation_id: int):
     """重置模拟"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    try:
+        # 重置模拟状态
+        simulation = await run_db(_update_simulation_record, simulation_id, step_count=0, is_captured=False,
+                                  start_time=None, end_time=None, capture_time=None)
+    except Exception as e:
+        logger.error(f"重置模拟失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"重置模拟失败: {str(e)}")
     if not simulation:
         raise HTTPException(status_code=404, detail="模拟不存在")
     
     try:
-        # 重置模拟状态
-        simulation.step_count = 0
-        simulation.is_captured = False
-        simulation.start_time = None
-        simulation.end_time = None
-        simulation.capture_time = None
-        db.commit()
-        
         # 重置模拟服务
         logger.info(f"重置模拟 ID: {simulation_id}")
-        return simulation_service.reset_simulation(simulation_id)
+        result = simulation_service.reset_simulation(simulation_id)
+        tick_scheduler.recorder.reset(simulation_id)
+        return result
     except Exception as e:
-        db.rollback()
         logger.error(f"重置模拟失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"重置模拟失败: {str(e)}")
 
+def _delete_simulation_record(db: Session, simulation_id: int) -> bool:
+    """删除模拟记录（级联删除智能体、快照和轨迹），不存在时返回False"""
+    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    if not simulation:
+        return False
+    db.delete(simulation)
+    db.commit()
+    return True
+
 # 删除模拟
 @router.delete("/simulations/{simulation_id}")
-def delete_simulation(simulation_id: int, db: Session = Depends(get_db)):
+async def delete_simulation(simulation_id: int):
     """删除模拟"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
-    if not simulation:
-        raise HTTPException(status_code=404, detail="模拟不存在")
-    
     try:
         # 从数据库删除模拟
-        db.delete(simulation)
-        db.commit()
-        
-        # 从服务中删除模拟
-        logger.info(f"删除模拟 ID: {simulation_id}")
-        simulation_service.delete_simulation(simulation_id)
-        
-        return {"message": "模拟已成功删除"}
+        deleted = await run_db(_delete_simulation_record, simulation_id)
     except Exception as e:
-        db.rollback()
         logger.error(f"删除模拟失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"删除模拟失败: {str(e)}")
+    if not deleted:
+        raise HTTPException(status_code=404, detail="模拟不存在")
+    
+    simulation_count_cache.invalidate()
+    
+    # 从服务中删除模拟
+    logger.info(f"删除模拟 ID: {simulation_id}")
+    simulation_service.delete_simulation(simulation_id)
+    tick_scheduler.recorder.forget(simulation_id)
+    
+    return {"message": "模拟已成功删除"}
+
+async def _send_frame(websocket: WebSocket, message, protocol: str, timer: Optional[PhaseTimer] = None):
+    """发送一条消息并计入帧数和字节数；JSON消息按 send_json 的方式编码"""
+    if isinstance(message, bytes):
+        payload = message
+        await websocket.send_bytes(message)
+    else:
+        text = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        payload = text.encode("utf-8")
+        if timer is not None:
+            timer.mark("encode")
+        await websocket.send_text(text)
+    if timer is not None:
+        timer.mark("send")
+    FRAMES_SENT.inc(1, protocol)
+    BYTES_SENT.inc(len(payload), protocol)
 
 # WebSocket连接以获取实时模拟更新
 @router.websocket("/ws/simulations/{simulation_id}")
-async def websocket_endpoint(websocket: WebSocket, simulation_id: int, db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket, simulation_id: int, protocol: str = PROTOCOL_FULL,
+                             encoding: str = ENCODING_JSON, precision: str = PRECISION_F32):
+    """
+    实时模拟状态推送
+
+    protocol=full（默认）每步发送完整状态；protocol=delta 使用关键帧+增量帧协议，
+    详见 app.services.state_stream。encoding=binary 时增量帧的位置以二进制帧发送
+    （隐含protocol=delta），precision 可选 f32 或 q16，详见 app.services.frame_codec
+    """
     client_id = f"{id(websocket)}_{simulation_id}"
     
     try:
@@ -265,8 +413,20 @@ async def websocket_endpoint(websocket: WebSocket, simulation_id: int, db: Sessi
         await websocket.accept()
         logger.info(f"WebSocket客户端 {client_id} 已连接到模拟 {simulation_id}")
         
+        if protocol not in PROTOCOLS or encoding not in ENCODINGS or precision not in PRECISIONS:
+            await websocket.send_json({"error": f"不支持的协议: {protocol}/{encoding}/{precision}"})
+            await websocket.close(code=1003, reason="Unsupported protocol")
+            return
+        
+        # 二进制编码只用于增量协议
+        if encoding == ENCODING_BINARY:
+            protocol = PROTOCOL_DELTA
+            subscription = binary_format(precision)
+        else:
+            subscription = protocol
+        
         # 2. 验证模拟存在性
-        db_simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+        db_simulation = await run_db(_load_simulation, simulation_id)
         if not db_simulation:
             logger.warning(f"客户端 {client_id} 尝试连接不存在的模拟 {simulation_id}")
             await websocket.send_json({"error": "模拟不存在"})
@@ -281,17 +441,12 @@ async def websocket_endpoint(websocket: WebSocket, simulation_id: int, db: Sessi
             except ValueError:
                 # 如果不存在则创建新模拟
                 logger.info(f"模拟 {simulation_id} 在服务中不存在，尝试创建")
-                config = {
-                    "environment_size": db_simulation.environment_size,
-                    "num_hunters": db_simulation.num_hunters,
-                    "num_targets": db_simulation.num_targets,
-                    "algorithm_type": db_simulation.algorithm_type,
-                    "max_steps": db_simulation.max_steps
-                }
-                initial_data = simulation_service.create_simulation(simulation_id, config)
+                initial_data = await _rehydrate_simulation(simulation_id, db_simulation)
             
-            # 发送初始数据
-            await websocket.send_json(initial_data)
+            # 发送初始数据（增量协议发送关键帧）
+            if protocol == PROTOCOL_DELTA:
+                initial_data = tick_scheduler.keyframe(simulation_id)
+            await _send_frame(websocket, initial_data, subscription)
             logger.info(f"已发送模拟 {simulation_id} 的初始状态给客户端 {client_id}")
         except Exception as e:
             logger.error(f"准备初始数据失败: {str(e)}")
@@ -299,179 +454,44 @@ async def websocket_endpoint(websocket: WebSocket, simulation_id: int, db: Sessi
             await websocket.close(code=1011)
             return
         
-        # 4. 主循环处理逻辑
-        position_records_buffer = []
-        last_db_commit_time = datetime.utcnow()
-        batch_size = 50
-        update_frequency = 0.1  # 更新频率(秒)
-        
-        while True:
-            try:
-                # 获取模拟状态
-                sim_data = simulation_service.get_simulation(simulation_id)
-                
-                if sim_data["is_running"]:
-                    # 前进一步
-                    # 添加详细错误捕获
-                    try:
-                        # 前进一步
-                        sim_data = await simulation_service.step_simulation(simulation_id)
-                    except Exception as step_error:
-                        logger.error(f"步进模拟时出错: {str(step_error)}")
-                        import traceback
-                        logger.error(traceback.format_exc())
-                        # 发送错误信息到前端
-                        await websocket.send_json({
-                            "error": f"模拟步进失败: {str(step_error)}",
-                            "id": simulation_id,
-                            "is_running": False
-                        })
-                        # 停止模拟，避免继续尝试
-                        try:
-                            simulation_service.stop_simulation(simulation_id)
-                        except:
-                            pass
-                        continue
-                    
-                    # 更新数据库状态 (每10步更新一次)
-                    if sim_data["step_count"] % 10 == 0:
-                        try:
-                            # 创建快照
-                            snapshot = SimulationSnapshot(
-                                simulation_id=simulation_id,
-                                step=sim_data["step_count"],
-                                hunters_state=json.dumps([h for h in sim_data["hunters"]]),
-                                targets_state=json.dumps([t for t in sim_data["targets"]])
-                            )
-                            db.add(snapshot)
-                            
-                            # 收集位置记录
-                            for hunter in sim_data["hunters"]:
-                                agent_id = db.query(Agent.id).filter(
-                                    Agent.simulation_id == simulation_id,
-                                    Agent.agent_id == hunter["id"],
-                                    Agent.type == "hunter"
-                                ).scalar()
-                                
-                                if agent_id:
-                                    position_records_buffer.append({
-                                        "agent_id": agent_id,
-                                        "step": sim_data["step_count"],
-                                        "position_x": hunter["position"][0],
-                                        "position_y": hunter["position"][1]
-                                    })
-                            
-                            for target in sim_data["targets"]:
-                                agent_id = db.query(Agent.id).filter(
-                                    Agent.simulation_id == simulation_id,
-                                    Agent.agent_id == target["id"],
-                                    Agent.type == "target"
-                                ).scalar()
-                                
-                                if agent_id:
-                                    position_records_buffer.append({
-                                        "agent_id": agent_id,
-                                        "step": sim_data["step_count"],
-                                        "position_x": target["position"][0],
-                                        "position_y": target["position"][1]
-                                    })
-                            
-                            # 判断是否应该提交数据库操作
-                            current_time = datetime.utcnow()
-                            time_diff = (current_time - last_db_commit_time).total_seconds()
-                            should_commit = (len(position_records_buffer) >= batch_size or 
-                                            time_diff > 5.0 or 
-                                            sim_data["is_captured"])
-                            
-                            if should_commit and position_records_buffer:
-                                # 批量插入位置记录
-                                db.execute(AgentPosition.__table__.insert(), position_records_buffer)
-                                position_records_buffer = []
-                                
-                                # 更新模拟状态
-                                db_simulation.step_count = sim_data["step_count"]
-                                db_simulation.is_captured = sim_data["is_captured"]
-                                
-                                if sim_data["is_captured"] and not db_simulation.end_time:
-                                    db_simulation.end_time = current_time
-                                    db_simulation.capture_time = (db_simulation.end_time - db_simulation.start_time).total_seconds() if db_simulation.start_time else None
-                                
-                                db.commit()
-                                last_db_commit_time = current_time
-                                logger.debug(f"已提交数据到数据库，步数: {sim_data['step_count']}")
-                        except Exception as db_error:
-                            logger.error(f"数据库操作失败: {str(db_error)}")
-                            db.rollback()
+        # 4. 订阅调度器的步进结果并转发给客户端
+        queue = tick_scheduler.subscribe(simulation_id, subscription)
+        frame_task = asyncio.ensure_future(queue.get())
+        receive_task = asyncio.ensure_future(websocket.receive_text())
+        try:
+            while True:
+                done, _ = await asyncio.wait({frame_task, receive_task}, return_when=asyncio.FIRST_COMPLETED)
                 
                 # 发送状态更新
-                await websocket.send_json(sim_data)
+                if frame_task in done:
+                    frame = frame_task.result()
+                    timer = profiler.websocket_timer(simulation_id, db_simulation["algorithm_type"])
+                    for message in (frame if isinstance(frame, list) else [frame]):
+                        await _send_frame(websocket, message, subscription, timer)
+                    frame_task = asyncio.ensure_future(queue.get())
                 
-                # 接收可能的客户端消息（非阻塞方式）
-                try:
-                    message_data = await asyncio.wait_for(websocket.receive_text(), timeout=0.01)
+                # 处理客户端消息
+                if receive_task in done:
+                    message_data = receive_task.result()
                     try:
                         message = json.loads(message_data)
                         # 处理心跳消息
                         if message.get('type') == 'heartbeat':
                             await websocket.send_json({"heartbeat": True, "timestamp": datetime.utcnow().isoformat()})
+                        # 客户端检测到序列号缺口，丢弃积压的增量帧并重发关键帧
+                        elif message.get('type') == 'resync' and protocol == PROTOCOL_DELTA:
+                            while not queue.empty():
+                                queue.get_nowait()
+                            await _send_frame(websocket, tick_scheduler.keyframe(simulation_id), subscription)
                     except json.JSONDecodeError:
                         logger.warning(f"收到无效的JSON消息: {message_data}")
-                except asyncio.TimeoutError:
-                    # 超时没关系，继续循环
-                    pass
-                except Exception as e:
-                    if "connection closed" in str(e).lower() or "disconnected" in str(e).lower():
-                        logger.info(f"客户端 {client_id} 已断开连接")
-                        break
-                    else:
-                        logger.warning(f"接收客户端消息时出错: {str(e)}")
-                
-                # 如果模拟未运行，数据应该有未提交的，确保提交
-                if not sim_data["is_running"] and position_records_buffer:
-                    try:
-                        db.execute(AgentPosition.__table__.insert(), position_records_buffer)
-                        position_records_buffer = []
-                        db.commit()
-                        logger.debug("已提交未运行状态的位置记录数据")
-                    except Exception as e:
-                        logger.error(f"提交位置记录数据失败: {str(e)}")
-                        db.rollback()
-                
-                # 控制更新频率
-                await asyncio.sleep(update_frequency)
-                
-            except websockets.exceptions.ConnectionClosed as e:
-                logger.info(f"WebSocket连接已关闭: {client_id}, 原因: {str(e)}")
-                break
-            except ValueError as e:
-                logger.error(f"模拟 {simulation_id} 不存在或数据无效: {str(e)}")
-                await websocket.send_json({"error": f"模拟数据错误: {str(e)}"})
-                break
-            except Exception as e:
-                logger.error(f"处理模拟 {simulation_id} 时出错: {str(e)}")
-                try:
-                    await websocket.send_json({"error": f"处理错误: {str(e)}"})
-                except Exception:
-                    pass
-                break
-        
-        # 确保有未提交的数据被保存
-        if position_records_buffer:
-            try:
-                db.execute(AgentPosition.__table__.insert(), position_records_buffer)
-                db.commit()
-                logger.debug(f"已提交剩余的位置记录数据, 记录数: {len(position_records_buffer)}")
-            except Exception as e:
-                logger.error(f"提交剩余数据失败: {str(e)}")
-                db.rollback()
-        if sim_data["is_captured"] and not db_simulation.is_captured:
-            db_simulation.is_captured = True
-            db_simulation.end_time = datetime.utcnow()
-            db_simulation.capture_time = (db_simulation.end_time - db_simulation.start_time).total_seconds() if db_simulation.start_time else None
-            
-            # 确保立即提交更改
-            db.commit()
-            logger.info(f"更新数据库：模拟 {simulation_id} 状态设置为已捕获")
+                    receive_task = asyncio.ensure_future(websocket.receive_text())
+        except (WebSocketDisconnect, websockets.exceptions.ConnectionClosed) as e:
+            logger.info(f"客户端 {client_id} 已断开连接: {str(e)}")
+        finally:
+            frame_task.cancel()
+            receive_task.cancel()
+            tick_scheduler.unsubscribe(simulation_id, queue)
     
     except websockets.exceptions.ConnectionClosedOK:
         logger.info(f"WebSocket连接正常关闭: {client_id}")
@@ -489,15 +509,14 @@ async def websocket_endpoint(websocket: WebSocket, simulation_id: int, db: Sessi
         logger.info(f"WebSocket客户端 {client_id} 会话结束")
 
 @router.post("/simulations/{simulation_id}/regenerate-obstacles")
-def regenerate_obstacles(
+async def regenerate_obstacles(
     simulation_id: int, 
-    data: Dict = Body(...),
-    db: Session = Depends(get_db)
+    data: Dict = Body(...)
 ):
     """重新生成障碍物，确保不与智能体重叠"""
     logger.info(f"收到障碍物生成请求: simulation_id={simulation_id}, data={data}")
     
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    simulation = await run_db(_load_simulation, simulation_id)
     if not simulation:
         logger.error(f"模拟{simulation_id}不存在")
         raise HTTPException(status_code=404, detail="模拟不存在")
@@ -510,12 +529,13 @@ def regenerate_obstacles(
         sim_data = simulation_service.get_simulation(simulation_id)
         
         # 生成新的障碍物
-        env_size = simulation.environment_size
+        env_size = simulation["environment_size"]
         obstacles = simulation_service.generate_obstacles(
             env_size=env_size,
             num_obstacles=count,
             hunters=sim_data.get("hunters", []),
-            targets=sim_data.get("targets", [])
+            targets=sim_data.get("targets", []),
+            rng=simulation_service.random_stream(simulation_id)
         )
         
         logger.info(f"成功生成{len(obstacles)}个障碍物")
@@ -524,8 +544,7 @@ def regenerate_obstacles(
         updated_sim = simulation_service.update_simulation_obstacles(simulation_id, obstacles)
         
         # 更新数据库中的障碍物计数
-        simulation.obstacle_count = len(obstacles)
-        db.commit()
+        await run_db(_update_simulation_record, simulation_id, obstacle_count=len(obstacles))
         
         return {"success": True, "obstacles": obstacles}
         
@@ -535,77 +554,204 @@ def regenerate_obstacles(
         raise HTTPException(status_code=500, detail=f"重新生成障碍物失败: {str(e)}")
 
 @router.put("/simulations/{simulation_id}/update-timestamp")
-def update_simulation_timestamp(
+async def update_simulation_timestamp(
     simulation_id: int,
-    data: Dict = Body(...),
-    db: Session = Depends(get_db)
+    data: Dict = Body(...)
 ):
     """更新模拟的时间戳"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
-    if not simulation:
-        raise HTTPException(status_code=404, detail="模拟不存在")
+    fields = {}
+    if "created_at" in data and data["created_at"]:
+        try:
+            # 尝试解析ISO格式的时间字符串
+            fields["created_at"] = datetime.fromisoformat(data["created_at"].replace('Z', '+00:00'))
+        except ValueError:
+            # 如果解析失败，使用当前时间
+            fields["created_at"] = datetime.utcnow()
+    
+    # 确保更新时间始终设置
+    fields["updated_at"] = datetime.utcnow()
     
     try:
-        if "created_at" in data and data["created_at"]:
-            try:
-                # 尝试解析ISO格式的时间字符串
-                created_at = datetime.fromisoformat(data["created_at"].replace('Z', '+00:00'))
-                simulation.created_at = created_at
-            except ValueError:
-                # 如果解析失败，使用当前时间
-                simulation.created_at = datetime.utcnow()
-        
-        # 确保更新时间始终设置
-        simulation.updated_at = datetime.utcnow()
-        
-        db.commit()
-        return {"message": "时间戳已更新"}
+        simulation = await run_db(_update_simulation_record, simulation_id, **fields)
     except Exception as e:
-        db.rollback()
         logger.error(f"更新时间戳失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"更新时间戳失败: {str(e)}")
+    if not simulation:
+        raise HTTPException(status_code=404, detail="模拟不存在")
+    return {"message": "时间戳已更新"}
 
 @router.get("/simulations/{simulation_id}/final-snapshot")
-def get_final_snapshot(simulation_id: int, db: Session = Depends(get_db)):
+async def get_final_snapshot(simulation_id: int):
     """获取模拟的最终状态快照"""
-    simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+    def load(db):
+        simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+        if not simulation:
+            return None, None
+        # 由最近的关键帧和其后的增量帧重建最后一个快照，轨迹历史从轨迹块补充
+        last_snapshot = reconstruct_snapshot(db, simulation_id)
+        if last_snapshot:
+            attach_history(db, simulation_id, last_snapshot, simulation.trail_length)
+        return simulation.to_dict(), last_snapshot
+    
+    simulation, last_snapshot = await run_db(load)
     if not simulation:
         raise HTTPException(status_code=404, detail="模拟不存在")
     
-    # 获取最后一个快照
-    last_snapshot = db.query(SimulationSnapshot).filter(
-        SimulationSnapshot.simulation_id == simulation_id
-    ).order_by(SimulationSnapshot.step.desc()).first()
-    
     if not last_snapshot:
         return {
             "message": "未找到快照数据",
             "hunters": [],
             "targets": [],
-            "step": simulation.step_count,
-            "is_captured": simulation.is_captured,
-            "capture_time": simulation.capture_time,
-            "creation_time": simulation.created_at.isoformat() if simulation.created_at else None
+            "step": simulation["step_count"],
+            "is_captured": simulation["is_captured"],
+            "capture_time": simulation["capture_time"],
+            "creation_time": simulation["created_at"]
         }
     
-    # 解析JSON数据
-    try:
-        hunters = json.loads(last_snapshot.hunters_state)
-    except:
-        hunters = []
-        
-    try:
-        targets = json.loads(last_snapshot.targets_state)
-    except:
-        targets = []
-    
     return {
-        "hunters": hunters,
-        "targets": targets,
-        "step": last_snapshot.step,
-        "timestamp": last_snapshot.timestamp.isoformat() if last_snapshot.timestamp else None,
-        "is_captured": simulation.is_captured,
-        "capture_time": simulation.capture_time,
-        "captured_targets_count": simulation.captured_targets_count,
-        "creation_time": simulation.created_at.isoformat() if simulation.created_at else None
-    }
\ No newline at end of file
+        "hunters": last_snapshot["hunters"],
+        "targets": last_snapshot["targets"],
+        "step": last_snapshot["step"],
+        "timestamp": last_snapshot["timestamp"].isoformat() if last_snapshot["timestamp"] else None,
+        "is_captured": simulation["is_captured"],
+        "capture_time": simulation["capture_time"],
+        "captured_targets_count": simulation["captured_targets_count"],
+        "creation_time": simulation["created_at"]
+    }
+
+@router.get("/simulations/{simulation_id}/replay")
+async def get_replay(
+    simulation_id: int,
+    from_step: Optional[int] = Query(None, ge=0, description="起始步（含），默认为第一个已保存的步"),
+    to_step: Optional[int] = Query(None, ge=0, description="结束步（含），默认为最后一个已保存的步"),
+    stride: int = Query(1, ge=1, description="每隔多少个采样点取一个"),
+    max_points: Optional[int] = Query(settings.REPLAY_DEFAULT_MAX_POINTS, ge=2, le=settings.REPLAY_MAX_POINTS_LIMIT,
+                                      description="每个智能体最多返回的点数"),
+    method: str = Query(METHOD_LTTB, description="lttb、douglas-peucker 或 stride"),
+    epsilon: Optional[float] = Query(None, ge=0, description="douglas-peucker 允许的最大偏离距离")
+):
+    """
+    获取模拟在步数范围内的回放轨迹
+
+    每个智能体的位置序列先按 stride 抽取，再用保形降采样降到 max_points 个点以内；
+    state 为 from_step 时的智能体状态，由最近的关键帧重建
+    """
+    if method not in METHODS:
+        raise HTTPException(status_code=400, detail=f"不支持的降采样方法: {method}")
+    if from_step is not None and to_step is not None and from_step > to_step:
+        raise HTTPException(status_code=400, detail="from_step 不能大于 to_step")
+    if not await run_db(_load_simulation, simulation_id):
+        raise HTTPException(status_code=404, detail="模拟不存在")
+    return await run_db(load_replay, simulation_id, from_step, to_step, stride, max_points, method, epsilon)
+
+@router.get("/simulations/{simulation_id}/export/{dataset}")
+async def export_simulation_data(
+    simulation_id: int,
+    dataset: str,
+    format: str = Query(FORMAT_CSV, description="csv 或 ndjson"),
+    gzip: bool = Query(False, description="是否gzip压缩")
+):
+    """
+    流式导出模拟的位置历史（positions）或快照（snapshots）
+
+    按键集分页逐页查询并立即输出，内存占用与数据量无关；gzip=true 时边输出边压缩
+    """
+    if dataset not in DATASETS:
+        raise HTTPException(status_code=404, detail=f"未知的导出数据: {dataset}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}")
+    if not await run_db(_load_simulation, simulation_id):
+        raise HTTPException(status_code=404, detail="模拟不存在")
+
+    filename = f"simulation_{simulation_id}_{dataset}.{format}"
+    media_type = MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        stream_export(run_db, simulation_id, dataset, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/persistence/stats")
+def get_persistence_stats():
+    """获取持久化写入队列和背压指标"""
+    return persistence_writer.stats()
+
+@router.get("/cleanup/stats")
+def get_cleanup_stats(request: Request):
+    """获取最近一次数据清理的进度和吞吐指标"""
+    cleanup_service = getattr(request.app.state, "cleanup_service", None)
+    if cleanup_service is None:
+        raise HTTPException(status_code=404, detail="清理服务未启动")
+    return cleanup_service.stats
+
+# 参数扫描
+@router.post("/sweeps/", response_model=SweepResponse, status_code=201)
+async def create_sweep(request: SweepRequest):
+    """
+    创建参数扫描任务
+
+    grid 的各参数取值做笛卡尔积（或直接给出 configs 列表），与 base 合并后每个组合运行 repetitions 次；
+    任务在后台进程池中运行，通过 /sweeps/{id}/progress 获取进度
+    """
+    if (request.grid is None) == (request.configs is None):
+        raise HTTPException(status_code=400, detail="grid 和 configs 必须且只能指定一个")
+    try:
+        cells = expand_cells(request.grid, request.configs, request.base)
+        job = await sweep_service.submit(cells, request.repetitions, request.seed, request.name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {**job, "progress": sweep_service.progress.get(job["id"])}
+
+@router.get("/sweeps/", response_model=List[Dict[str, Any]])
+async def get_sweeps(limit: int = Query(100, ge=1, le=1000)):
+    """最近的参数扫描任务"""
+    return await run_db(list_sweeps, limit)
+
+@router.get("/sweeps/{sweep_id}", response_model=SweepResponse)
+async def get_sweep(sweep_id: int):
+    """获取扫描任务、实时进度和已完成组合的汇总结果"""
+    sweep = await run_db(load_sweep, sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail="扫描任务不存在")
+    return {**sweep, "progress": sweep_service.progress.get(sweep_id)}
+
+@router.get("/sweeps/{sweep_id}/progress")
+async def stream_sweep_progress(sweep_id: int):
+    """以 Server-Sent Events 推送扫描进度，任务结束后关闭"""
+    sweep = await run_db(load_sweep, sweep_id)
+    if sweep is None:
+        raise HTTPException(status_code=404, detail="扫描任务不存在")
+
+    async def events():
+        queue = sweep_service.subscribe(sweep_id)
+        try:
+            progress = sweep_service.progress.get(sweep_id)
+            if progress is None:
+                # 已结束或不在本进程中运行的任务不会再有进度推送，只返回数据库中的状态
+                progress = {key: sweep[key] for key in ("id", "status", "total_runs", "completed_runs", "failed_runs")}
+                yield f"data: {json.dumps(progress)}\n\n"
+                return
+            while True:
+                yield f"data: {json.dumps(progress)}\n\n"
+                if progress["status"] in FINISHED_STATUSES:
+                    break
+                progress = await queue.get()
+        finally:
+            sweep_service.unsubscribe(sweep_id, queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@router.post("/sweeps/{sweep_id}/cancel")
+async def cancel_sweep(sweep_id: int):
+    """取消运行中的扫描任务，已完成组合的结果保留"""
+    if not sweep_service.cancel(sweep_id):
+        raise HTTPException(status_code=404, detail="扫描任务不存在或未在运行")
+    return {"message": "扫描任务已取消", "id": sweep_id}
+
+@metrics_router.get("/metrics")
+async def get_metrics():
+    """Prometheus 文本格式的运行指标（步进分阶段耗时需开启 PROFILING_ENABLED）"""
+    return Response(content=registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,64 @@
+"""
+无头批量运行入口
+
+用法示例:
+    python -m app.batch_run --algorithm APF CONSENSUS ENCIRCLEMENT --repetitions 100 --output results.json
+"""
+import argparse
+import json
+import logging
+import sys
+
+from app.config import settings
+from app.services.batch_service import BatchRunService, summarize_runs
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="全速批量运行多智能体围捕模拟")
+    parser.add_argument("--algorithm", nargs="+", default=[settings.DEFAULT_ALGORITHM],
+                        help="算法类型，可指定多个进行对比: APF CONSENSUS ENCIRCLEMENT")
+    parser.add_argument("--environment-size", type=int, default=settings.DEFAULT_ENV_SIZE)
+    parser.add_argument("--hunters", type=int, default=settings.DEFAULT_NUM_HUNTERS)
+    parser.add_argument("--targets", type=int, default=settings.DEFAULT_NUM_TARGETS)
+    parser.add_argument("--max-steps", type=int, default=settings.DEFAULT_MAX_STEPS)
+    parser.add_argument("--obstacles", type=int, default=3)
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=None, help="进程池大小，默认为CPU核数")
+    parser.add_argument("--output", default=None, help="结果JSON文件路径，默认输出到标准输出")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+    service = BatchRunService(max_workers=args.workers)
+
+    results = []
+    for algorithm_type in args.algorithm:
+        config = {
+            "environment_size": args.environment_size,
+            "num_hunters": args.hunters,
+            "num_targets": args.targets,
+            "algorithm_type": algorithm_type,
+            "max_steps": args.max_steps,
+            "num_obstacles": args.obstacles,
+        }
+        runs = service.run(config, args.repetitions)
+        summary = summarize_runs(runs)
+        results.append({"config": config, "summary": summary, "runs": runs})
+        print(f"{algorithm_type}: 捕获率 {summary['capture_rate']:.2%}, "
+              f"平均步数 {summary['mean_steps']:.1f}, 中位捕获步数 {summary['median_capture_step']}",
+              file=sys.stderr)
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,18 @@ class Settings(BaseSettings):
     
     # 数据库设置
     DB_ECHO: bool = os.getenv("DB_ECHO", "False").lower() == "true"  # 是否输出SQL语句
+    DB_THREADPOOL_SIZE: int = 8  # 执行路由和WebSocket数据库操作的线程数
+    DB_POOL_MAX_OVERFLOW: int = 4  # 连接池在 DB_THREADPOOL_SIZE + 2 个连接之外允许的临时连接数
+    
+    # SQLite调优设置（每个新连接建立时应用）
+    SQLITE_JOURNAL_MODE: str = "WAL"  # WAL模式下读写互不阻塞
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # WAL下NORMAL只在检查点时fsync
+    SQLITE_CACHE_SIZE: int = -65536  # 页缓存大小，负数表示KiB（即64MB）
+    SQLITE_MMAP_SIZE: int = 268435456  # 内存映射读取的字节数（256MB），0为关闭
+    SQLITE_TEMP_STORE: str = "MEMORY"  # 临时表和索引存放位置
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000  # 数据库被锁时的等待时间（毫秒）
+    SQLITE_WAL_CHECKPOINT_INTERVAL: float = 60.0  # 定期WAL检查点间隔（秒），0为关闭
+    SQLITE_AUTO_VACUUM: str = "INCREMENTAL"  # 新建数据库的模式，空闲页由清理任务分步回收；已有数据库用 python -m app.db_maintenance convert-auto-vacuum 转换
     
     # 模拟设置
     DEFAULT_ENV_SIZE: int = 500
@@ -24,6 +36,55 @@ class Settings(BaseSettings):
     DEFAULT_NUM_TARGETS: int = 1
     DEFAULT_ALGORITHM: str = "APF"
     DEFAULT_MAX_STEPS: int = 1000
+    DEFAULT_TRAIL_LENGTH: int = 500  # 每个智能体在内存中保留的轨迹点数，更早的点已由记录器持久化
+    
+    # 模拟列表设置
+    SIMULATION_LIST_DEFAULT_LIMIT: int = 100  # 列表每页默认行数
+    SIMULATION_LIST_MAX_LIMIT: int = 1000  # 列表每页最大行数
+    SIMULATION_COUNT_CACHE_TTL: float = 30.0  # 列表总数缓存的有效期（秒）
+    
+    # 调度器设置
+    SIMULATION_TICK_RATE: float = 10.0  # 每秒步数
+    SIMULATION_MAX_CATCHUP_STEPS: int = 5  # 落后时单次最多补跑的步数
+    SCHEDULER_POLL_INTERVAL: float = 0.1  # 检查新运行模拟的间隔（秒）
+    SUBSCRIBER_QUEUE_SIZE: int = 32  # 每个WebSocket订阅者的帧队列长度
+    
+    # 持久化写入设置
+    PERSISTENCE_QUEUE_SIZE: int = 10000  # 写入队列最多容纳的写入项数
+    PERSISTENCE_FLUSH_SIZE: int = 5000  # 累积行数达到该值时立即写入
+    PERSISTENCE_FLUSH_INTERVAL: float = 1.0  # 第一项入队后最多等待的秒数
+    
+    # 快照设置
+    SNAPSHOT_INTERVAL: int = 10  # 每隔多少步记录一次快照
+    SNAPSHOT_KEYFRAME_INTERVAL: int = 100  # 关键帧最大间隔步数，其间记录增量帧；捕获/逃脱时立即记录关键帧
+    
+    # 轨迹存储设置
+    TRAJECTORY_STORAGE: str = "chunks"  # chunks: 压缩轨迹块；rows: agent_positions；both: 两者都写（迁移过渡用）
+    TRAJECTORY_CHUNK_STEPS: int = 256  # 每个轨迹块包含的步数
+    TRAJECTORY_COMPRESSION_LEVEL: int = 6  # 轨迹块的zlib压缩级别
+    
+    # 导出设置
+    EXPORT_PAGE_SIZE: int = 5000  # 流式导出每次查询的行数
+    EXPORT_GZIP_LEVEL: int = 6  # 导出gzip压缩级别
+    
+    # 回放设置
+    REPLAY_DEFAULT_MAX_POINTS: int = 1000  # 回放时每个智能体默认最多返回的点数
+    REPLAY_MAX_POINTS_LIMIT: int = 20000  # 回放允许请求的最大点数
+    
+    # 数据清理设置
+    CLEANUP_DELETE_CHUNK_SIZE: int = 5000  # 每个删除事务最多删除的行数
+    CLEANUP_CHUNK_PAUSE: float = 0.01  # 两个删除事务之间让出数据库的时间（秒）
+    CLEANUP_VACUUM_PAGES: int = 1000  # 每次增量VACUUM回收的页数
+    CLEANUP_MAX_VACUUM_STEPS: int = 1000  # 每次清理最多执行的增量VACUUM次数
+    
+    # 参数扫描设置
+    SWEEP_MAX_WORKERS: Optional[int] = None  # 扫描进程池大小，为空时使用CPU核数
+    SWEEP_RUNS_PER_TASK: int = 10  # 每个进程池任务包含的运行次数
+    SWEEP_MAX_RUNS: int = 100000  # 单个扫描任务允许的最大运行次数
+    SWEEP_PROGRESS_INTERVAL: float = 1.0  # 进度写回数据库的最小间隔（秒）
+    
+    # 指标设置
+    PROFILING_ENABLED: bool = False  # 记录步进和WebSocket发送的分阶段耗时直方图
     
     class Config:
         env_file = ".env"
@@ -1,13 +1,20 @@
-from sqlalchemy import create_engine, inspect
+from sqlalchemy import create_engine, inspect, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 from app.db_config import DB_FILE
 import os
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
 
 logger = logging.getLogger(__name__)
 
+# 环境变量 SIMULATION_DB_FILE 可覆盖自动生成的数据库路径（如测试时使用临时文件）
+DB_FILE = os.getenv("SIMULATION_DB_FILE", DB_FILE)
+
 # 确保数据目录存在
 data_dir = os.path.dirname(DB_FILE)
 os.makedirs(data_dir, exist_ok=True)
@@ -24,15 +31,59 @@ SQLALCHEMY_DATABASE_URL = f"sqlite:///{db_file}"
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     echo=settings.DB_ECHO,  # 是否输出SQL语句
-    connect_args={"check_same_thread": False}  # 允许多线程访问SQLite数据库
+    connect_args={
+        "check_same_thread": False,  # 允许多线程访问SQLite数据库
+        "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000  # 驱动层的锁等待时间（秒）
+    },
+    # 数据库线程池的每个线程各占一个连接，另外留给持久化写入线程和WAL检查点
+    pool_size=settings.DB_THREADPOOL_SIZE + 2,
+    max_overflow=settings.DB_POOL_MAX_OVERFLOW
 )
 
+# PRAGMA取值白名单（设置来自环境变量，不能直接拼接进SQL）
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+CHECKPOINT_MODES = {"PASSIVE", "FULL", "RESTART", "TRUNCATE"}
+AUTO_VACUUM_MODES = {"NONE": 0, "FULL": 1, "INCREMENTAL": 2}
+
+
+def _choice(value: str, choices: set, name: str) -> str:
+    value = str(value).upper()
+    if value not in choices:
+        raise ValueError(f"Invalid {name}: {value}")
+    return value
+
+
+@event.listens_for(engine, "connect")
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新连接应用SQLite调优设置"""
+    cursor = dbapi_connection.cursor()
+    try:
+        # 只对空的新数据库设置，必须在其他会写文件的设置之前执行；已有数据库上设置会请求写锁，
+        # 其他连接正在写入时连接会失败，模式转换由 app.db_maintenance 显式执行
+        cursor.execute("PRAGMA page_count")
+        if cursor.fetchone()[0] == 0:
+            cursor.execute(f"PRAGMA auto_vacuum={_choice(settings.SQLITE_AUTO_VACUUM, set(AUTO_VACUUM_MODES), 'auto_vacuum')}")
+        cursor.execute(f"PRAGMA journal_mode={_choice(settings.SQLITE_JOURNAL_MODE, JOURNAL_MODES, 'journal_mode')}")
+        cursor.execute(f"PRAGMA synchronous={_choice(settings.SQLITE_SYNCHRONOUS, SYNCHRONOUS_LEVELS, 'synchronous')}")
+        cursor.execute(f"PRAGMA cache_size={int(settings.SQLITE_CACHE_SIZE)}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA temp_store={_choice(settings.SQLITE_TEMP_STORE, TEMP_STORES, 'temp_store')}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+    finally:
+        cursor.close()
+
 # 创建会话本地类
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # 声明基类
 Base = declarative_base()
 
+# 有界的数据库线程池：路由和WebSocket处理器中的同步数据库操作都在这里执行，
+# 既不阻塞事件循环（模拟步进），也不与其他线程池任务争抢线程
+db_executor = ThreadPoolExecutor(max_workers=settings.DB_THREADPOOL_SIZE, thread_name_prefix="db")
+
 # 获取数据库会话的依赖
 def get_db():
     db = SessionLocal()
@@ -41,9 +92,102 @@ def get_db():
     finally:
         db.close()
 
+
+def _with_session(operation: Callable, *args, **kwargs) -> Any:
+    db = SessionLocal()
+    try:
+        return operation(db, *args, **kwargs)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def run_db(operation: Callable, *args, **kwargs) -> Any:
+    """
+    在数据库线程池中以独立会话执行 operation(db, *args, **kwargs) 并返回其结果
+
+    会话在返回前关闭，operation 应返回字典等普通对象而不是ORM实例；异常时回滚并原样抛出
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, partial(_with_session, operation, *args, **kwargs))
+
+def add_column(table: str, column: str, ddl: str):
+    """生成一个添加列的迁移步骤，列已存在（新建的数据库）时跳过"""
+    def migrate(connection):
+        columns = {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+    return migrate
+
+
+# 结构迁移：(版本号, 说明, 步骤列表)，版本号递增，只追加不修改。步骤为SQL语句或 fn(connection)。
+# 已执行的版本记录在 PRAGMA user_version 中；步骤需可重复执行，
+# 因为新建的数据库由 create_all 直接建出最新结构，迁移只负责补齐旧数据库
+MIGRATIONS = [
+    (1, "位置、快照和智能体查询的复合索引", [
+        "CREATE INDEX IF NOT EXISTS ix_agent_positions_agent_step ON agent_positions (agent_id, step)",
+        "CREATE INDEX IF NOT EXISTS ix_simulation_snapshots_simulation_step ON simulation_snapshots (simulation_id, step)",
+        "CREATE INDEX IF NOT EXISTS ix_agents_simulation_agent_type ON agents (simulation_id, agent_id, type)",
+    ]),
+    (2, "快照类型列（关键帧/增量帧）", [
+        add_column("simulation_snapshots", "kind", "VARCHAR(10)"),
+    ]),
+    (3, "模拟列表键集分页索引", [
+        "CREATE INDEX IF NOT EXISTS ix_simulations_created_at_id ON simulations (created_at, id)",
+    ]),
+    (4, "模拟随机种子列", [
+        add_column("simulations", "seed", "INTEGER"),
+    ]),
+    (5, "模拟轨迹长度列", [
+        add_column("simulations", "trail_length", "INTEGER"),
+    ]),
+]
+
+
+def schema_version(bind=None) -> int:
+    """数据库当前的结构版本"""
+    with (bind or engine).connect() as connection:
+        return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def apply_migrations(bind=None) -> int:
+    """
+    按版本顺序执行未应用的迁移，每个版本在一个事务中执行并更新 user_version
+
+    Args:
+        bind: 要迁移的引擎，默认为应用的数据库
+
+    Returns:
+        int: 迁移后的结构版本
+    """
+    bind = bind or engine
+    current = schema_version(bind)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        logger.info(f"应用数据库迁移 {version}: {description}")
+        with bind.begin() as connection:
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.exec_driver_sql(statement)
+            # PRAGMA 不支持参数绑定，版本号为代码中的整数常量
+            connection.exec_driver_sql(f"PRAGMA user_version = {int(version)}")
+        current = version
+    return current
+
+
 def init_db(force_recreate=False):
-    """初始化数据库表结构"""
-    from app.models.db_models import Simulation, Agent, AgentPosition, SimulationSnapshot
+    """
+    初始化数据库表结构（只建立缺失的表）
+
+    结构迁移不在这里执行：本函数失败时调用方会以 force_recreate=True 重建全部表，
+    已有数据库迁移失败（如被其他连接锁住）绝不能走到删除数据的路径，迁移由 migrate_db 单独执行
+    """
+    from app.models.db_models import Simulation, Agent, AgentPosition, SimulationSnapshot, TrajectoryChunk, SweepJob, SweepResult
     
     try:
         logger.info("开始初始化数据库...")
@@ -60,7 +204,8 @@ def init_db(force_recreate=False):
             existing_tables = []
         
         # 定义需要的表
-        required_tables = ['simulations', 'agents', 'agent_positions', 'simulation_snapshots']
+        required_tables = ['simulations', 'agents', 'agent_positions', 'simulation_snapshots', 'trajectory_chunks',
+                           'sweep_jobs', 'sweep_results']
         missing_tables = [table for table in required_tables if table not in existing_tables]
         
         if missing_tables:
@@ -78,9 +223,112 @@ def init_db(force_recreate=False):
         if still_missing:
             logger.error(f"表创建失败，缺少以下表: {still_missing}")
             return False
-            
+        
         logger.info("数据库初始化成功")
         return True
     except Exception as e:
         logger.error(f"初始化数据库时出错: {str(e)}")
-        return False
\ No newline at end of file
+        return False
+
+
+def migrate_db() -> int:
+    """
+    执行未应用的结构迁移，失败时记录日志并原样抛出（由调用方中止启动，不删除任何数据）
+
+    Returns:
+        int: 迁移后的结构版本
+    """
+    try:
+        version = apply_migrations()
+    except Exception as e:
+        logger.error(f"数据库迁移失败，数据库保持原状: {str(e)}")
+        raise
+    logger.info(f"数据库结构版本: {version}")
+    return version
+
+
+def auto_vacuum_mode(bind=None) -> str:
+    """数据库当前的 auto_vacuum 模式"""
+    with (bind or engine).connect() as connection:
+        current = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+    return {value: name for name, value in AUTO_VACUUM_MODES.items()}[current]
+
+
+def check_auto_vacuum(bind=None) -> bool:
+    """
+    检查数据库的 auto_vacuum 模式是否与设置一致（只读，启动时调用），不一致时记录警告
+
+    Returns:
+        bool: 是否一致
+    """
+    mode = _choice(settings.SQLITE_AUTO_VACUUM, set(AUTO_VACUUM_MODES), "auto_vacuum")
+    current = auto_vacuum_mode(bind)
+    if current == mode:
+        return True
+    logger.warning(f"数据库 auto_vacuum 模式为 {current}，设置为 {mode}；清理后的空闲页不会归还给文件系统。"
+                   f"停止服务后执行 python -m app.db_maintenance convert-auto-vacuum 转换")
+    return False
+
+
+def convert_auto_vacuum(bind=None) -> bool:
+    """
+    把数据库的 auto_vacuum 模式转换为设置值（维护命令，应在服务停止时执行）
+
+    NONE 与 FULL/INCREMENTAL 之间的切换需要一次完整的VACUUM，会重写整个数据库文件；
+    FULL 与 INCREMENTAL 之间可直接切换
+
+    Returns:
+        bool: 是否执行了转换
+    """
+    mode = _choice(settings.SQLITE_AUTO_VACUUM, set(AUTO_VACUUM_MODES), "auto_vacuum")
+    # VACUUM 不能在事务中执行
+    with (bind or engine).connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        current = connection.exec_driver_sql("PRAGMA auto_vacuum").scalar()
+        if current == AUTO_VACUUM_MODES[mode]:
+            return False
+        connection.exec_driver_sql(f"PRAGMA auto_vacuum={mode}")
+        if AUTO_VACUUM_MODES[mode] == 0 or current == 0:
+            logger.info(f"转换数据库 auto_vacuum 模式为 {mode}，执行一次VACUUM")
+            connection.exec_driver_sql("VACUUM")
+    return True
+
+
+def incremental_vacuum(pages: int) -> tuple:
+    """
+    回收最多 pages 个空闲页（auto_vacuum=INCREMENTAL 时有效），每次只短暂持有写锁
+
+    Returns:
+        tuple: (回收的页数, 剩余的空闲页数)
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        before = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+        connection.exec_driver_sql(f"PRAGMA incremental_vacuum({int(pages)})")
+        after = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return before - after, after
+
+
+def checkpoint_wal(mode: str = "PASSIVE"):
+    """
+    执行一次WAL检查点，将WAL中的内容写回主数据库文件
+
+    Returns:
+        tuple: (是否因锁冲突未完成, WAL总页数, 已写回页数)
+    """
+    mode = _choice(mode, CHECKPOINT_MODES, "checkpoint mode")
+    with engine.connect() as connection:
+        return tuple(connection.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+
+async def run_wal_checkpoints(interval: float = None):
+    """定期在线程中执行PASSIVE检查点，防止WAL文件在持续写入下无限增长"""
+    interval = interval if interval is not None else settings.SQLITE_WAL_CHECKPOINT_INTERVAL
+    if interval <= 0 or settings.SQLITE_JOURNAL_MODE.upper() != "WAL":
+        return
+    logger.info(f"WAL检查点任务已启动，间隔 {interval} 秒")
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            busy, log_pages, checkpointed = await asyncio.get_running_loop().run_in_executor(db_executor, checkpoint_wal)
+            logger.debug(f"WAL检查点完成: busy={busy}, log={log_pages}, checkpointed={checkpointed}")
+        except Exception as e:
+            logger.error(f"WAL检查点失败: {str(e)}")
@@ -0,0 +1,49 @@
+"""
+数据库维护命令，会长时间持有写锁的操作应在服务停止时执行
+
+用法示例:
+    python -m app.db_maintenance status
+    python -m app.db_maintenance convert-auto-vacuum
+"""
+import argparse
+import logging
+import sys
+
+from app.config import settings
+from app.database import auto_vacuum_mode, convert_auto_vacuum, db_file, engine, schema_version
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="SQLite数据库维护")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="显示结构版本、auto_vacuum模式和空闲页数")
+    commands.add_parser("convert-auto-vacuum",
+                        help=f"把auto_vacuum模式转换为设置值（{settings.SQLITE_AUTO_VACUUM}），可能需要重写整个数据库文件")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    args = parse_args(argv)
+
+    if args.command == "convert-auto-vacuum":
+        if convert_auto_vacuum():
+            print(f"auto_vacuum 已转换为 {auto_vacuum_mode()}")
+        else:
+            print(f"auto_vacuum 已是 {auto_vacuum_mode()}，无需转换")
+        return 0
+
+    with engine.connect() as connection:
+        page_count = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        freelist_count = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+    print(f"数据库文件: {db_file}")
+    print(f"结构版本: {schema_version()}")
+    print(f"auto_vacuum: {auto_vacuum_mode()}（设置: {settings.SQLITE_AUTO_VACUUM}）")
+    print(f"页数: {page_count}，空闲页: {freelist_count}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,14 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
 import sys
 
-from app.api.routes import router as api_router
+from app.api.routes import router as api_router, metrics_router, tick_scheduler, persistence_writer, sweep_service
 from app.config import settings
-from app.database import engine, Base, init_db, db_file
+from app.database import engine, Base, init_db, migrate_db, check_auto_vacuum, db_file, run_db, run_wal_checkpoints
 from app.services.cleanup_service import init_cleanup_service
+from app.services.sweep_service import fail_orphaned_sweeps
 
 # 配置日志
 logging.basicConfig(
@@ -36,6 +38,7 @@ def get_application() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Total-Count"],  # 列表分页信息
     )
     
     # 应用启动事件
@@ -50,11 +53,36 @@ def get_application() -> FastAPI:
         if not db_initialized:
             logger.error("数据库初始化仍然失败，应用可能无法正常工作")
         else:
+            # 迁移失败时中止启动，不进入上面的重建流程
+            migrate_db()
+            # 只检查不转换：转换需要完整VACUUM，由维护命令在停机时执行
+            check_auto_vacuum()
+            # 上次退出时未结束的扫描任务不会再运行
+            orphaned = await run_db(fail_orphaned_sweeps)
+            if orphaned:
+                logger.warning(f"{orphaned}个扫描任务在服务重启时未完成，已标记为失败")
             # 初始化清理服务
             init_cleanup_service(app)
+        
+        # 定期WAL检查点
+        app.state.wal_checkpoint_task = asyncio.create_task(run_wal_checkpoints())
+        
+        # 启动模拟调度器，由服务端统一推进所有运行中的模拟
+        tick_scheduler.start()
+        app.state.tick_scheduler = tick_scheduler
+    
+    # 应用关闭事件
+    @app.on_event("shutdown")
+    async def shutdown_events():
+        await tick_scheduler.stop()
+        await sweep_service.shutdown()
+        # 写完队列中剩余的记录
+        await asyncio.to_thread(persistence_writer.stop)
+        app.state.wal_checkpoint_task.cancel()
     
     # 挂载API路由
     app.include_router(api_router, prefix=f"{settings.API_PREFIX}{settings.API_V1_STR}")
+    app.include_router(metrics_router, prefix=settings.API_PREFIX)
     
     return app
 
@@ -1,141 +1,67 @@
 import numpy as np
-from typing import List, Dict, Tuple, Optional, Any
+from typing import List, Dict, Tuple, Optional, Any, Union
 import math
-import random
 from collections import defaultdict
 
+from app.models.world import WorldField, WorldState, move_positions, apf_directions
+from app.models.obstacles import ObstacleSet, EMPTY_OBSTACLES
+from app.models.random_stream import RandomStream, default_stream
+from app.models.trajectory import TrajectoryBuffer
+
 class Agent:
-    """基础智能体类"""
+    """基础智能体类，绑定到WorldState后其数值属性成为世界数组上的视图"""
+    position = WorldField('positions', vector=True)
+    velocity = WorldField('velocities')
+    vision_range = WorldField('vision_ranges')
+    communication_range = WorldField('communication_ranges')
+    alive = WorldField('alive')
+
     def __init__(self, agent_id: int, position: Tuple[float, float], 
                  velocity: float = 1.0, vision_range: float = 100.0, 
                  communication_range: float = 150.0):
+        self._world = None
+        self._slot = None
         self.id = agent_id
+        self.alive = True
         self.position = np.array(position, dtype=float)
         self.velocity = velocity
         self.vision_range = vision_range
         self.communication_range = communication_range
         self.neighbors = []
-        self.history = [self.position.copy()]  # 存储轨迹
+        self.history = TrajectoryBuffer(initial=self.position)  # 有界轨迹缓冲区
+        self.obstacles = EMPTY_OBSTACLES
+    
+    @property
+    def rng(self) -> RandomStream:
+        """所在模拟的随机数流，未绑定世界状态时使用共享流"""
+        return self._world.rng if self._world is not None else default_stream
         
     def move(self, direction: np.ndarray, dt: float = 1.0):
-        """按指定方向移动智能体"""
-        # 确保总是有一些移动
-        if np.linalg.norm(direction) < 0.001:
-            # 如果方向向量太小，添加随机方向
-            angle = random.uniform(0, 2 * math.pi)
-            direction = np.array([math.cos(angle), math.sin(angle)]) * self.velocity
-        
-        if np.linalg.norm(direction) > 0:
-            normalized_direction = direction / np.linalg.norm(direction)
-            
-            # 计划移动到的新位置
-            planned_position = self.position + normalized_direction * self.velocity * dt
-            
-            # 边界检查
-            if hasattr(self, 'environment_boundary') and self.environment_boundary is not None:
-                try:
-                    min_x, min_y, max_x, max_y = self.environment_boundary
-                    planned_position[0] = max(min_x + 5, min(max_x - 5, planned_position[0]))
-                    planned_position[1] = max(min_y + 5, min(max_y - 5, planned_position[1]))
-                except (TypeError, ValueError):
-                    # 如果解包失败，使用默认边界
-                    planned_position[0] = max(0, min(500, planned_position[0]))
-                    planned_position[1] = max(0, min(500, planned_position[1]))
-            
-            # 障碍物检查 - 使用多段检测确保不会穿过障碍物
-            if hasattr(self, 'obstacles') and self.obstacles:
-                # 前向路径检测 - 检查从当前位置到计划位置的整条路径
-                path_is_clear = True
-                collision_point = None
-                collision_obstacle = None
-                
-                # 将路径分成10段进行检测
-                for t in np.linspace(0, 1, 10):
-                    check_position = self.position + t * (planned_position - self.position)
-                    
-                    for obstacle in self.obstacles:
-                        obstacle_pos = np.array(obstacle['position'])
-                        # 增加安全边界，确保不会太靠近障碍物
-                        safe_radius = obstacle['radius'] + 5
-                        
-                        if np.linalg.norm(check_position - obstacle_pos) < safe_radius:
-                            path_is_clear = False
-                            collision_point = check_position
-                            collision_obstacle = obstacle
-                            break
-                    
-                    if not path_is_clear:
-                        break
-                
-                if not path_is_clear and collision_obstacle:
-                    # 如果路径被阻挡，计算切线方向移动
-                    obstacle_pos = np.array(collision_obstacle['position'])
-                    # 从障碍物中心到碰撞点的向量
-                    from_obstacle = collision_point - obstacle_pos
-                    if np.linalg.norm(from_obstacle) > 0:
-                        from_obstacle = from_obstacle / np.linalg.norm(from_obstacle)
-                        
-                        # 计算切线方向（顺时针和逆时针两个选项）
-                        tangent_cw = np.array([-from_obstacle[1], from_obstacle[0]])
-                        tangent_ccw = np.array([from_obstacle[1], -from_obstacle[0]])
-                        
-                        # 选择更接近原始方向的切线
-                        dot_cw = np.dot(normalized_direction, tangent_cw)
-                        dot_ccw = np.dot(normalized_direction, tangent_ccw)
-                        
-                        tangent = tangent_cw if dot_cw > dot_ccw else tangent_ccw
-                        
-                        # 沿切线方向移动，但速度减半
-                        safe_position = self.position + tangent * self.velocity * dt * 0.5
-                        
-                        # 再次检查安全位置是否与任何障碍物碰撞
-                        safe_position_is_clear = True
-                        for obstacle in self.obstacles:
-                            obstacle_pos = np.array(obstacle['position'])
-                            safe_radius = obstacle['radius'] + 5
-                            
-                            if np.linalg.norm(safe_position - obstacle_pos) < safe_radius:
-                                safe_position_is_clear = False
-                                break
-                        
-                        if safe_position_is_clear:
-                            self.position = safe_position
-                        else:
-                            # 如果安全位置仍然不安全，只进行微小移动以避免卡死
-                            # 远离最近的障碍物
-                            closest_obstacle = min(self.obstacles, 
-                                                key=lambda o: np.linalg.norm(np.array(o['position']) - self.position))
-                            away_vector = self.position - np.array(closest_obstacle['position'])
-                            if np.linalg.norm(away_vector) > 0:
-                                away_vector = away_vector / np.linalg.norm(away_vector)
-                                self.position = self.position + away_vector * 2  # 小步移动
-                    else:
-                        # 极端情况：如果正好在障碍物中心，随机移动
-                        angle = random.uniform(0, 2 * math.pi)
-                        random_direction = np.array([math.cos(angle), math.sin(angle)])
-                        self.position = self.position + random_direction * 5
-                else:
-                    # 路径畅通，可以安全移动
-                    self.position = planned_position
-            else:
-                # 没有障碍物，直接移动
-                self.position = planned_position
-                
+        """按指定方向移动智能体（单行调用批量移动规则）"""
+        new_positions, moved = move_positions(
+            self.position[None, :],
+            np.asarray(direction, dtype=float)[None, :],
+            np.array([self.velocity], dtype=float),
+            getattr(self, 'environment_boundary', None),
+            self.obstacles.centers, self.obstacles.radii, dt, self.rng
+        )
+        if moved[0]:
+            self.position = new_positions[0]
             # 记录历史位置
-            self.history.append(self.position.copy())
+            self.history.append(self.position)
     
-    def check_obstacle_collision(self, position, obstacle):
-        """检查位置是否与障碍物碰撞"""
+    def check_obstacle_collision(self, position, obstacle: int):
+        """检查位置是否与障碍物碰撞（obstacle为障碍物集合中的下标）"""
         # 假设障碍物为圆形
-        obstacle_center = np.array(obstacle['position'])
-        obstacle_radius = obstacle['radius']
+        obstacle_center = self.obstacles.centers[obstacle]
+        obstacle_radius = self.obstacles.radii[obstacle]
         
         distance = np.linalg.norm(position - obstacle_center)
         return distance < obstacle_radius + 5  # 添加小缓冲区
     
-    def calculate_reflection(self, direction, position, obstacle):
-        """计算碰撞后的反射方向"""
-        obstacle_center = np.array(obstacle['position'])
+    def calculate_reflection(self, direction, position, obstacle: int):
+        """计算碰撞后的反射方向（obstacle为障碍物集合中的下标）"""
+        obstacle_center = self.obstacles.centers[obstacle]
         
         # 计算从障碍物中心到智能体的向量
         normal = position - obstacle_center
@@ -143,8 +69,7 @@ class Agent:
             normal = normal / np.linalg.norm(normal)
         else:
             # 如果恰好在中心，选择随机方向
-            angle = random.uniform(0, 2 * math.pi)
-            normal = np.array([math.cos(angle), math.sin(angle)])
+            normal = self.rng.unit_vector()
         
         # 计算反射方向
         reflection = direction - 2 * np.dot(direction, normal) * normal
@@ -154,9 +79,21 @@ class Agent:
         """计算与另一智能体的欧几里得距离"""
         return np.linalg.norm(self.position - other_agent.position)
     
+    def visible(self, agents: List['Agent']) -> List['Agent']:
+        """
+        可见的智能体列表
+
+        绑定世界状态时使用本步的可见性缓存，此时agents应为同一类型的全部存活智能体
+        """
+        if self._world is None or not agents:
+            return [agent for agent in agents if self.can_see(agent)]
+        return self._world.visible_agents(self._slot, int(self._world.kinds[agents[0]._slot]))
+    
     def can_see(self, other_agent) -> bool:
         """检查另一智能体是否在视野范围内"""
-        if hasattr(self, 'obstacles') and self.obstacles:
+        if self._world is not None and other_agent._world is self._world:
+            return self._world.can_see(self._slot, other_agent._slot)
+        if len(self.obstacles):
             # 检查视线是否被障碍物阻挡
             return self.distance_to(other_agent) <= self.vision_range and not self.is_line_of_sight_blocked(other_agent)
         else:
@@ -164,30 +101,7 @@ class Agent:
     
     def is_line_of_sight_blocked(self, other_agent) -> bool:
         """检查与其他智能体之间的视线是否被障碍物阻挡"""
-        start = self.position
-        end = other_agent.position
-        direction = end - start
-        distance = np.linalg.norm(direction)
-        
-        if distance > 0:
-            direction = direction / distance
-        else:
-            return False
-        
-        for obstacle in self.obstacles:
-            obstacle_center = np.array(obstacle['position'])
-            obstacle_radius = obstacle['radius']
-            
-            # 计算障碍物中心到线段的最近点
-            t = np.dot(obstacle_center - start, direction)
-            t = max(0, min(distance, t))
-            nearest_point = start + t * direction
-            
-            # 检查最近点到障碍物中心的距离是否小于障碍物半径
-            if np.linalg.norm(nearest_point - obstacle_center) < obstacle_radius:
-                return True
-        
-        return False
+        return self.obstacles.segment_blocked(self.position, other_agent.position)
     
     def can_communicate(self, other_agent) -> bool:
         """检查另一智能体是否在通信范围内"""
@@ -218,16 +132,18 @@ class Agent:
         else:
             self.neighbors = []
 
-    def to_dict(self) -> Dict:
+    def to_dict(self, include_history: bool = True) -> Dict:
         """转换为字典以便序列化"""
-        return {
+        result = {
             "id": self.id,
             "position": self.position.tolist(),
             "velocity": self.velocity,
             "vision_range": self.vision_range,
             "communication_range": self.communication_range,
-            "history": [pos.tolist() for pos in self.history],
         }
+        if include_history:
+            result["history"] = self.history.tolist()
+        return result
 
 class HunterAgent(Agent):
     """猎手智能体类 - 状态机实现"""
@@ -236,13 +152,16 @@ class HunterAgent(Agent):
     STATE_APPROACH = 'approach'    # 接近目标阶段 
     STATE_SURROUND = 'surround'    # 包围目标阶段
     STATE_CAPTURE = 'capture'      # 最终捕获阶段
+
+    capture_range = WorldField('capture_ranges')
+    state = WorldField('states', codes=WorldState.STATE_CODES)
     
     def __init__(self, agent_id: int, position: Tuple[float, float], 
                  velocity: float = 1.5, vision_range: float = 100.0, 
                  communication_range: float = 150.0,
                  learning_rate: float = 0.1, discount_factor: float = 0.9,
                  environment_boundary: Tuple[float, float, float, float] = None,
-                 obstacles: List[Dict] = None):
+                 obstacles: Union[ObstacleSet, List[Dict], None] = None):
         super().__init__(agent_id, position, velocity, vision_range, communication_range)
         self.target_position = None  # 目标位置的估计
         self.capture_range = 10.0    # 捕获范围
@@ -251,7 +170,7 @@ class HunterAgent(Agent):
         self.environment_boundary = environment_boundary
         
         # 设置障碍物
-        self.obstacles = obstacles or []
+        self.obstacles = ObstacleSet.coerce(obstacles)
         
         # Q-learning参数
         self.learning_rate = learning_rate
@@ -280,8 +199,7 @@ class HunterAgent(Agent):
         
         # 检测是否卡住
         if len(self.history) > 5:
-            recent_movement = sum([np.linalg.norm(self.history[i+1] - self.history[i]) 
-                            for i in range(len(self.history)-5, len(self.history)-1)])
+            recent_movement = np.linalg.norm(np.diff(self.history.last(5), axis=0), axis=1).sum()
             if recent_movement < 2.0:
                 self.stalled_count += 1
             else:
@@ -297,8 +215,7 @@ class HunterAgent(Agent):
                     return direction / np.linalg.norm(direction)
                     
             # 如果无法确定目标方向，再使用随机移动
-            angle = random.uniform(0, 2 * math.pi)
-            return np.array([math.cos(angle), math.sin(angle)])
+            return self.rng.unit_vector()
         
         # 重要：改进状态转换逻辑，确保更积极地进入捕获状态
         # 距离判断更加宽松，确保能够有足够的机会进入捕获状态
@@ -358,19 +275,13 @@ class HunterAgent(Agent):
         direction = ideal_position - self.position
         
         # 仅在接近障碍物时添加避障行为
-        if self.obstacles:
-            for obstacle in self.obstacles:
-                obstacle_pos = np.array(obstacle['position'])
-                distance = np.linalg.norm(self.position - obstacle_pos)
-                
-                if distance < obstacle['radius'] + 15:  # 仅当非常接近时
-                    # 计算远离障碍物的方向
-                    away_dir = self.position - obstacle_pos
-                    if np.linalg.norm(away_dir) > 0:
-                        away_dir = away_dir / np.linalg.norm(away_dir)
-                        # 添加到方向中，权重随距离增加
-                        weight = 1.0 - (distance / (obstacle['radius'] + 15))
-                        direction += away_dir * weight * 5.0
+        indices, distances, away_dirs = self.obstacles.near(self.position, 15)  # 仅当非常接近时
+        for index, distance, away_dir in zip(indices, distances, away_dirs):
+            # 远离障碍物的方向
+            if distance > 0:
+                # 添加到方向中，权重随距离增加
+                weight = 1.0 - (distance / (self.obstacles.radii[index] + 15))
+                direction += away_dir * weight * 5.0
         
         # 计算距离目标的距离
         distance_to_target = np.linalg.norm(self.position - target_pos)
@@ -409,47 +320,38 @@ class HunterAgent(Agent):
             direction = direction / np.linalg.norm(direction)
         
         # 检查障碍物
-        for obstacle in self.obstacles:
-            obstacle_pos = np.array(obstacle['position'])
-            obstacle_radius = obstacle['radius']
+        indices, distances, away_dirs = self.obstacles.near(self.position, 30)
+        for index, distance, away_dir in zip(indices, distances, away_dirs):
+            obstacle_radius = self.obstacles.radii[index]
+            # 计算当前前进方向与障碍物中心连线的角度
+            to_obstacle = -away_dir
             
-            # 检查是否在接近障碍物
-            distance = np.linalg.norm(self.position - obstacle_pos)
-            if distance < obstacle_radius + 30:
-                # 计算当前前进方向与障碍物中心连线的角度
-                to_obstacle = obstacle_pos - self.position
-                if np.linalg.norm(to_obstacle) > 0:
-                    to_obstacle = to_obstacle / np.linalg.norm(to_obstacle)
+            dot_product = np.dot(direction, to_obstacle)
+            
+            # 如果朝向障碍物方向(夹角小于90度)，则需要避开
+            if dot_product > 0:
+                # 计算垂直于障碍物方向的向量(两个方向)
+                perp1 = np.array([-to_obstacle[1], to_obstacle[0]])
+                perp2 = np.array([to_obstacle[1], -to_obstacle[0]])
                 
-                dot_product = np.dot(direction, to_obstacle)
+                # 选择更接近原方向的那个
+                if np.dot(perp1, direction) > np.dot(perp2, direction):
+                    avoid_dir = perp1
+                else:
+                    avoid_dir = perp2
                 
-                # 如果朝向障碍物方向(夹角小于90度)，则需要避开
-                if dot_product > 0:
-                    # 计算垂直于障碍物方向的向量(两个方向)
-                    perp1 = np.array([-to_obstacle[1], to_obstacle[0]])
-                    perp2 = np.array([to_obstacle[1], -to_obstacle[0]])
-                    
-                    # 选择更接近原方向的那个
-                    if np.dot(perp1, direction) > np.dot(perp2, direction):
-                        avoid_dir = perp1
-                    else:
-                        avoid_dir = perp2
-                    
-                    # 避障力度随距离减小而增加
-                    avoid_weight = 1.0 - (distance / (obstacle_radius + 30))
-                    direction = direction * (1 - avoid_weight) + avoid_dir * avoid_weight
-                    
-                    # 归一化
-                    if np.linalg.norm(direction) > 0:
-                        direction = direction / np.linalg.norm(direction)
+                # 避障力度随距离减小而增加
+                avoid_weight = 1.0 - (distance / (obstacle_radius + 30))
+                direction = direction * (1 - avoid_weight) + avoid_dir * avoid_weight
+                
+                # 归一化
+                if np.linalg.norm(direction) > 0:
+                    direction = direction / np.linalg.norm(direction)
         
         return direction
     
     def execute_explore(self, target, all_hunters):
         """改进的探索行为 - 优先考虑目标位置，避免卡在边界"""
-        # 获取所有猎手位置信息
-        hunter_positions = [h.position for h in all_hunters if h.id != self.id]
-        
         # 判断是否可以看到目标
         can_see_target = self.can_see(target)
         
@@ -489,7 +391,7 @@ class HunterAgent(Agent):
                 
                 # 添加随机偏移，但确保不会太靠近边界
                 max_offset = min(width, height) * 0.15
-                offset = np.random.uniform(-max_offset, max_offset, 2)
+                offset = self.rng.uniform(-max_offset, max_offset, 2)
                 self.assigned_position = base_pos + offset
                 
                 # 确保在边界内且不太靠近边界
@@ -508,7 +410,7 @@ class HunterAgent(Agent):
                 ]
                 region_index = self.id % len(regions)
                 base_pos = np.array(regions[region_index])
-                offset = np.random.uniform(-30, 30, 2)
+                offset = self.rng.uniform(-30, 30, 2)
                 self.assigned_position = base_pos + offset
         
         # 前往分配的位置
@@ -518,20 +420,14 @@ class HunterAgent(Agent):
                 direction = direction / np.linalg.norm(direction)
             
             # 基本的障碍物避免
-            for obstacle in self.obstacles:
-                obstacle_pos = np.array(obstacle['position'])
-                obstacle_radius = obstacle['radius']
-                
-                distance = np.linalg.norm(self.position - obstacle_pos)
-                if distance < obstacle_radius + 20:
-                    avoid_dir = self.position - obstacle_pos
-                    if np.linalg.norm(avoid_dir) > 0:
-                        avoid_dir = avoid_dir / np.linalg.norm(avoid_dir)
-                        # 权重随距离减小而增加
-                        weight = 1.0 - (distance / (obstacle_radius + 20))
-                        direction = direction * (1 - weight) + avoid_dir * weight
-                        if np.linalg.norm(direction) > 0:
-                            direction = direction / np.linalg.norm(direction)
+            indices, distances, avoid_dirs = self.obstacles.near(self.position, 20)
+            for index, distance, avoid_dir in zip(indices, distances, avoid_dirs):
+                if distance > 0:
+                    # 权重随距离减小而增加
+                    weight = 1.0 - (distance / (self.obstacles.radii[index] + 20))
+                    direction = direction * (1 - weight) + avoid_dir * weight
+                    if np.linalg.norm(direction) > 0:
+                        direction = direction / np.linalg.norm(direction)
             
             return direction
         else:
@@ -545,77 +441,23 @@ class HunterAgent(Agent):
                 if np.linalg.norm(to_center) > min(max_x - min_x, max_y - min_y) * 0.4:
                     if np.linalg.norm(to_center) > 0:
                         to_center = to_center / np.linalg.norm(to_center)
-                        angle = random.uniform(-math.pi/4, math.pi/4)
+                        angle = self.rng.uniform(-math.pi/4, math.pi/4)
                         rotation = np.array([[math.cos(angle), -math.sin(angle)], 
                                             [math.sin(angle), math.cos(angle)]])
                         return rotation.dot(to_center)
             
-            angle = random.uniform(0, 2 * math.pi)
-            return np.array([math.cos(angle), math.sin(angle)])
+            return self.rng.unit_vector()
     
     def calculate_direction(self, target, all_hunters):
         """人工势场法入口 - 使用改进的人工势场法"""
-        # 朝向目标的吸引力
-        direction_to_target = target.position - self.position
-        distance = np.linalg.norm(direction_to_target)
-        
-        if distance > 0:
-            attraction = direction_to_target / distance
-        else:
-            attraction = np.zeros(2)
-        
-        # 来自其他猎手的排斥力
-        repulsion = np.zeros(2)
-        for hunter in all_hunters:
-            if hunter.id == self.id:
-                continue
-                
-            to_hunter = self.position - hunter.position
-            hunter_distance = np.linalg.norm(to_hunter)
-            
-            if 0 < hunter_distance < 30:
-                if hunter_distance > 0:
-                    repulsion_dir = to_hunter / hunter_distance
-                    
-                    # 根据与目标的距离动态调整排斥力大小
-                    # 离目标越近，排斥力越小，甚至为零
-                    if distance < self.capture_range * 2.0:
-                        repulsion_strength = 0.0  # 非常接近目标时完全消除排斥力
-                    elif distance < self.capture_range * 4.0:
-                        repulsion_strength = 0.1  # 接近目标时排斥力很小
-                    else:
-                        repulsion_strength = 1.0
-                        
-                    repulsion += repulsion_dir * (30 - hunter_distance) / 30 * repulsion_strength
-        
-        # 障碍物排斥力保持不变...
-        obstacle_avoidance = np.zeros(2)
-        for obstacle in self.obstacles:
-            obstacle_pos = np.array(obstacle['position'])
-            obstacle_radius = obstacle['radius']
-            
-            to_obstacle = self.position - obstacle_pos
-            obstacle_distance = np.linalg.norm(to_obstacle)
-            
-            if obstacle_distance < obstacle_radius + 30:
-                if obstacle_distance > 0:
-                    obstacle_dir = to_obstacle / obstacle_distance
-                    obstacle_avoidance += obstacle_dir * (obstacle_radius + 30 - obstacle_distance) / 30
-        
-        # 合并所有力 - 当靠近目标时增加吸引力权重
-        if distance < self.capture_range * 2.0:
-            attraction_weight = 3.0  # 非常靠近目标时大幅增加吸引力
-            repulsion_weight = 0.0   # 完全消除排斥力
-        else:
-            attraction_weight = 1.5  # 正常吸引力
-            repulsion_weight = 0.6   # 正常排斥力
-            
-        combined = attraction * attraction_weight + repulsion * repulsion_weight + obstacle_avoidance * 1.2
-        
-        if np.linalg.norm(combined) > 0:
-            return combined / np.linalg.norm(combined)
-        else:
-            return attraction  # 默认返回朝向目标的方向
+        hunter_positions = np.array([hunter.position for hunter in all_hunters], dtype=float).reshape(-1, 2)
+        return apf_directions(
+            self.position[None, :],
+            target.position[None, :],
+            np.array([self.capture_range], dtype=float),
+            hunter_positions,
+            self.obstacles.centers, self.obstacles.radii
+        )[0]
     
     def calculate_direction_advanced(self, target, all_hunters: List['HunterAgent']):
         """共识算法入口 - 使用状态机"""
@@ -673,17 +515,13 @@ class HunterAgent(Agent):
                 intercept_dir = intercept_dir / np.linalg.norm(intercept_dir)
                 
                 # 避开障碍物
-                for obstacle in self.obstacles:
-                    obstacle_pos = np.array(obstacle['position'])
-                    distance = np.linalg.norm(self.position - obstacle_pos)
-                    if distance < obstacle['radius'] + 20:
-                        away_dir = self.position - obstacle_pos
-                        if np.linalg.norm(away_dir) > 0:
-                            away_dir = away_dir / np.linalg.norm(away_dir)
-                            weight = 1.0 - (distance / (obstacle['radius'] + 20))
-                            intercept_dir = intercept_dir * (1 - weight) + away_dir * weight
-                            if np.linalg.norm(intercept_dir) > 0:
-                                intercept_dir = intercept_dir / np.linalg.norm(intercept_dir)
+                indices, distances, away_dirs = self.obstacles.near(self.position, 20)
+                for index, distance, away_dir in zip(indices, distances, away_dirs):
+                    if distance > 0:
+                        weight = 1.0 - (distance / (self.obstacles.radii[index] + 20))
+                        intercept_dir = intercept_dir * (1 - weight) + away_dir * weight
+                        if np.linalg.norm(intercept_dir) > 0:
+                            intercept_dir = intercept_dir / np.linalg.norm(intercept_dir)
                 
                 return intercept_dir
         
@@ -719,17 +557,13 @@ class HunterAgent(Agent):
             direction = direction / np.linalg.norm(direction)
         
         # 避开障碍物
-        for obstacle in self.obstacles:
-            obstacle_pos = np.array(obstacle['position'])
-            distance = np.linalg.norm(self.position - obstacle_pos)
-            if distance < obstacle['radius'] + 20:
-                away_dir = self.position - obstacle_pos
-                if np.linalg.norm(away_dir) > 0:
-                    away_dir = away_dir / np.linalg.norm(away_dir)
-                    weight = 1.0 - (distance / (obstacle['radius'] + 20))
-                    direction = direction * (1 - weight) + away_dir * weight
-                    if np.linalg.norm(direction) > 0:
-                        direction = direction / np.linalg.norm(direction)
+        indices, distances, away_dirs = self.obstacles.near(self.position, 20)
+        for index, distance, away_dir in zip(indices, distances, away_dirs):
+            if distance > 0:
+                weight = 1.0 - (distance / (self.obstacles.radii[index] + 20))
+                direction = direction * (1 - weight) + away_dir * weight
+                if np.linalg.norm(direction) > 0:
+                    direction = direction / np.linalg.norm(direction)
         
         return direction
     
@@ -739,7 +573,7 @@ class HunterAgent(Agent):
             return target.position
         
         # 获取最近三个位置
-        positions = [np.array(pos) for pos in target.history[-3:]]
+        positions = target.history.last(3)
         
         # 计算速度向量
         velocity1 = positions[1] - positions[0]
@@ -766,14 +600,14 @@ class TargetAgent(Agent):
     def __init__(self, agent_id: int, position: Tuple[float, float], 
                  velocity: float = 1.3, vision_range: float = 80.0,
                  environment_boundary: Tuple[float, float, float, float] = None,
-                 obstacles: List[Dict] = None):
+                 obstacles: Union[ObstacleSet, List[Dict], None] = None):
         super().__init__(agent_id, position, velocity, vision_range, 80.0)  # 目标有通信能力，范围80
         
         # 设置环境边界
         self.environment_boundary = environment_boundary
         
         # 设置障碍物
-        self.obstacles = obstacles or []
+        self.obstacles = ObstacleSet.coerce(obstacles)
         
         # 逃避策略参数
         self.memory_duration = 70  # 记忆持续时间（步数）
@@ -800,8 +634,7 @@ class TargetAgent(Agent):
         """增强的逃离行为 - 支持多目标协作"""
         # 检测是否卡住
         if len(self.history) > 5:
-            recent_movement = sum([np.linalg.norm(self.history[i+1] - self.history[i]) 
-                                for i in range(len(self.history)-5, len(self.history)-1)])
+            recent_movement = np.linalg.norm(np.diff(self.history.last(5), axis=0), axis=1).sum()
             if recent_movement < 2.0:
                 self.stalled_count += 1
             else:
@@ -810,12 +643,11 @@ class TargetAgent(Agent):
         # 如果严重卡住，执行紧急移动
         if self.stalled_count > 8:
             self.stalled_count = 0
-            angle = random.uniform(0, 2 * math.pi)
-            self.last_direction = np.array([math.cos(angle), math.sin(angle)])
+            self.last_direction = self.rng.unit_vector()
             return self.last_direction
         
         # 首先检查是否有猎手在视野范围内
-        visible_hunters = [h for h in hunters if self.can_see(h)]
+        visible_hunters = self.visible(hunters)
         
         # 更新上次看到的猎手信息
         for hunter in visible_hunters:
@@ -930,31 +762,25 @@ class TargetAgent(Agent):
                         direction = final_direction / np.linalg.norm(final_direction)
         
         # 障碍物避开 - 同时考虑其他目标智能体作为"软障碍物"
-        for obstacle in self.obstacles:
-            obstacle_pos = np.array(obstacle['position'])
-            obstacle_radius = obstacle['radius']
-            
-            distance = np.linalg.norm(self.position - obstacle_pos)
-            # 只有非常接近障碍物时才调整
-            if distance < obstacle_radius + 20:
-                # 计算远离障碍物的方向
-                away_dir = self.position - obstacle_pos
-                if np.linalg.norm(away_dir) > 0:
-                    away_dir = away_dir / np.linalg.norm(away_dir)
-                    
-                    # 障碍物影响权重随距离减小而增加
-                    weight = 1.0
-                    if distance > obstacle_radius:
-                        weight = 1.0 - ((distance - obstacle_radius) / 20)
-                    
-                    # 完全近距离避让
-                    if distance < obstacle_radius + 5:
-                        direction = away_dir
-                    else:
-                        # 混合方向
-                        direction = direction * (1 - weight) + away_dir * weight
-                        if np.linalg.norm(direction) > 0:
-                            direction = direction / np.linalg.norm(direction)
+        # 只有非常接近障碍物时才调整
+        indices, distances, away_dirs = self.obstacles.near(self.position, 20)
+        for index, distance, away_dir in zip(indices, distances, away_dirs):
+            obstacle_radius = self.obstacles.radii[index]
+            # 远离障碍物的方向
+            if distance > 0:
+                # 障碍物影响权重随距离减小而增加
+                weight = 1.0
+                if distance > obstacle_radius:
+                    weight = 1.0 - ((distance - obstacle_radius) / 20)
+                
+                # 完全近距离避让
+                if distance < obstacle_radius + 5:
+                    direction = away_dir
+                else:
+                    # 混合方向
+                    direction = direction * (1 - weight) + away_dir * weight
+                    if np.linalg.norm(direction) > 0:
+                        direction = direction / np.linalg.norm(direction)
         
         # 避免与其他目标过于接近
         if hasattr(self, 'target_neighbors') and self.target_neighbors:
@@ -978,9 +804,8 @@ class TargetAgent(Agent):
     
     def get_random_or_previous_direction(self):
         """获取随机方向或保持上一次的方向"""
-        if self.last_direction is None or random.random() < 0.1:
-            angle = random.uniform(0, 2 * math.pi)
-            return np.array([math.cos(angle), math.sin(angle)])
+        if self.last_direction is None or self.rng.random() < 0.1:
+            return self.rng.unit_vector()
         else:
             # 90%概率继续之前的方向
             return self.last_direction
@@ -995,15 +820,14 @@ class TargetAgent(Agent):
         self.hunter_memory = {k: v for k, v in self.hunter_memory.items() if v['time_left'] > 0}
         
         # 更新可见猎手的记忆
-        for hunter in hunters:
-            if self.can_see(hunter):
-                # 计算猎手速度，用于预测
-                velocity = np.zeros(2)
-                if len(hunter.history) > 1:
-                    velocity = hunter.history[-1] - hunter.history[-2]
-                
-                self.hunter_memory[hunter.id] = {
-                    'position': hunter.position.copy(),
-                    'time_left': self.memory_duration,
-                    'velocity': velocity
-                }
\ No newline at end of file
+        for hunter in self.visible(hunters):
+            # 计算猎手速度，用于预测
+            velocity = np.zeros(2)
+            if len(hunter.history) > 1:
+                velocity = hunter.history[-1] - hunter.history[-2]
+            
+            self.hunter_memory[hunter.id] = {
+                'position': hunter.position.copy(),
+                'time_left': self.memory_duration,
+                'velocity': velocity
+            }
\ No newline at end of file
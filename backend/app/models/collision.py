@@ -0,0 +1,98 @@
+import numpy as np
+from typing import Optional, Tuple
+
+from app.models.random_stream import RandomStream, default_stream
+
+
+def earliest_hits(starts: np.ndarray, ends: np.ndarray, centers: np.ndarray,
+                  radii: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    批量求解线段与圆形障碍物的最早相交点（解析解）
+
+    对每条路径 p(t) = start + t * (end - start), t ∈ [0, 1]，求解 |p(t) - c|² = r²
+    的较小根，取所有障碍物中最早的一个；起点已在障碍物内时 t = 0。
+    障碍物半径应已包含安全边界（即等价于智能体按该半径扫掠）。
+
+    Args:
+        starts, ends: 路径起点和终点 (K, 2)
+        centers, radii: 障碍物数组 (M, 2), (M,)
+
+    Returns:
+        Tuple: (是否碰撞 (K,), 碰撞时刻 (K,), 障碍物下标 (K,), 接触点 (K, 2), 接触法向 (K, 2))
+               未碰撞的行时刻为inf，法向为零向量
+    """
+    count = len(starts)
+    if not len(radii) or not count:
+        return (np.zeros(count, dtype=bool), np.full(count, np.inf), np.zeros(count, dtype=np.intp),
+                ends.copy(), np.zeros((count, 2)))
+
+    segments = ends - starts                                  # (K, 2)
+    offsets = starts[:, None, :] - centers[None, :, :]        # (K, M, 2)
+    a = np.einsum('kd,kd->k', segments, segments)[:, None]    # (K, 1)
+    b = 2.0 * np.einsum('kmd,kd->km', offsets, segments)      # (K, M)
+    c = np.einsum('kmd,kmd->km', offsets, offsets) - radii[None, :] ** 2
+
+    inside = c < 0
+    discriminant = b * b - 4.0 * a * c
+    crossing = (discriminant > 0) & (a > 0)
+    safe_a = np.where(a > 0, a, 1.0)
+    entry = (-b - np.sqrt(np.where(crossing, discriminant, 0.0))) / (2.0 * safe_a)
+
+    times = np.where(inside, 0.0, np.where(crossing & (entry >= 0) & (entry <= 1), entry, np.inf))
+    obstacle = np.argmin(times, axis=1)
+    time = times[np.arange(count), obstacle]
+    hit = np.isfinite(time)
+
+    contacts = starts + np.where(hit, time, 1.0)[:, None] * segments
+    normals = np.zeros((count, 2))
+    if hit.any():
+        from_obstacle = contacts[hit] - centers[obstacle[hit]]
+        norms = np.linalg.norm(from_obstacle, axis=1)
+        nonzero = norms > 0
+        normal_rows = np.zeros_like(from_obstacle)
+        normal_rows[nonzero] = from_obstacle[nonzero] / norms[nonzero, None]
+        normals[hit] = normal_rows
+
+    return hit, time, obstacle, contacts, normals
+
+
+def tangent_slide(positions: np.ndarray, directions: np.ndarray, velocities: np.ndarray,
+                  normals: np.ndarray, centers: np.ndarray, radii: np.ndarray,
+                  dt: float = 1.0, rng: Optional[RandomStream] = None) -> np.ndarray:
+    """
+    被阻挡的路径沿障碍物切线方向以半速滑动（批量）
+
+    切线取顺/逆时针中更接近原方向的一个；滑动后仍在障碍物安全范围内时改为远离最近的障碍物
+    小步移动以避免卡死；接触法向为零（正好在障碍物中心）时随机移动。
+
+    Args:
+        radii: 已包含安全边界的障碍物半径
+        rng: 随机数流，默认使用共享流
+
+    Returns:
+        np.ndarray: 新位置 (K, 2)
+    """
+    tangent_cw = np.stack([-normals[:, 1], normals[:, 0]], axis=1)
+    dot = np.einsum('kd,kd->k', directions, tangent_cw)
+    # 两个切线方向互为相反数，点积较大者即更接近原方向
+    tangents = np.where((dot > -dot)[:, None], tangent_cw, -tangent_cw)
+    result = positions + tangents * (velocities * dt * 0.5)[:, None]
+
+    distances = np.linalg.norm(result[:, None, :] - centers[None, :, :], axis=2)
+    unsafe = (distances < radii[None, :]).any(axis=1)
+    if unsafe.any():
+        to_agents = positions[unsafe][:, None, :] - centers[None, :, :]
+        nearest = np.argmin(np.linalg.norm(to_agents, axis=2), axis=1)
+        away = to_agents[np.arange(len(nearest)), nearest]
+        away_norms = np.linalg.norm(away, axis=1)
+        moved = np.where((away_norms > 0)[:, None],
+                         positions[unsafe] + away / np.where(away_norms > 0, away_norms, 1.0)[:, None] * 2,
+                         positions[unsafe])
+        result[unsafe] = moved
+
+    # 极端情况：如果正好在障碍物中心，随机移动
+    centered = np.flatnonzero(~normals.any(axis=1))
+    if len(centered):
+        result[centered] = positions[centered] + (rng or default_stream).unit_vectors(len(centered)) * 5
+
+    return result
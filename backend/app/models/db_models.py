@@ -1,13 +1,18 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, ForeignKey, Text, JSON, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 import datetime
+import json
 
 from app.database import Base
 
 class Simulation(Base):
     """模拟记录模型"""
     __tablename__ = "simulations"
+    __table_args__ = (
+        # 列表按 (created_at, id) 倒序键集分页
+        Index("ix_simulations_created_at_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(100), nullable=False)
@@ -32,10 +37,13 @@ class Simulation(Base):
     obstacle_count = Column(Integer, default=0)
     escaped = Column(Boolean, default=False)
     escape_time = Column(Float, nullable=True)
+    seed = Column(Integer, nullable=True)  # 随机种子，相同种子和配置可复现运行
+    trail_length = Column(Integer, nullable=True)  # 内存中保留的轨迹点数，为空时使用系统设置
     
     # 关联
     agents = relationship("Agent", back_populates="simulation", cascade="all, delete-orphan")
     snapshots = relationship("SimulationSnapshot", back_populates="simulation", cascade="all, delete-orphan")
+    trajectory_chunks = relationship("TrajectoryChunk", back_populates="simulation", cascade="all, delete-orphan")
     
     def to_dict(self):
         return {
@@ -59,12 +67,18 @@ class Simulation(Base):
             "total_targets_count": self.total_targets_count,
             "obstacle_count": self.obstacle_count,
             "escaped": self.escaped,
-            "escape_time": self.escape_time
+            "escape_time": self.escape_time,
+            "seed": self.seed,
+            "trail_length": self.trail_length
         }
 
 class Agent(Base):
     """智能体记录模型"""
     __tablename__ = "agents"
+    __table_args__ = (
+        # 按模拟加载智能体、解析 (agent_id, type) 对应的主键
+        Index("ix_agents_simulation_agent_type", "simulation_id", "agent_id", "type"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     simulation_id = Column(Integer, ForeignKey("simulations.id"), nullable=False)
@@ -95,6 +109,10 @@ class Agent(Base):
 class AgentPosition(Base):
     """智能体位置历史记录"""
     __tablename__ = "agent_positions"
+    __table_args__ = (
+        # 按智能体读取位置历史并按步数排序（导出、回放）
+        Index("ix_agent_positions_agent_step", "agent_id", "step"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     agent_id = Column(Integer, ForeignKey("agents.id"), nullable=False)
@@ -118,6 +136,10 @@ class AgentPosition(Base):
 class SimulationSnapshot(Base):
     """模拟状态快照"""
     __tablename__ = "simulation_snapshots"
+    __table_args__ = (
+        # 按模拟读取快照并按步数排序（最终快照取 step 最大的一条）
+        Index("ix_simulation_snapshots_simulation_step", "simulation_id", "step"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     simulation_id = Column(Integer, ForeignKey("simulations.id"), nullable=False)
@@ -127,6 +149,7 @@ class SimulationSnapshot(Base):
     timestamp = Column(DateTime, default=datetime.datetime.utcnow)
     
     # 新增字段
+    kind = Column(String(10), nullable=True)  # keyframe / delta，旧版本的完整快照为空，格式见 app.services.snapshot_store
     is_final = Column(Boolean, default=False)
     captured_targets_count = Column(Integer, default=0)
     escaped_targets_count = Column(Integer, default=0)
@@ -139,10 +162,152 @@ class SimulationSnapshot(Base):
             "id": self.id,
             "simulation_id": self.simulation_id,
             "step": self.step,
+            "kind": self.kind,
             "hunters_state": self.hunters_state,
             "targets_state": self.targets_state,
             "timestamp": self.timestamp.isoformat(),
             "is_final": self.is_final,
             "captured_targets_count": self.captured_targets_count,
             "escaped_targets_count": self.escaped_targets_count
-        }
\ No newline at end of file
+        }
+
+
+class TrajectoryChunk(Base):
+    """
+    压缩的轨迹块
+
+    每行保存一个模拟连续若干步、全部智能体的位置，编码方式见 app.services.trajectory_store
+    """
+    __tablename__ = "trajectory_chunks"
+    __table_args__ = (
+        # 按步数范围查找轨迹块
+        Index("ix_trajectory_chunks_simulation_step", "simulation_id", "start_step", "end_step"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    simulation_id = Column(Integer, ForeignKey("simulations.id"), nullable=False)
+    start_step = Column(Integer, nullable=False)  # 块内第一步
+    end_step = Column(Integer, nullable=False)  # 块内最后一步（含）
+    num_steps = Column(Integer, nullable=False)
+    num_agents = Column(Integer, nullable=False)
+    agents = Column(Text, nullable=False)  # 智能体布局的JSON: [[类型, agent_id], ...]
+    codec = Column(String(20), nullable=False)
+    steps = Column(LargeBinary, nullable=False)  # 压缩的步数数组
+    positions = Column(LargeBinary, nullable=False)  # 压缩的位置数组 (步数, 智能体数, 2)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # 关联
+    simulation = relationship("Simulation", back_populates="trajectory_chunks")
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "simulation_id": self.simulation_id,
+            "start_step": self.start_step,
+            "end_step": self.end_step,
+            "num_steps": self.num_steps,
+            "num_agents": self.num_agents,
+            "codec": self.codec,
+            "size": len(self.steps) + len(self.positions),
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
+
+
+class SweepJob(Base):
+    """参数扫描任务"""
+    __tablename__ = "sweep_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=True)
+    status = Column(String(20), nullable=False, default="pending")  # pending / running / completed / failed / cancelled
+    cells = Column(Text, nullable=False)  # 参数组合列表的JSON
+    repetitions = Column(Integer, nullable=False)
+    seed = Column(Integer, nullable=True)  # 第i个组合第r次运行的种子为 seed + i * repetitions + r
+    total_runs = Column(Integer, nullable=False)
+    completed_runs = Column(Integer, default=0)
+    failed_runs = Column(Integer, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    
+    # 关联
+    results = relationship("SweepResult", back_populates="sweep", cascade="all, delete-orphan")
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "cells": json.loads(self.cells),
+            "repetitions": self.repetitions,
+            "seed": self.seed,
+            "total_runs": self.total_runs,
+            "completed_runs": self.completed_runs,
+            "failed_runs": self.failed_runs,
+            "error": self.error,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class SweepResult(Base):
+    """参数扫描中一个参数组合的汇总结果"""
+    __tablename__ = "sweep_results"
+    __table_args__ = (
+        Index("ix_sweep_results_sweep_cell", "sweep_id", "cell_index"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sweep_id = Column(Integer, ForeignKey("sweep_jobs.id"), nullable=False)
+    cell_index = Column(Integer, nullable=False)
+    config = Column(Text, nullable=False)  # 该组合的完整模拟配置JSON
+    
+    # 常用参数单独成列，便于筛选和比较
+    algorithm_type = Column(String(50))
+    num_hunters = Column(Integer)
+    num_targets = Column(Integer)
+    environment_size = Column(Integer)
+    num_obstacles = Column(Integer)
+    
+    runs = Column(Integer, nullable=False)
+    failed_runs = Column(Integer, default=0)
+    capture_rate = Column(Float)
+    mean_steps = Column(Float)
+    mean_capture_step = Column(Float)
+    median_capture_step = Column(Float)
+    p10_capture_step = Column(Float)
+    p25_capture_step = Column(Float)
+    p75_capture_step = Column(Float)
+    p90_capture_step = Column(Float)
+    mean_wall_time = Column(Float)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    
+    # 关联
+    sweep = relationship("SweepJob", back_populates="results")
+    
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "sweep_id": self.sweep_id,
+            "cell_index": self.cell_index,
+            "config": json.loads(self.config),
+            "algorithm_type": self.algorithm_type,
+            "num_hunters": self.num_hunters,
+            "num_targets": self.num_targets,
+            "environment_size": self.environment_size,
+            "num_obstacles": self.num_obstacles,
+            "runs": self.runs,
+            "failed_runs": self.failed_runs,
+            "capture_rate": self.capture_rate,
+            "mean_steps": self.mean_steps,
+            "mean_capture_step": self.mean_capture_step,
+            "median_capture_step": self.median_capture_step,
+            "p10_capture_step": self.p10_capture_step,
+            "p25_capture_step": self.p25_capture_step,
+            "p75_capture_step": self.p75_capture_step,
+            "p90_capture_step": self.p90_capture_step,
+            "mean_wall_time": self.mean_wall_time,
+            "created_at": self.created_at.isoformat() if self.created_at else None
+        }
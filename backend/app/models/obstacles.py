@@ -0,0 +1,112 @@
+import itertools
+import numpy as np
+from typing import Dict, List, Optional, Tuple, Union
+
+# 全局递增的版本号，每构建一个障碍物集合分配一个新版本
+_versions = itertools.count(1)
+
+
+class ObstacleSet:
+    """
+    不可变的障碍物集合
+
+    在创建模拟或更新障碍物时构建一次，保存中心坐标、半径和包围盒数组，由世界状态和
+    所有智能体共享；字典形式只在序列化时生成。version在每次构建时递增，供依赖障碍物
+    几何的缓存判断是否失效。
+    """
+
+    def __init__(self, centers: np.ndarray, radii: np.ndarray):
+        self.centers = np.array(centers, dtype=float).reshape(-1, 2)
+        self.radii = np.array(radii, dtype=float).reshape(-1)
+        # 包围盒 (M, 4): min_x, min_y, max_x, max_y
+        self.bboxes = np.hstack([self.centers - self.radii[:, None], self.centers + self.radii[:, None]])
+        for array in (self.centers, self.radii, self.bboxes):
+            array.flags.writeable = False
+        self.version = next(_versions)
+        self._dicts: Optional[List[Dict]] = None
+
+    @classmethod
+    def from_dicts(cls, obstacles: Optional[List[Dict]]) -> 'ObstacleSet':
+        """由 {'position': [x, y], 'radius': r} 字典列表构建"""
+        if not obstacles:
+            return cls(np.zeros((0, 2)), np.zeros(0))
+        return cls([obstacle['position'] for obstacle in obstacles],
+                   [obstacle['radius'] for obstacle in obstacles])
+
+    @classmethod
+    def coerce(cls, obstacles: Union['ObstacleSet', List[Dict], None]) -> 'ObstacleSet':
+        """接受障碍物集合或字典列表"""
+        if isinstance(obstacles, cls):
+            return obstacles
+        return cls.from_dicts(obstacles)
+
+    def to_dicts(self) -> List[Dict]:
+        """序列化为字典列表（结果缓存）"""
+        if self._dicts is None:
+            self._dicts = [
+                {'position': center.tolist(), 'radius': float(radius), 'type': 'circle'}
+                for center, radius in zip(self.centers, self.radii)
+            ]
+        return self._dicts
+
+    def __len__(self) -> int:
+        return len(self.radii)
+
+    def near(self, position: np.ndarray, buffer: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        与位置的距离小于 半径 + buffer 的障碍物
+
+        Returns:
+            Tuple: (障碍物下标, 距离, 从障碍物中心指向位置的单位向量（重合时为零向量）)
+        """
+        offsets = position - self.centers
+        distances = np.sqrt(np.einsum('md,md->m', offsets, offsets))
+        indices = np.flatnonzero(distances < self.radii + buffer)
+        distances = distances[indices]
+        away = np.zeros((len(indices), 2))
+        nonzero = distances > 0
+        away[nonzero] = offsets[indices[nonzero]] / distances[nonzero, None]
+        return indices, distances, away
+
+    def segments_blocked(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """
+        批量判断线段是否被障碍物阻挡（线段到圆心的最近距离小于半径）
+
+        先用线段与障碍物的包围盒重叠剔除不可能相交的组合。长度为零的线段视为未阻挡。
+
+        Returns:
+            np.ndarray: (K,) 布尔数组
+        """
+        starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+        blocked = np.zeros(len(starts), dtype=bool)
+        if not len(self) or not len(starts):
+            return blocked
+
+        low = np.minimum(starts, ends)
+        high = np.maximum(starts, ends)
+        overlap = ((low[:, None, 0] <= self.bboxes[None, :, 2]) & (high[:, None, 0] >= self.bboxes[None, :, 0]) &
+                   (low[:, None, 1] <= self.bboxes[None, :, 3]) & (high[:, None, 1] >= self.bboxes[None, :, 1]))
+        rows, obstacles = np.nonzero(overlap)
+        if not len(rows):
+            return blocked
+
+        segments = ends[rows] - starts[rows]
+        lengths = np.linalg.norm(segments, axis=1)
+        valid = lengths > 0
+        units = np.zeros_like(segments)
+        units[valid] = segments[valid] / lengths[valid, None]
+        to_centers = self.centers[obstacles] - starts[rows]
+        t = np.clip(np.einsum('kd,kd->k', to_centers, units), 0, lengths)
+        nearest = starts[rows] + t[:, None] * units
+        hits = valid & (np.linalg.norm(nearest - self.centers[obstacles], axis=1) < self.radii[obstacles])
+        blocked[rows[hits]] = True
+        return blocked
+
+    def segment_blocked(self, start: np.ndarray, end: np.ndarray) -> bool:
+        """判断单条线段是否被障碍物阻挡"""
+        return bool(self.segments_blocked(start[None, :], end[None, :])[0])
+
+
+# 空障碍物集合
+EMPTY_OBSTACLES = ObstacleSet(np.zeros((0, 2)), np.zeros(0))
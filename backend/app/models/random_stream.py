@@ -0,0 +1,68 @@
+import math
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+# 预取缓冲区的最小长度
+DEFAULT_BATCH_SIZE = 256
+
+# 可保存在SQLite INTEGER列中的最大种子
+MAX_SEED = 2 ** 63 - 1
+
+
+def new_seed() -> int:
+    """从系统熵源生成一个种子"""
+    return int(np.random.SeedSequence().generate_state(1, np.uint64)[0] >> np.uint64(1))
+
+
+class RandomStream:
+    """
+    单个模拟专用的随机数流
+
+    包装一个 np.random.Generator：每步开始时按预计用量批量生成 [0, 1) 均匀数放入缓冲区，
+    本步内的取数依次消耗缓冲区，不够时再批量补充。相同的种子和相同的调用顺序得到相同的序列，
+    不同模拟之间互不干扰。
+    """
+
+    def __init__(self, seed: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.seed = seed
+        self.generator = np.random.default_rng(seed)
+        self.batch_size = batch_size
+        self._buffer = np.empty(0)
+        self._position = 0
+
+    def prefetch(self, count: int):
+        """确保缓冲区中至少有 count 个未使用的随机数"""
+        remaining = len(self._buffer) - self._position
+        if remaining >= count:
+            return
+        fresh = self.generator.random(max(count - remaining, self.batch_size))
+        self._buffer = np.concatenate((self._buffer[self._position:], fresh))
+        self._position = 0
+
+    def random(self, size: Union[int, Tuple[int, ...], None] = None):
+        """[0, 1) 均匀分布，size为空时返回float"""
+        count = 1 if size is None else int(np.prod(size))
+        self.prefetch(count)
+        values = self._buffer[self._position:self._position + count]
+        self._position += count
+        if size is None:
+            return float(values[0])
+        return values.reshape(size)
+
+    def uniform(self, low: float = 0.0, high: float = 1.0, size: Union[int, Tuple[int, ...], None] = None):
+        """[low, high) 均匀分布"""
+        return low + (high - low) * self.random(size)
+
+    def unit_vectors(self, count: int) -> np.ndarray:
+        """count 个随机方向的单位向量 (count, 2)"""
+        angles = self.uniform(0, 2 * math.pi, count)
+        return np.stack([np.cos(angles), np.sin(angles)], axis=1)
+
+    def unit_vector(self) -> np.ndarray:
+        """一个随机方向的单位向量"""
+        return self.unit_vectors(1)[0]
+
+
+# 未绑定到世界状态的智能体和独立调用使用的共享随机数流
+default_stream = RandomStream()
@@ -0,0 +1,101 @@
+import math
+import numpy as np
+from typing import Tuple, Union
+
+# 网格坐标编码为单个int64键时y方向的跨度
+KEY_STRIDE = 1 << 32
+
+
+def _cell_keys(cells: np.ndarray) -> np.ndarray:
+    """将网格坐标 (..., 2) 编码为int64键"""
+    return cells[..., 0] * KEY_STRIDE + cells[..., 1]
+
+
+class SpatialGrid:
+    """
+    均匀网格空间索引
+
+    按网格键排序一次后，每个非空网格对应排序数组中的一个连续区间；半径查询只检查
+    查询点周围若干网格中的点，整个批量查询以向量化方式展开，不需要逐点循环。
+    slack为索引建立后被索引点可能移动的最大距离，查询时据此扩大候选范围，
+    使每步只需重建一次索引。
+    """
+
+    def __init__(self, positions: np.ndarray, cell_size: float, slack: float = 0.0):
+        """
+        建立索引
+
+        Args:
+            positions: 被索引点的位置 (N, 2)
+            cell_size: 网格边长，通常取最大查询半径
+            slack: 索引建立后点可能移动的最大距离
+        """
+        self.positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        self.cell_size = max(float(cell_size), 1e-6)
+        self.slack = slack
+
+        keys = _cell_keys(np.floor(self.positions / self.cell_size).astype(np.int64))
+        self.order = np.argsort(keys, kind='stable')
+        self.keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def candidate_pairs(self, points: np.ndarray, radius: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        可能在radius内的所有候选对（未做精确距离过滤）
+
+        Returns:
+            Tuple: (查询点行号, 被索引点下标)
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        if not len(self.keys) or not len(points):
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+
+        reach = max(1, math.ceil((radius + self.slack) / self.cell_size))
+        steps = np.arange(-reach, reach + 1)
+        offsets = np.stack(np.meshgrid(steps, steps, indexing='ij'), axis=-1).reshape(-1, 2)
+
+        cells = np.floor(points / self.cell_size).astype(np.int64)
+        keys = _cell_keys(cells[:, None, :] + offsets[None, :, :]).ravel()
+        found_at = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[found_at] == keys
+
+        query_rows = np.repeat(np.arange(len(points)), len(offsets))[found]
+        starts = self.starts[found_at[found]]
+        counts = self.counts[found_at[found]]
+
+        # 将每个命中网格的 [start, start + count) 区间展开为扁平下标
+        rows = np.repeat(query_rows, counts)
+        range_offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return rows, self.order[np.repeat(starts, counts) + range_offsets]
+
+    def query_pairs(self, points: np.ndarray, radius: Union[float, np.ndarray],
+                    positions: np.ndarray = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        批量半径查询
+
+        Args:
+            points: 查询点 (K, 2)
+            radius: 查询半径，标量或每个查询点一个 (K,)
+            positions: 被索引点的当前位置，默认为建立索引时的位置
+
+        Returns:
+            Tuple: (查询点行号, 被索引点下标, 距离)，按查询点行号和下标排序
+        """
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radius, dtype=float), (len(points),))
+        rows, indices = self.candidate_pairs(points, float(radii.max()) if len(radii) else 0.0)
+
+        current = self.positions if positions is None else positions
+        distances = np.linalg.norm(points[rows] - current[indices], axis=1)
+        within = distances <= radii[rows]
+        rows, indices, distances = rows[within], indices[within], distances[within]
+
+        order = np.lexsort((indices, rows))
+        return rows[order], indices[order], distances[order]
+
+    def query(self, point: np.ndarray, radius: float, positions: np.ndarray = None) -> np.ndarray:
+        """单点半径查询，返回被索引点下标（升序）"""
+        _, indices, _ = self.query_pairs(np.asarray(point, dtype=float)[None, :], radius, positions)
+        return indices
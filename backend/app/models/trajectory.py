@@ -0,0 +1,90 @@
+import numpy as np
+from typing import List, Optional
+
+# 默认内存轨迹长度（点数）
+DEFAULT_TRAIL_LENGTH = 500
+
+# 初始分配的点数，之后按需倍增直至容量上限
+INITIAL_ALLOCATION = 16
+
+
+class TrajectoryBuffer:
+    """
+    有界环形轨迹缓冲区
+
+    预分配的NumPy数组，按需倍增直至容量上限，之后覆盖最旧的点（较早的位置已由
+    模拟记录器持久化到数据库，内存中直接丢弃）。每个点同时写入两份（i 与 i + 分配长度），
+    因此任意“最近k个点”都是底层数组上的连续切片，无需拷贝。
+    """
+
+    def __init__(self, capacity: Optional[int] = None, initial: Optional[np.ndarray] = None):
+        """
+        初始化轨迹缓冲区
+
+        Args:
+            capacity: 最多保留的点数，默认为DEFAULT_TRAIL_LENGTH
+            initial: 初始位置
+        """
+        self.capacity = max(1, int(capacity or DEFAULT_TRAIL_LENGTH))
+        self._allocated = min(self.capacity, INITIAL_ALLOCATION)
+        self._data = np.empty((2 * self._allocated, 2))
+        self._head = 0  # 最旧点的索引
+        self._size = 0
+        if initial is not None:
+            self.append(initial)
+
+    def append(self, position: np.ndarray):
+        """追加一个位置（拷贝），满时覆盖最旧的点"""
+        if self._size == self._allocated and self._allocated < self.capacity:
+            self._grow(min(self._allocated * 2, self.capacity))
+
+        if self._size < self._allocated:
+            index = (self._head + self._size) % self._allocated
+            self._size += 1
+        else:
+            index = self._head
+            self._head = (self._head + 1) % self._allocated
+
+        self._data[index] = position
+        self._data[index + self._allocated] = position
+
+    def last(self, k: int) -> np.ndarray:
+        """最近k个点 (k, 2)，按时间顺序，返回底层数组的视图"""
+        k = min(max(k, 0), self._size)
+        end = self._head + self._size
+        return self._data[end - k:end]
+
+    def view(self) -> np.ndarray:
+        """全部保留的点 (N, 2)，按时间顺序"""
+        return self.last(self._size)
+
+    def resize(self, capacity: int):
+        """修改容量上限，保留最近的点"""
+        self.capacity = max(1, int(capacity))
+        points = self.view()[-self.capacity:].copy()
+        self._size = 0
+        self._grow(min(self.capacity, max(INITIAL_ALLOCATION, len(points))))
+        self._data[:len(points)] = points
+        self._data[self._allocated:self._allocated + len(points)] = points
+        self._size = len(points)
+
+    def tolist(self) -> List[List[float]]:
+        return self.view().tolist()
+
+    def _grow(self, allocated: int):
+        points = self.view()
+        data = np.empty((2 * allocated, 2))
+        data[:self._size] = points
+        data[allocated:allocated + self._size] = points
+        self._data = data
+        self._allocated = allocated
+        self._head = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index):
+        return self.view()[index]
+
+    def __iter__(self):
+        return iter(self.view())
@@ -0,0 +1,60 @@
+import numpy as np
+from typing import Dict, Set, Tuple
+
+
+class Visibility:
+    """一类观察者对一类被观察者的可见关系（某一时刻的快照）"""
+
+    def __init__(self, key: Tuple, capacity: int, observers: np.ndarray, rows: np.ndarray, slots: np.ndarray):
+        self.key = key
+        self._capacity = capacity
+        self._observers = observers
+        self._slots = slots
+        self._bounds = np.searchsorted(rows, np.arange(len(observers) + 1))
+        self._rows = {int(slot): row for row, slot in enumerate(observers)}
+        self._pairs: Set[int] = set((observers[rows] * capacity + slots).tolist())
+
+    def visible_slots(self, observer_slot: int) -> np.ndarray:
+        """观察者可见的槽位（升序）"""
+        row = self._rows.get(observer_slot)
+        if row is None:
+            return self._slots[:0]
+        return self._slots[self._bounds[row]:self._bounds[row + 1]]
+
+    def can_see(self, observer_slot: int, slot: int) -> bool:
+        return observer_slot * self._capacity + slot in self._pairs
+
+
+class VisibilityCache:
+    """
+    每步的视线可见性缓存
+
+    对每一对（观察者类型, 被观察者类型）一次性计算全部可见关系：先通过空间索引做视野距离
+    预筛选，再对剩余的视线段批量做障碍物遮挡检测。结果以（位置版本, 障碍物版本）为键缓存，
+    同一步内位置未变化时所有智能体共享同一结果。
+    """
+
+    def __init__(self, world):
+        self.world = world
+        self._entries: Dict[Tuple[int, int], Visibility] = {}
+
+    def get(self, observer_kind: int, observee_kind: int) -> Visibility:
+        world = self.world
+        key = (world.position_epoch, world.obstacles.version)
+        entry = self._entries.get((observer_kind, observee_kind))
+        if entry is not None and entry.key == key:
+            return entry
+
+        observers = world.living_slots(observer_kind)
+        positions = world.positions[observers]
+        rows, slots, _ = world.query_kind(positions, world.vision_ranges[observers], observee_kind)
+        if observer_kind == observee_kind:
+            others = slots != observers[rows]
+            rows, slots = rows[others], slots[others]
+        if len(world.obstacles) and len(rows):
+            visible = ~world.obstacles.segments_blocked(positions[rows], world.positions[slots])
+            rows, slots = rows[visible], slots[visible]
+
+        entry = Visibility(key, world.capacity, observers, rows, slots)
+        self._entries[(observer_kind, observee_kind)] = entry
+        return entry
@@ -0,0 +1,390 @@
+import numpy as np
+from typing import List, Dict, Tuple, Optional, Any, Union
+
+from app.models.collision import earliest_hits, tangent_slide
+from app.models.obstacles import ObstacleSet
+from app.models.random_stream import RandomStream, default_stream
+from app.models.spatial_index import SpatialGrid
+from app.models.visibility import VisibilityCache
+
+# 障碍物安全边界
+OBSTACLE_MARGIN = 5.0
+
+# 边界安全距离
+BOUNDARY_MARGIN = 5.0
+
+# 猎手之间的排斥范围
+HUNTER_REPULSION_RANGE = 30.0
+
+# 空间索引建立后智能体可能移动的距离余量（以最大速度的倍数计，覆盖同一步内先后移动和速度调整）
+INDEX_SLACK_FACTOR = 2.0
+
+
+def _unit_vectors(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """按行归一化，返回 (单位向量, 长度)，零向量保持为零"""
+    norms = np.linalg.norm(vectors, axis=-1)
+    units = np.zeros_like(vectors)
+    nonzero = norms > 0
+    units[nonzero] = vectors[nonzero] / norms[nonzero, None]
+    return units, norms
+
+
+def clamp_to_boundary(positions: np.ndarray, boundary, margin: float = BOUNDARY_MARGIN) -> np.ndarray:
+    """将位置限制在环境边界内（原地修改并返回）"""
+    if boundary is None:
+        return positions
+    try:
+        min_x, min_y, max_x, max_y = boundary
+        positions[:, 0] = np.maximum(min_x + margin, np.minimum(max_x - margin, positions[:, 0]))
+        positions[:, 1] = np.maximum(min_y + margin, np.minimum(max_y - margin, positions[:, 1]))
+    except (TypeError, ValueError):
+        # 如果解包失败，使用默认边界
+        np.clip(positions, 0, 500, out=positions)
+    return positions
+
+
+def apf_directions(positions: np.ndarray, target_positions: np.ndarray,
+                   capture_ranges: np.ndarray, hunter_positions: np.ndarray,
+                   centers: np.ndarray, radii: np.ndarray,
+                   hunter_pairs: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+    """
+    批量计算人工势场法方向
+
+    Args:
+        positions: 待计算猎手的位置 (K, 2)
+        target_positions: 每个猎手追踪目标的位置 (K, 2)
+        capture_ranges: 每个猎手的捕获范围 (K,)
+        hunter_positions: 所有猎手的位置 (H, 2)，用于计算排斥力
+        centers, radii: 障碍物数组
+        hunter_pairs: 排斥范围内的 (positions行号, hunter_positions行号) 候选对，
+                      由空间索引给出；为空时计算稠密的 K x H 距离矩阵
+
+    Returns:
+        np.ndarray: 单位方向向量 (K, 2)
+    """
+    attraction, distance = _unit_vectors(target_positions - positions)
+
+    # 来自其他猎手的排斥力：离目标越近，排斥力越小
+    if hunter_pairs is None:
+        to_hunters = positions[:, None, :] - hunter_positions[None, :, :]
+        hunter_distance = np.linalg.norm(to_hunters, axis=2)
+        in_range = (hunter_distance > 0) & (hunter_distance < HUNTER_REPULSION_RANGE)
+        safe_distance = np.where(in_range, hunter_distance, 1.0)
+        coefficient = np.where(in_range, (HUNTER_REPULSION_RANGE - hunter_distance) / HUNTER_REPULSION_RANGE / safe_distance, 0.0)
+        repulsion = (to_hunters * coefficient[..., None]).sum(axis=1)
+    else:
+        rows, columns = hunter_pairs
+        to_hunters = positions[rows] - hunter_positions[columns]
+        hunter_distance = np.linalg.norm(to_hunters, axis=1)
+        in_range = (hunter_distance > 0) & (hunter_distance < HUNTER_REPULSION_RANGE)
+        coefficient = (HUNTER_REPULSION_RANGE - hunter_distance[in_range]) / HUNTER_REPULSION_RANGE / hunter_distance[in_range]
+        repulsion = np.zeros_like(positions)
+        np.add.at(repulsion, rows[in_range], to_hunters[in_range] * coefficient[:, None])
+    strength = np.where(distance < capture_ranges * 2.0, 0.0,
+                        np.where(distance < capture_ranges * 4.0, 0.1, 1.0))
+    repulsion = repulsion * strength[:, None]
+
+    # 障碍物排斥力
+    obstacle_avoidance = np.zeros_like(positions)
+    if len(radii):
+        to_obstacles = positions[:, None, :] - centers[None, :, :]
+        obstacle_distance = np.linalg.norm(to_obstacles, axis=2)
+        near = (obstacle_distance > 0) & (obstacle_distance < radii + 30)
+        safe_distance = np.where(near, obstacle_distance, 1.0)
+        coefficient = np.where(near, (radii + 30 - obstacle_distance) / 30 / safe_distance, 0.0)
+        obstacle_avoidance = (to_obstacles * coefficient[..., None]).sum(axis=1)
+
+    # 合并所有力 - 当靠近目标时增加吸引力权重并消除排斥力
+    close = distance < capture_ranges * 2.0
+    attraction_weight = np.where(close, 3.0, 1.5)
+    repulsion_weight = np.where(close, 0.0, 0.6)
+    combined = (attraction * attraction_weight[:, None] + repulsion * repulsion_weight[:, None]
+                + obstacle_avoidance * 1.2)
+
+    units, norms = _unit_vectors(combined)
+    # 合力为零时默认返回朝向目标的方向
+    return np.where((norms > 0)[:, None], units, attraction)
+
+
+def move_positions(positions: np.ndarray, directions: np.ndarray, velocities: np.ndarray,
+                   boundary, centers: np.ndarray, radii: np.ndarray,
+                   dt: float = 1.0, rng: Optional[RandomStream] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    批量执行移动规则：随机补偿、归一化、边界限制与障碍物切线滑动
+
+    Args:
+        rng: 随机数流，默认使用共享流
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (新位置 (K, 2), 实际发生移动的掩码 (K,))
+    """
+    rng = rng or default_stream
+    directions = np.array(directions, dtype=float).reshape(-1, 2)
+
+    # 确保总是有一些移动：方向向量太小时使用随机方向
+    still = np.flatnonzero(np.linalg.norm(directions, axis=1) < 0.001)
+    if len(still):
+        directions[still] = rng.unit_vectors(len(still)) * velocities[still, None]
+
+    units, norms = _unit_vectors(directions)
+    moving = norms > 0
+
+    # 计划移动到的新位置
+    planned = clamp_to_boundary(positions + units * (velocities * dt)[:, None], boundary)
+    new_positions = positions.copy()
+    new_positions[moving] = planned[moving]
+
+    # 障碍物检查 - 解析求解整条路径与障碍物的最早交点，不会因速度过大而穿过障碍物
+    if len(radii):
+        safe_radii = radii + OBSTACLE_MARGIN
+        hit, _, _, _, normals = earliest_hits(positions, planned, centers, safe_radii)
+        hit &= moving
+        if hit.any():
+            new_positions[hit] = tangent_slide(
+                positions[hit], units[hit], velocities[hit], normals[hit], centers, safe_radii, dt, rng
+            )
+
+    return new_positions, moving
+
+
+class WorldField:
+    """
+    智能体属性描述符：绑定到WorldState后读写对应的数组槽位，
+    未绑定时保存在实例字典中
+    """
+    def __init__(self, array_name: str, vector: bool = False, codes: Optional[Dict[Any, int]] = None):
+        self.array_name = array_name
+        self.vector = vector
+        self.codes = codes
+        self.values = {code: value for value, code in codes.items()} if codes else None
+
+    def __set_name__(self, owner, name):
+        self.attr = f"_{name}"
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        world = obj._world
+        if world is None:
+            return obj.__dict__[self.attr]
+        value = getattr(world, self.array_name)[obj._slot]
+        if self.vector:
+            return value
+        if self.values is not None:
+            return self.values[int(value)]
+        return value.item()
+
+    def __set__(self, obj, value):
+        world = obj._world
+        if world is None:
+            obj.__dict__[self.attr] = np.array(value, dtype=float) if self.vector else value
+            return
+        if self.array_name == 'positions':
+            world.position_epoch += 1
+        if self.codes is not None:
+            getattr(world, self.array_name)[obj._slot] = self.codes[value]
+        else:
+            getattr(world, self.array_name)[obj._slot] = value
+
+
+class WorldState:
+    """
+    结构化数组（SoA）世界状态
+
+    所有智能体的位置、速度、捕获范围、状态和存活标志各自保存在一个连续数组中，
+    按智能体槽位索引。智能体对象通过WorldField描述符成为这些数组上的视图，
+    每个模拟步的邻居、捕获、逃脱、方向和移动计算都对整个群体批量执行。
+    """
+    KIND_HUNTER = 0
+    KIND_TARGET = 1
+
+    # 猎手状态机状态编码（0表示无状态）
+    STATE_CODES = {None: 0, 'explore': 1, 'approach': 2, 'surround': 3, 'capture': 4}
+
+    # 每个智能体每步预取的随机数个数（探索、卡住和随机移动时使用）
+    RANDOM_DRAWS_PER_AGENT = 4
+
+    def __init__(self, capacity: int, environment_boundary: Tuple[float, float, float, float] = None,
+                 obstacles: Union[ObstacleSet, List[Dict], None] = None, trail_length: Optional[int] = None,
+                 rng: Optional[RandomStream] = None):
+        self.capacity = capacity
+        self.rng = rng or RandomStream()  # 本模拟专用的随机数流
+        self.trail_length = trail_length  # 每个智能体在内存中保留的轨迹点数
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros(capacity)
+        self.vision_ranges = np.zeros(capacity)
+        self.communication_ranges = np.zeros(capacity)
+        self.capture_ranges = np.zeros(capacity)
+        self.states = np.zeros(capacity, dtype=np.int8)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.kinds = np.zeros(capacity, dtype=np.int8)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.agents = []  # 槽位 -> 智能体对象
+        self.environment_boundary = environment_boundary
+        self.set_obstacles(obstacles)
+        self.grids: Dict[int, SpatialGrid] = {}  # 智能体类型 -> 本步空间索引
+        self.grid_slots: Dict[int, np.ndarray] = {}  # 智能体类型 -> 索引下标对应的槽位
+        self.position_epoch = 0  # 位置每次变化时递增，供依赖位置的缓存判断是否失效
+        self.visibility = VisibilityCache(self)
+
+    def attach(self, agent, kind: int) -> int:
+        """将智能体绑定到下一个空闲槽位，返回槽位索引"""
+        slot = len(self.agents)
+        if slot >= self.capacity:
+            raise ValueError(f"WorldState capacity {self.capacity} exceeded")
+
+        # 先读取未绑定时的属性值，再切换为数组视图
+        self.positions[slot] = agent.position
+        self.velocities[slot] = agent.velocity
+        self.vision_ranges[slot] = agent.vision_range
+        self.communication_ranges[slot] = agent.communication_range
+        self.capture_ranges[slot] = getattr(agent, 'capture_range', 0.0)
+        self.states[slot] = self.STATE_CODES.get(getattr(agent, 'state', None), 0)
+        self.alive[slot] = True
+        self.kinds[slot] = kind
+        self.ids[slot] = agent.id
+        self.position_epoch += 1
+
+        if self.trail_length:
+            agent.history.resize(self.trail_length)
+
+        agent._slot = slot
+        agent._world = self
+        self.agents.append(agent)
+        return slot
+
+    def set_obstacles(self, obstacles):
+        """更新障碍物（ObstacleSet或字典列表）"""
+        self.obstacles = ObstacleSet.coerce(obstacles)
+        self.obstacle_centers = self.obstacles.centers
+        self.obstacle_radii = self.obstacles.radii
+
+    def kill(self, agent):
+        """将智能体标记为已移除（被捕获或已逃脱）"""
+        self.alive[agent._slot] = False
+
+    def slots_of(self, agents) -> np.ndarray:
+        """获取智能体列表对应的槽位数组"""
+        return np.fromiter((agent._slot for agent in agents), dtype=np.intp, count=len(agents))
+
+    def living_slots(self, kind: int) -> np.ndarray:
+        """获取指定类型的存活智能体槽位（按槽位顺序）"""
+        count = len(self.agents)
+        return np.flatnonzero(self.alive[:count] & (self.kinds[:count] == kind))
+
+    def rebuild_index(self):
+        """按当前位置为每类存活智能体重建空间索引，并为本步批量预取随机数（每步开始时调用一次）"""
+        count = len(self.agents)
+        self.rng.prefetch(count * self.RANDOM_DRAWS_PER_AGENT)
+        alive = self.alive[:count]
+        if alive.any():
+            max_range = max(self.communication_ranges[:count][alive].max(),
+                            self.vision_ranges[:count][alive].max(),
+                            self.capture_ranges[:count][alive].max(),
+                            HUNTER_REPULSION_RANGE)
+            slack = self.velocities[:count][alive].max() * INDEX_SLACK_FACTOR
+        else:
+            max_range, slack = HUNTER_REPULSION_RANGE, 0.0
+
+        for kind in (self.KIND_HUNTER, self.KIND_TARGET):
+            slots = self.living_slots(kind)
+            self.grid_slots[kind] = slots
+            self.grids[kind] = SpatialGrid(self.positions[slots], max_range + slack, slack)
+
+    def query_kind(self, points: np.ndarray, radius, kind: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        在指定类型的空间索引中做批量半径查询（按当前位置精确过滤，跳过已移除的智能体）
+
+        Returns:
+            Tuple: (查询点行号, 被查询到的智能体槽位, 距离)
+        """
+        if kind not in self.grids:
+            self.rebuild_index()
+        grid_slots = self.grid_slots[kind]
+        rows, indices, distances = self.grids[kind].query_pairs(points, radius, self.positions[grid_slots])
+        slots = grid_slots[indices]
+        alive = self.alive[slots]
+        return rows[alive], slots[alive], distances[alive]
+
+    def agents_near(self, position: np.ndarray, radius: float, kind: int) -> List:
+        """半径内指定类型的存活智能体（按槽位顺序）"""
+        _, slots, _ = self.query_kind(position[None, :], radius, kind)
+        return [self.agents[slot] for slot in slots]
+
+    def can_see(self, observer_slot: int, slot: int) -> bool:
+        """视野范围内且视线未被障碍物阻挡（通过本步的可见性缓存查询）"""
+        visibility = self.visibility.get(int(self.kinds[observer_slot]), int(self.kinds[slot]))
+        return visibility.can_see(observer_slot, slot)
+
+    def visible_agents(self, observer_slot: int, kind: int) -> List:
+        """观察者可见的指定类型存活智能体（按槽位顺序）"""
+        visibility = self.visibility.get(int(self.kinds[observer_slot]), kind)
+        return [self.agents[slot] for slot in visibility.visible_slots(observer_slot)]
+
+    def update_neighbors(self):
+        """批量更新猎手的通信邻居和目标的协作邻居"""
+        for kind, attr in ((self.KIND_HUNTER, 'neighbors'), (self.KIND_TARGET, 'target_neighbors')):
+            slots = self.living_slots(kind)
+            rows, neighbor_slots, _ = self.query_kind(self.positions[slots], self.communication_ranges[slots], kind)
+            others = neighbor_slots != slots[rows]
+            rows, neighbor_slots = rows[others], neighbor_slots[others]
+            bounds = np.searchsorted(rows, np.arange(len(slots) + 1))
+            for row, slot in enumerate(slots):
+                setattr(self.agents[slot], attr,
+                        [self.agents[s] for s in neighbor_slots[bounds[row]:bounds[row + 1]]])
+
+    def detect_captures(self) -> List[Tuple[int, int]]:
+        """检测被捕获的目标，返回 (目标槽位, 捕获它的第一个猎手槽位) 列表"""
+        target_slots = self.living_slots(self.KIND_TARGET)
+        hunter_slots = self.living_slots(self.KIND_HUNTER)
+        if not len(hunter_slots) or not len(target_slots):
+            return []
+        rows, found_slots, distances = self.query_kind(
+            self.positions[target_slots], self.capture_ranges[hunter_slots].max(), self.KIND_HUNTER
+        )
+        within = distances <= self.capture_ranges[found_slots]
+        rows, found_slots = rows[within], found_slots[within]
+        # 结果按 (行号, 槽位) 排序，每个目标的第一条即槽位最小的猎手
+        first = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]]) if len(rows) else np.zeros(0, dtype=np.intp)
+        return [(int(target_slots[rows[i]]), int(found_slots[i])) for i in first]
+
+    def detect_escapes(self, env_size: float, border_margin: float = 10) -> np.ndarray:
+        """检测到达边界的目标槽位"""
+        target_slots = self.living_slots(self.KIND_TARGET)
+        positions = self.positions[target_slots]
+        at_border = ((positions <= border_margin) | (positions >= env_size - border_margin)).any(axis=1)
+        return target_slots[at_border]
+
+    def nearest_targets(self, hunter_slots: np.ndarray, target_slots: np.ndarray) -> np.ndarray:
+        """为每个猎手选择距离最近的目标槽位"""
+        distances = np.linalg.norm(
+            self.positions[hunter_slots][:, None, :] - self.positions[target_slots][None, :, :], axis=2
+        )
+        return target_slots[np.argmin(distances, axis=1)]
+
+    def apf_directions(self, hunter_slots: np.ndarray, target_slots: np.ndarray) -> np.ndarray:
+        """批量计算人工势场法方向，target_slots与hunter_slots一一对应"""
+        positions = self.positions[hunter_slots]
+        rows, neighbor_slots, _ = self.query_kind(positions, HUNTER_REPULSION_RANGE, self.KIND_HUNTER)
+        return apf_directions(
+            positions,
+            self.positions[target_slots],
+            self.capture_ranges[hunter_slots],
+            self.positions,
+            self.obstacle_centers,
+            self.obstacle_radii,
+            hunter_pairs=(rows, neighbor_slots),
+        )
+
+    def move_agents(self, slots: np.ndarray, directions: np.ndarray, dt: float = 1.0):
+        """批量移动指定槽位的智能体并记录轨迹"""
+        if not len(slots):
+            return
+        new_positions, moved = move_positions(
+            self.positions[slots], directions, self.velocities[slots],
+            self.environment_boundary, self.obstacle_centers, self.obstacle_radii, dt, self.rng
+        )
+        self.positions[slots] = new_positions
+        self.position_epoch += 1
+        for slot in slots[moved]:
+            self.agents[slot].history.append(self.positions[slot])
@@ -2,6 +2,8 @@ from pydantic import BaseModel, Field, field_serializer
 from typing import List, Dict, Optional, Any
 from datetime import datetime
 
+from app.models.random_stream import MAX_SEED
+
 # 基础模型
 class AgentBase(BaseModel):
     position: List[float]
@@ -31,6 +33,8 @@ class SimulationCreate(BaseModel):
     num_targets: int = Field(1, description="目标数量")
     algorithm_type: str = Field("APF", description="算法类型: APF, CONSENSUS")
     max_steps: int = Field(1000, description="最大步数")
+    trail_length: Optional[int] = Field(None, ge=1, description="内存中保留的轨迹点数，默认使用系统设置")
+    seed: Optional[int] = Field(None, ge=0, le=MAX_SEED, description="随机种子，相同种子和配置的运行完全相同；默认随机生成")
 
 class SimulationUpdate(BaseModel):
     name: Optional[str] = None
@@ -75,6 +79,7 @@ class SimulationResponse(BaseModel):
     targets: List[Dict[str, Any]]
     environment_size: int
     algorithm_type: str
+    seed: Optional[int] = None
     step_count: int
     is_running: bool
     is_captured: bool
@@ -95,4 +100,79 @@ class SimulationResponse(BaseModel):
         if isinstance(value, datetime):
             return value.isoformat()
         # 如果已经是字符串，直接返回
-        return value
\ No newline at end of file
+        return value
+
+# 无头批量运行相关模型
+class BatchRunRequest(BaseModel):
+    environment_size: int = Field(500, description="环境大小")
+    num_hunters: int = Field(5, description="猎手数量")
+    num_targets: int = Field(1, description="目标数量")
+    algorithm_type: str = Field("APF", description="算法类型: APF, CONSENSUS, ENCIRCLEMENT")
+    max_steps: int = Field(1000, description="最大步数")
+    num_obstacles: int = Field(3, description="障碍物数量")
+    repetitions: int = Field(10, ge=1, le=10000, description="重复运行次数")
+    max_workers: Optional[int] = Field(None, ge=1, description="进程池大小，默认为CPU核数")
+    seed: Optional[int] = Field(None, ge=0, le=MAX_SEED, description="随机种子，第i次运行使用 seed + i；默认每次随机生成")
+
+class BatchRunOutcome(BaseModel):
+    run_index: int
+    seed: Optional[int] = None
+    algorithm_type: str
+    steps: int
+    is_captured: bool
+    escaped: bool
+    captured_targets_count: int
+    escaped_targets_count: int
+    total_targets_count: int
+    capture_step: Optional[int] = None
+    target_capture_steps: List[int] = []
+    wall_time: float
+
+class BatchRunResponse(BaseModel):
+    config: Dict[str, Any]
+    summary: Dict[str, Any]
+    runs: List[BatchRunOutcome]
+
+class SweepRequest(BaseModel):
+    name: Optional[str] = Field(None, max_length=100, description="扫描任务名称")
+    grid: Optional[Dict[str, List[Any]]] = Field(None, description="参数名 -> 取值列表，取笛卡尔积")
+    configs: Optional[List[Dict[str, Any]]] = Field(None, description="显式的参数组合列表（与grid二选一）")
+    base: Dict[str, Any] = Field({}, description="所有组合共用的参数")
+    repetitions: int = Field(10, ge=1, le=10000, description="每个组合的重复运行次数")
+    seed: Optional[int] = Field(None, ge=0, le=MAX_SEED, description="随机种子，第i个组合第r次运行使用 seed + i * repetitions + r")
+
+class SweepResultResponse(BaseModel):
+    cell_index: int
+    config: Dict[str, Any]
+    algorithm_type: str
+    num_hunters: int
+    num_targets: int
+    environment_size: int
+    num_obstacles: int
+    runs: int
+    failed_runs: int
+    capture_rate: float
+    mean_steps: Optional[float] = None
+    mean_capture_step: Optional[float] = None
+    median_capture_step: Optional[float] = None
+    p10_capture_step: Optional[float] = None
+    p25_capture_step: Optional[float] = None
+    p75_capture_step: Optional[float] = None
+    p90_capture_step: Optional[float] = None
+    mean_wall_time: Optional[float] = None
+
+class SweepResponse(BaseModel):
+    id: int
+    name: Optional[str] = None
+    status: str
+    repetitions: int
+    seed: Optional[int] = None
+    total_runs: int
+    completed_runs: int
+    failed_runs: int
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    progress: Optional[Dict[str, Any]] = None
+    results: List[SweepResultResponse] = []
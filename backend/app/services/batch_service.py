@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from app.services.simulation_service import SimulationService
+
+logger = logging.getLogger(__name__)
+
+
+def run_headless(config: Dict, run_index: int = 0) -> Dict:
+    """
+    在当前进程中全速运行一次模拟直至结束（不等待、不写数据库）
+
+    Args:
+        config: 模拟配置，与create_simulation的config相同；指定seed时第i次运行使用 seed + i
+        run_index: 本次运行的序号
+
+    Returns:
+        Dict: 运行结果
+    """
+    config = dict(config)
+    if config.get("seed") is not None:
+        config["seed"] = config["seed"] + run_index
+
+    service = SimulationService()
+    service.create_simulation(run_index, config)
+    service.start_simulation(run_index)
+    simulation = service.simulations[run_index]
+
+    started = time.perf_counter()
+    while simulation["is_running"]:
+        service.advance_simulation(run_index, persist=False)
+    wall_time = time.perf_counter() - started
+
+    return {
+        "run_index": run_index,
+        "seed": simulation["seed"],
+        "algorithm_type": simulation["algorithm_type"],
+        "steps": simulation["step_count"],
+        "is_captured": simulation["is_captured"],
+        "escaped": simulation["escaped"],
+        "captured_targets_count": simulation["captured_targets_count"],
+        "escaped_targets_count": simulation["escaped_targets_count"],
+        "total_targets_count": simulation["total_targets_count"],
+        "capture_step": simulation["end_step"] if simulation["is_captured"] else None,
+        "target_capture_steps": list(simulation["capture_steps"]),
+        "wall_time": wall_time,
+    }
+
+
+def summarize_runs(runs: List[Dict]) -> Dict:
+    """汇总多次运行的结果"""
+    capture_steps = [run["capture_step"] for run in runs if run["capture_step"] is not None]
+    return {
+        "runs": len(runs),
+        "capture_rate": len(capture_steps) / len(runs) if runs else 0.0,
+        "mean_steps": float(np.mean([run["steps"] for run in runs])) if runs else None,
+        "mean_capture_step": float(np.mean(capture_steps)) if capture_steps else None,
+        "median_capture_step": float(np.median(capture_steps)) if capture_steps else None,
+        "captured_targets_count": sum(run["captured_targets_count"] for run in runs),
+        "escaped_targets_count": sum(run["escaped_targets_count"] for run in runs),
+    }
+
+
+class BatchRunService:
+    """无头批量运行服务，在进程池中全速运行多次模拟"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers
+
+    def run(self, config: Dict, repetitions: int, max_workers: Optional[int] = None) -> List[Dict]:
+        """
+        重复运行同一配置
+
+        Args:
+            config: 模拟配置
+            repetitions: 重复次数
+            max_workers: 进程池大小，默认使用服务配置或CPU核数
+
+        Returns:
+            List[Dict]: 按run_index排序的运行结果
+        """
+        workers = self._workers(repetitions, max_workers)
+        logger.info(f"开始批量运行: {config.get('algorithm_type')} x {repetitions}, 进程数 {workers}")
+
+        started = time.perf_counter()
+        if workers == 1:
+            runs = [run_headless(config, i) for i in range(repetitions)]
+        else:
+            with self._pool(workers) as pool:
+                runs = list(pool.map(run_headless, [config] * repetitions, range(repetitions)))
+
+        logger.info(f"批量运行完成: {repetitions}次, 耗时 {time.perf_counter() - started:.2f}秒")
+        return runs
+
+    async def run_async(self, config: Dict, repetitions: int, max_workers: Optional[int] = None) -> List[Dict]:
+        """
+        在事件循环中重复运行同一配置，参数和返回值与run相同
+
+        单进程时也使用进程池，模拟计算不占用事件循环所在进程的GIL。
+        协程被取消时取消尚未开始的运行，不等待进程池退出。
+        """
+        workers = self._workers(repetitions, max_workers)
+        logger.info(f"开始批量运行: {config.get('algorithm_type')} x {repetitions}, 进程数 {workers}")
+
+        started = time.perf_counter()
+        pool = self._pool(workers)
+        futures = [pool.submit(run_headless, config, i) for i in range(repetitions)]
+        try:
+            runs = await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        # 所有运行已完成，进程退出很快，但仍放到线程中等待
+        await asyncio.to_thread(pool.shutdown)
+
+        logger.info(f"批量运行完成: {repetitions}次, 耗时 {time.perf_counter() - started:.2f}秒")
+        return list(runs)
+
+    def _workers(self, repetitions: int, max_workers: Optional[int]) -> int:
+        workers = max_workers or self.max_workers or multiprocessing.cpu_count()
+        return max(1, min(workers, repetitions))
+
+    @staticmethod
+    def _pool(workers: int) -> ProcessPoolExecutor:
+        # 使用spawn避免在多线程服务进程中fork
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
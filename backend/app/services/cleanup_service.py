@@ -3,14 +3,20 @@ import json
 import csv
 import logging
 import asyncio
+import time
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import delete, func, inspect, select
 from typing import List, Dict, Any, Optional
 import pandas as pd
 
-from app.models.db_models import Simulation, Agent, AgentPosition, SimulationSnapshot
-from app.database import SessionLocal
+from app.config import settings
+from app.models.db_models import Simulation, Agent, AgentPosition, SimulationSnapshot, TrajectoryChunk
+from app.database import Base, db_executor, incremental_vacuum, run_db
+from app.services.export_service import (
+    FORMAT_CSV, FORMAT_NDJSON, POSITION_COLUMNS, SNAPSHOT_COLUMNS, RecordEncoder,
+    iter_position_records, iter_snapshot_records,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +44,9 @@ class CleanupService:
         self.export_dir = export_dir
         os.makedirs(self.export_dir, exist_ok=True)
         
+        # 最近一次（或正在进行的）清理的进度和吞吐
+        self.stats: Dict[str, Any] = {"running": False}
+        
         logger.info(f"Cleanup service initialized with data retention of {data_retention_days} days")
         logger.info(f"Export directory set to: {export_dir}")
     
@@ -60,67 +69,151 @@ class CleanupService:
                 # 即使出错也等待一段时间再重试
                 await asyncio.sleep(3600)
     
-    async def cleanup_old_simulations(self):
-        """清理过期的模拟数据"""
+    async def cleanup_old_simulations(self) -> Dict[str, Any]:
+        """
+        清理过期的模拟数据
+
+        所有数据库操作都在数据库线程池中执行：每个过期模拟先导出，再按子表分块删除
+        （每个事务最多 CLEANUP_DELETE_CHUNK_SIZE 行，事务之间让出数据库），最后删除模拟记录；
+        全部删除后分步执行增量VACUUM回收空闲页。中途失败的模拟保留模拟记录，下次清理时继续。
+
+        Returns:
+            Dict: 本次清理的统计
+        """
+        if self.stats["running"]:
+            logger.warning("Cleanup already running, skipping")
+            return self.stats
+        
+        cutoff_date = datetime.utcnow() - timedelta(days=self.data_retention_days)
+        started = time.monotonic()
+        self.stats.update({
+            "running": True,
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+            "cutoff": cutoff_date.isoformat(),
+            "simulations_total": 0,
+            "simulations_deleted": 0,
+            "simulations_failed": 0,
+            "rows_deleted": {table: 0 for table in self._child_tables()},
+            "delete_seconds": 0.0,
+            "rows_per_second": 0.0,
+            "pages_reclaimed": 0,
+            "freelist_pages": None,
+            "vacuum_seconds": 0.0,
+            "error": None,
+        })
+        
         try:
             logger.info("Starting cleanup of old simulations")
-            # 计算截止日期
-            cutoff_date = datetime.utcnow() - timedelta(days=self.data_retention_days)
+            simulation_ids = await run_db(self._expired_simulation_ids, cutoff_date)
+            self.stats["simulations_total"] = len(simulation_ids)
+            if not simulation_ids:
+                logger.info("No old simulations found to clean up")
+            else:
+                logger.info(f"Found {len(simulation_ids)} old simulations to clean up")
             
-            # 获取数据库会话
-            db = SessionLocal()
-            try:
-                # 检查表是否存在
-                from sqlalchemy import inspect
-                inspector = inspect(db.bind)
-                if 'simulations' not in inspector.get_table_names():
-                    logger.warning("Simulations table does not exist yet, skipping cleanup")
-                    return
-                    
-                # 查找过期的模拟
-                old_simulations = db.query(Simulation).filter(
-                    Simulation.created_at < cutoff_date
-                ).all()
-                
-                if not old_simulations:
-                    logger.info("No old simulations found to clean up")
-                    return
-                
-                logger.info(f"Found {len(old_simulations)} old simulations to clean up")
-                
-                # 导出并删除每个过期模拟
-                for simulation in old_simulations:
-                    try:
-                        # 先导出数据
-                        await self.export_simulation(db, simulation.id)
-                        
-                        # 删除相关数据（利用外键CASCADE删除）
-                        db.delete(simulation)
-                        logger.info(f"Deleted simulation {simulation.id}: {simulation.name}")
-                    except Exception as e:
-                        logger.error(f"Error processing simulation {simulation.id}: {str(e)}")
-                        # 继续处理其他模拟
-                
-                # 提交事务
-                db.commit()
-                logger.info("Cleanup completed successfully")
-                
-                # 执行数据库优化（SQLite特定操作）
-                db.execute("VACUUM")
-                logger.info("Database optimized with VACUUM")
-                
-            except Exception as e:
-                logger.error(f"Database error during cleanup: {str(e)}")
-                db.rollback()
-            finally:
-                db.close()
-                
+            for index, simulation_id in enumerate(simulation_ids, 1):
+                try:
+                    # 先导出数据
+                    await run_db(self.export_simulation, simulation_id)
+                    await self._delete_simulation(simulation_id)
+                    self.stats["simulations_deleted"] += 1
+                except Exception as e:
+                    self.stats["simulations_failed"] += 1
+                    logger.error(f"Error processing simulation {simulation_id}: {str(e)}")
+                    # 继续处理其他模拟
+                logger.info(
+                    f"Cleanup progress {index}/{len(simulation_ids)}: "
+                    f"{sum(self.stats['rows_deleted'].values())} rows deleted, "
+                    f"{self.stats['rows_per_second']:.0f} rows/s"
+                )
+            
+            # 分步回收空闲页（SQLite特定操作），每步只短暂持有写锁
+            await self._reclaim_free_pages()
+            logger.info(
+                f"Cleanup completed: {self.stats['simulations_deleted']} simulations, "
+                f"{sum(self.stats['rows_deleted'].values())} rows deleted, "
+                f"{self.stats['pages_reclaimed']} pages reclaimed"
+            )
         except Exception as e:
+            self.stats["error"] = str(e)
             logger.error(f"Unexpected error in cleanup: {str(e)}")
+        finally:
+            self.stats["running"] = False
+            self.stats["finished_at"] = datetime.utcnow().isoformat()
+            self.stats["duration_seconds"] = round(time.monotonic() - started, 3)
+        return self.stats
+    
+    @staticmethod
+    def _child_tables() -> Dict[str, Any]:
+        """模拟的子表及选出某个模拟的行的条件，按删除顺序排列"""
+        return {
+            "agent_positions": lambda simulation_id: AgentPosition.agent_id.in_(
+                select(Agent.id).where(Agent.simulation_id == simulation_id)),
+            "simulation_snapshots": lambda simulation_id: SimulationSnapshot.simulation_id == simulation_id,
+            "trajectory_chunks": lambda simulation_id: TrajectoryChunk.simulation_id == simulation_id,
+            "agents": lambda simulation_id: Agent.simulation_id == simulation_id,
+        }
+    
+    @staticmethod
+    def _expired_simulation_ids(db: Session, cutoff_date: datetime) -> List[int]:
+        # 检查表是否存在
+        if 'simulations' not in inspect(db.bind).get_table_names():
+            logger.warning("Simulations table does not exist yet, skipping cleanup")
+            return []
+        return [row[0] for row in db.query(Simulation.id).filter(
+            Simulation.created_at < cutoff_date
+        ).order_by(Simulation.id)]
+    
+    @staticmethod
+    def _delete_chunk(db: Session, table: str, simulation_id: int, limit: int) -> int:
+        """在一个事务中删除一个模拟在某个子表中的最多 limit 行，返回删除的行数"""
+        model = Base.metadata.tables[table]
+        condition = CleanupService._child_tables()[table](simulation_id)
+        chunk = select(model.c.id).where(condition).limit(limit)
+        result = db.execute(delete(model).where(model.c.id.in_(chunk)))
+        db.commit()
+        return result.rowcount
+    
+    @staticmethod
+    def _delete_simulation_row(db: Session, simulation_id: int):
+        db.execute(delete(Simulation.__table__).where(Simulation.id == simulation_id))
+        db.commit()
+    
+    async def _delete_simulation(self, simulation_id: int):
+        """分块删除一个模拟的所有数据，模拟记录最后删除"""
+        chunk_size = settings.CLEANUP_DELETE_CHUNK_SIZE
+        for table in self._child_tables():
+            while True:
+                started = time.monotonic()
+                deleted = await run_db(self._delete_chunk, table, simulation_id, chunk_size)
+                self.stats["delete_seconds"] += time.monotonic() - started
+                self.stats["rows_deleted"][table] += deleted
+                total = sum(self.stats["rows_deleted"].values())
+                self.stats["rows_per_second"] = round(total / self.stats["delete_seconds"], 1) if self.stats["delete_seconds"] else 0.0
+                if deleted < chunk_size:
+                    break
+                # 让模拟的持久化写入有机会拿到写锁
+                await asyncio.sleep(settings.CLEANUP_CHUNK_PAUSE)
+        await run_db(self._delete_simulation_row, simulation_id)
+        logger.info(f"Deleted simulation {simulation_id}")
+    
+    async def _reclaim_free_pages(self):
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        for _ in range(settings.CLEANUP_MAX_VACUUM_STEPS):
+            reclaimed, remaining = await loop.run_in_executor(
+                db_executor, incremental_vacuum, settings.CLEANUP_VACUUM_PAGES)
+            self.stats["pages_reclaimed"] += reclaimed
+            self.stats["freelist_pages"] = remaining
+            if not reclaimed or not remaining:
+                break
+            await asyncio.sleep(settings.CLEANUP_CHUNK_PAUSE)
+        self.stats["vacuum_seconds"] = round(time.monotonic() - started, 3)
     
-    async def export_simulation(self, db: Session, simulation_id: int) -> str:
+    def export_simulation(self, db: Session, simulation_id: int) -> str:
         """
-        导出模拟数据到CSV和JSON文件
+        导出模拟数据到CSV、JSON和NDJSON文件（同步执行，应通过 run_db 调用）
         
         Args:
             db: 数据库会话
@@ -154,51 +247,20 @@ class CleanupService:
             df_agents = pd.DataFrame(agent_data)
             df_agents.to_csv(os.path.join(export_subdir, "agents.csv"), index=False)
         
-        # 导出位置历史（CSV，分批处理大数据）
-        positions_query = db.query(AgentPosition).join(
-            Agent, Agent.id == AgentPosition.agent_id
-        ).filter(
-            Agent.simulation_id == simulation_id
+        # 导出位置历史（CSV）和快照（NDJSON），按键集分页逐页写入
+        exports = (
+            ("positions.csv", POSITION_COLUMNS, FORMAT_CSV, iter_position_records),
+            ("snapshots.ndjson", SNAPSHOT_COLUMNS, FORMAT_NDJSON, iter_snapshot_records),
         )
-        
-        # 计算记录数量
-        positions_count = positions_query.count()
-        logger.info(f"Exporting {positions_count} position records for simulation {simulation_id}")
-        
-        if positions_count > 0:
-            # 使用pandas分批处理和写入
-            batch_size = 10000
-            batches = (positions_count // batch_size) + (1 if positions_count % batch_size else 0)
-            
-            with open(os.path.join(export_subdir, "positions.csv"), 'w', newline='') as f:
-                # 先写入CSV头
-                writer = csv.writer(f)
-                writer.writerow(["agent_id", "step", "position_x", "position_y", "timestamp"])
-                
-                # 分批处理数据
-                for i in range(batches):
-                    positions_batch = positions_query.order_by(
-                        AgentPosition.agent_id, AgentPosition.step
-                    ).offset(i * batch_size).limit(batch_size).all()
-                    
-                    for position in positions_batch:
-                        writer.writerow([
-                            position.agent_id,
-                            position.step,
-                            position.position_x,
-                            position.position_y,
-                            position.timestamp.isoformat() if position.timestamp else None
-                        ])
-        
-        # 导出快照数据（JSON）
-        snapshots = db.query(SimulationSnapshot).filter(
-            SimulationSnapshot.simulation_id == simulation_id
-        ).order_by(SimulationSnapshot.step).all()
-        
-        if snapshots:
-            snapshots_data = [snapshot.to_dict() for snapshot in snapshots]
-            with open(os.path.join(export_subdir, "snapshots.json"), 'w', encoding='utf-8') as f:
-                json.dump(snapshots_data, f, ensure_ascii=False, indent=2)
+        for filename, columns, format, pages in exports:
+            encoder = RecordEncoder(columns, format)
+            records = 0
+            with open(os.path.join(export_subdir, filename), 'wb') as f:
+                for page in pages(db, simulation_id):
+                    f.write(encoder.encode(page))
+                    records += len(page)
+                f.write(encoder.finish())
+            logger.info(f"Exported {records} records to {filename} for simulation {simulation_id}")
         
         logger.info(f"Export completed to {export_subdir}")
         return export_subdir
@@ -206,22 +268,19 @@ class CleanupService:
     async def export_all_simulations(self):
         """导出所有模拟数据"""
         logger.info("Starting export of all simulations")
-        db = SessionLocal()
         try:
-            simulations = db.query(Simulation).all()
-            logger.info(f"Found {len(simulations)} simulations to export")
+            simulation_ids = await run_db(lambda db: [row[0] for row in db.query(Simulation.id)])
+            logger.info(f"Found {len(simulation_ids)} simulations to export")
             
-            for simulation in simulations:
+            for simulation_id in simulation_ids:
                 try:
-                    await self.export_simulation(db, simulation.id)
+                    await run_db(self.export_simulation, simulation_id)
                 except Exception as e:
-                    logger.error(f"Error exporting simulation {simulation.id}: {str(e)}")
+                    logger.error(f"Error exporting simulation {simulation_id}: {str(e)}")
             
             logger.info("Export of all simulations completed")
         except Exception as e:
             logger.error(f"Error in export_all_simulations: {str(e)}")
-        finally:
-            db.close()
 
 # 创建一个方法用于在应用启动时初始化清理服务
 def init_cleanup_service(app):
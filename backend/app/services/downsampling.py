@@ -0,0 +1,130 @@
+"""
+轨迹降采样
+
+所有函数接收一条轨迹的位置 (T, 2)，返回保留点的下标（升序，总包含首尾两点），
+调用方用下标同时截取步数和位置。
+
+- stride:          每隔 stride 个点取一个；
+- lttb:            Largest-Triangle-Three-Buckets，把中间点等分为 max_points - 2 个桶，
+                   每个桶取与上一个选中点、下一个桶平均点构成三角形面积最大的点，保留转折；
+- douglas_peucker: 从首尾连线开始，反复在偏离当前折线最远的点处切分，
+                   直到达到 max_points 个点或最大偏离不超过 epsilon。
+"""
+import heapq
+from typing import Optional
+
+import numpy as np
+
+METHOD_LTTB = "lttb"
+METHOD_DOUGLAS_PEUCKER = "douglas-peucker"
+METHOD_STRIDE = "stride"
+METHODS = (METHOD_LTTB, METHOD_DOUGLAS_PEUCKER, METHOD_STRIDE)
+
+
+def stride(count: int, step: int) -> np.ndarray:
+    """每隔 step 个点取一个，并保留最后一点"""
+    if count <= 2 or step <= 1:
+        return np.arange(count)
+    indices = np.arange(0, count, step)
+    if indices[-1] != count - 1:
+        indices = np.append(indices, count - 1)
+    return indices
+
+
+def lttb(points: np.ndarray, max_points: int) -> np.ndarray:
+    """按 Largest-Triangle-Three-Buckets 选出最多 max_points 个点"""
+    count = len(points)
+    if max_points >= count or count <= 2:
+        return np.arange(count)
+    if max_points <= 2:
+        return np.array([0, count - 1])
+
+    points = np.asarray(points, dtype=np.float64)
+    # 中间的 count - 2 个点等分为 max_points - 2 个桶
+    edges = np.linspace(1, count - 1, max_points - 1).astype(np.int64)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+
+    previous = points[0]
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        if bucket + 2 < len(edges):
+            following = points[edges[bucket + 1]:edges[bucket + 2]].mean(axis=0)
+        else:
+            following = points[-1]
+        candidates = points[start:end]
+        # 三角形面积的两倍（叉积的绝对值）
+        areas = np.abs((previous[0] - following[0]) * (candidates[:, 1] - previous[1])
+                       - (previous[0] - candidates[:, 0]) * (following[1] - previous[1]))
+        chosen = start + int(np.argmax(areas))
+        selected[bucket + 1] = chosen
+        previous = points[chosen]
+    # 桶宽接近1时取整可能让相邻桶重叠
+    return np.unique(selected)
+
+
+def _farthest(points: np.ndarray, start: int, end: int):
+    """区间 (start, end) 内离线段 start-end 最远的点及其距离"""
+    if end - start < 2:
+        return 0.0, -1
+    a, b = points[start], points[end]
+    inner = points[start + 1:end]
+    direction = b - a
+    length = np.hypot(direction[0], direction[1])
+    if length == 0:
+        distances = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+    else:
+        distances = np.abs(direction[0] * (inner[:, 1] - a[1]) - direction[1] * (inner[:, 0] - a[0])) / length
+    index = int(np.argmax(distances))
+    return float(distances[index]), start + 1 + index
+
+
+def douglas_peucker(points: np.ndarray, max_points: Optional[int] = None, epsilon: Optional[float] = None) -> np.ndarray:
+    """
+    按 Douglas-Peucker 选点
+
+    Args:
+        max_points: 最多保留的点数（为空时不限）
+        epsilon: 允许的最大偏离距离（为空时只受 max_points 限制）
+    """
+    count = len(points)
+    if count <= 2 or (max_points is not None and max_points >= count and epsilon is None):
+        return np.arange(count)
+    limit = max(2, max_points) if max_points is not None else count
+    epsilon = epsilon if epsilon is not None else 0.0
+
+    points = np.asarray(points, dtype=np.float64)
+    selected = [0, count - 1]
+    # 最大堆：(-距离, 区间起点, 区间终点, 最远点)
+    distance, index = _farthest(points, 0, count - 1)
+    heap = [(-distance, 0, count - 1, index)]
+    while heap and len(selected) < limit:
+        negative_distance, start, end, index = heapq.heappop(heap)
+        if index < 0 or -negative_distance <= epsilon:
+            break
+        selected.append(index)
+        for segment in ((start, index), (index, end)):
+            distance, farthest = _farthest(points, *segment)
+            if farthest >= 0:
+                heapq.heappush(heap, (-distance, segment[0], segment[1], farthest))
+    return np.sort(np.array(selected, dtype=np.int64))
+
+
+def downsample(points: np.ndarray, method: str = METHOD_LTTB, max_points: Optional[int] = None,
+               step: int = 1, epsilon: Optional[float] = None) -> np.ndarray:
+    """
+    先按 step 抽取，再按 method 降到最多 max_points 个点
+
+    Returns:
+        np.ndarray: 保留点在 points 中的下标
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    indices = stride(len(points), step)
+    if method == METHOD_STRIDE or (max_points is None and epsilon is None):
+        return indices
+    if method == METHOD_DOUGLAS_PEUCKER:
+        return indices[douglas_peucker(points[indices], max_points, epsilon)]
+    if max_points is None:
+        return indices
+    return indices[lttb(points[indices], max_points)]
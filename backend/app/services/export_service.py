@@ -0,0 +1,230 @@
+"""
+位置历史和快照的流式导出
+
+按键集分页读取（位置按 (agent_id, step)，快照按 (step, id)），每页在独立会话中查询，
+编码为CSV或NDJSON后立即输出，可选边输出边gzip压缩，内存占用与总行数无关。
+有轨迹块的模拟从轨迹块按步数窗口读取位置（按 (step, 智能体) 排序，没有逐行时间戳），
+只有 agent_positions 的模拟才从位置表读取。
+"""
+import csv
+import io
+import json
+import zlib
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.db_models import Agent, AgentPosition, SimulationSnapshot, TrajectoryChunk
+from app.services.trajectory_store import read_trajectory, trajectory_bounds
+
+FORMAT_CSV = "csv"
+FORMAT_NDJSON = "ndjson"
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+
+DATASET_POSITIONS = "positions"
+DATASET_SNAPSHOTS = "snapshots"
+DATASETS = (DATASET_POSITIONS, DATASET_SNAPSHOTS)
+
+MEDIA_TYPES = {FORMAT_CSV: "text/csv", FORMAT_NDJSON: "application/x-ndjson"}
+
+POSITION_COLUMNS = ["agent_id", "type", "step", "position_x", "position_y", "timestamp"]
+SNAPSHOT_COLUMNS = ["id", "step", "kind", "is_final", "captured_targets_count", "escaped_targets_count",
+                    "timestamp", "hunters_state", "targets_state"]
+COLUMNS = {DATASET_POSITIONS: POSITION_COLUMNS, DATASET_SNAPSHOTS: SNAPSHOT_COLUMNS}
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def simulation_agents(db: Session, simulation_id: int) -> List[Tuple[int, int, str]]:
+    """模拟的智能体 (主键, agent_id, 类型)，按主键排序"""
+    return [tuple(row) for row in db.query(Agent.id, Agent.agent_id, Agent.type)
+            .filter(Agent.simulation_id == simulation_id).order_by(Agent.id)]
+
+
+def fetch_position_page(db: Session, agent_pk: int, after: Optional[Tuple[int, int]], limit: int) -> List[Tuple]:
+    """读取一个智能体在 (step, id) 之后的一页位置记录"""
+    query = db.query(AgentPosition.step, AgentPosition.id, AgentPosition.position_x,
+                     AgentPosition.position_y, AgentPosition.timestamp).filter(AgentPosition.agent_id == agent_pk)
+    if after is not None:
+        step, position_id = after
+        query = query.filter(or_(AgentPosition.step > step,
+                                 and_(AgentPosition.step == step, AgentPosition.id > position_id)))
+    return [tuple(row) for row in query.order_by(AgentPosition.step, AgentPosition.id).limit(limit)]
+
+
+def trajectory_layout(db: Session, simulation_id: int) -> Optional[Tuple[int, int, int]]:
+    """轨迹块的 (首步, 末步, 智能体数)，智能体数以最新的块为准；没有轨迹块时返回None"""
+    latest = db.query(TrajectoryChunk.num_agents).filter(
+        TrajectoryChunk.simulation_id == simulation_id).order_by(TrajectoryChunk.id.desc()).first()
+    if latest is None:
+        return None
+    bounds = trajectory_bounds(db, simulation_id)
+    return bounds[0], bounds[1], latest[0]
+
+
+def _trajectory_windows(layout: Tuple[int, int, int], page_size: int) -> Iterator[Tuple[int, int]]:
+    """按每页约 page_size 行划分步数窗口，窗口不小于一个轨迹块，避免同一块被反复解码"""
+    first, last, num_agents = layout
+    width = max(page_size // max(num_agents, 1), settings.TRAJECTORY_CHUNK_STEPS)
+    for start in range(first, last + 1, width):
+        yield start, min(start + width - 1, last)
+
+
+def fetch_trajectory_page(db: Session, simulation_id: int, from_step: int, to_step: int) -> List[Dict]:
+    """从轨迹块读取 [from_step, to_step] 内的位置记录，按 (step, 智能体) 排序"""
+    trajectory = read_trajectory(db, simulation_id, from_step, to_step)
+    positions = np.round(trajectory.positions.astype(np.float64), 3).tolist()
+    return [{"agent_id": agent_id, "type": agent_type, "step": step, "position_x": x, "position_y": y,
+             "timestamp": None}
+            for step, row in zip(trajectory.steps.tolist(), positions)
+            for (agent_type, agent_id), (x, y) in zip(trajectory.agents, row)]
+
+
+def fetch_snapshot_page(db: Session, simulation_id: int, after: Optional[Tuple[int, int]], limit: int) -> List[Dict]:
+    """读取模拟在 (step, id) 之后的一页快照"""
+    query = db.query(SimulationSnapshot).filter(SimulationSnapshot.simulation_id == simulation_id)
+    if after is not None:
+        step, snapshot_id = after
+        query = query.filter(or_(SimulationSnapshot.step > step,
+                                 and_(SimulationSnapshot.step == step, SimulationSnapshot.id > snapshot_id)))
+    return [snapshot.to_dict() for snapshot in query.order_by(SimulationSnapshot.step, SimulationSnapshot.id).limit(limit)]
+
+
+def _position_records(agent: Tuple[int, int, str], page: List[Tuple]) -> List[Dict]:
+    _, agent_id, agent_type = agent
+    return [{"agent_id": agent_id, "type": agent_type, "step": step, "position_x": x, "position_y": y,
+             "timestamp": _isoformat(timestamp)} for step, _, x, y, timestamp in page]
+
+
+def _snapshot_records(page: List[Dict]) -> List[Dict]:
+    records = []
+    for snapshot in page:
+        record = {column: snapshot.get(column) for column in SNAPSHOT_COLUMNS}
+        for column in ("hunters_state", "targets_state"):
+            try:
+                record[column] = json.loads(record[column])
+            except (TypeError, ValueError):
+                pass
+        records.append(record)
+    return records
+
+
+def iter_position_records(db: Session, simulation_id: int, page_size: int = None) -> Iterator[List[Dict]]:
+    """同步逐页读取位置记录（供文件导出使用）"""
+    page_size = page_size or settings.EXPORT_PAGE_SIZE
+    layout = trajectory_layout(db, simulation_id)
+    if layout is not None:
+        for from_step, to_step in _trajectory_windows(layout, page_size):
+            page = fetch_trajectory_page(db, simulation_id, from_step, to_step)
+            if page:
+                yield page
+        return
+    for agent in simulation_agents(db, simulation_id):
+        after = None
+        while True:
+            page = fetch_position_page(db, agent[0], after, page_size)
+            if not page:
+                break
+            yield _position_records(agent, page)
+            after = page[-1][:2]
+
+
+def iter_snapshot_records(db: Session, simulation_id: int, page_size: int = None) -> Iterator[List[Dict]]:
+    """同步逐页读取快照记录（供文件导出使用）"""
+    page_size = page_size or settings.EXPORT_PAGE_SIZE
+    after = None
+    while True:
+        page = fetch_snapshot_page(db, simulation_id, after, page_size)
+        if not page:
+            break
+        yield _snapshot_records(page)
+        after = (page[-1]["step"], page[-1]["id"])
+
+
+class RecordEncoder:
+    """把记录编码为CSV或NDJSON文本，可选gzip压缩"""
+
+    def __init__(self, columns: List[str], format: str = FORMAT_CSV, compress: bool = False):
+        self.columns = columns
+        self.format = format
+        # wbits=31 输出带gzip头和校验的流
+        self._compressor = zlib.compressobj(settings.EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+        self._header_written = False
+
+    def _output(self, text: str) -> bytes:
+        data = text.encode("utf-8")
+        return self._compressor.compress(data) if self._compressor else data
+
+    def encode(self, records: List[Dict]) -> bytes:
+        if self.format == FORMAT_NDJSON:
+            text = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            if not self._header_written:
+                writer.writerow(self.columns)
+                self._header_written = True
+            for record in records:
+                writer.writerow([json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else value
+                                 for value in (record.get(column) for column in self.columns)])
+            text = buffer.getvalue()
+        return self._output(text)
+
+    def finish(self) -> bytes:
+        # 没有任何记录时CSV也输出表头
+        data = self.encode([]) if self.format == FORMAT_CSV and not self._header_written else b""
+        if self._compressor:
+            data += self._compressor.flush()
+        return data
+
+
+async def stream_export(run_db: Callable, simulation_id: int, dataset: str, format: str = FORMAT_CSV,
+                        compress: bool = False, page_size: int = None) -> AsyncIterator[bytes]:
+    """
+    逐页读取并编码导出数据
+
+    Args:
+        run_db: 在数据库线程池中执行查询的协程函数（app.database.run_db）
+        dataset: positions 或 snapshots
+        format: csv 或 ndjson
+        compress: 是否gzip压缩
+    """
+    page_size = page_size or settings.EXPORT_PAGE_SIZE
+    encoder = RecordEncoder(COLUMNS[dataset], format, compress)
+
+    layout = await run_db(trajectory_layout, simulation_id) if dataset == DATASET_POSITIONS else None
+    if layout is not None:
+        for from_step, to_step in _trajectory_windows(layout, page_size):
+            data = encoder.encode(await run_db(fetch_trajectory_page, simulation_id, from_step, to_step))
+            if data:
+                yield data
+    elif dataset == DATASET_POSITIONS:
+        for agent in await run_db(simulation_agents, simulation_id):
+            after = None
+            while True:
+                page = await run_db(fetch_position_page, agent[0], after, page_size)
+                if not page:
+                    break
+                data = encoder.encode(_position_records(agent, page))
+                if data:
+                    yield data
+                after = page[-1][:2]
+    else:
+        after = None
+        while True:
+            page = await run_db(fetch_snapshot_page, simulation_id, after, page_size)
+            if not page:
+                break
+            data = encoder.encode(_snapshot_records(page))
+            if data:
+                yield data
+            after = (page[-1]["step"], page[-1]["id"])
+
+    data = encoder.finish()
+    if data:
+        yield data
@@ -0,0 +1,116 @@
+"""
+WebSocket二进制位置帧编码
+
+连接时通过查询参数 ?encoding=binary&precision=f32|q16 协商（默认 json）。
+二进制帧只承载位置数据，其余字段（状态变化、事件、关键帧的完整状态）仍以JSON文本帧发送。
+
+帧布局（小端序）:
+    头部 (20字节):
+        magic       4s   b"CSPF"
+        version     u8   协议版本
+        precision   u8   0 = float32, 1 = 16位定点量化
+        kind        u8   0 = 关键帧, 1 = 增量帧
+        reserved    u8
+        seq         u32  序列号
+        step        u32  模拟步数
+        count       u16  智能体数量
+        reserved    u16
+    ids:       count x u16  智能体ID
+    types:     count x u8   0 = 猎手, 1 = 目标
+    positions: float32 时 count x 2 x f32；
+               q16 时 count x 2 x u16，值为 round(坐标 / environment_size * 65535)
+"""
+import struct
+from typing import Dict, Tuple
+
+import numpy as np
+
+from app.models.world import WorldState
+from app.services.state_stream import PROTOCOL_VERSION
+
+MAGIC = b"CSPF"
+HEADER = struct.Struct("<4sBBBBIIHH")
+
+ENCODING_JSON = "json"
+ENCODING_BINARY = "binary"
+ENCODINGS = (ENCODING_JSON, ENCODING_BINARY)
+
+PRECISION_F32 = "f32"
+PRECISION_Q16 = "q16"
+PRECISIONS = {PRECISION_F32: 0, PRECISION_Q16: 1}
+
+KIND_KEYFRAME = 0
+KIND_DELTA = 1
+
+Q16_MAX = 65535
+
+
+def encode_positions(world: WorldState, seq: int, step: int, environment_size: float,
+                     precision: str = PRECISION_F32, kind: int = KIND_DELTA) -> bytes:
+    """将世界状态中存活智能体的位置编码为二进制帧"""
+    count = len(world.agents)
+    alive = np.flatnonzero(world.alive[:count])
+    positions = world.positions[alive]
+
+    header = HEADER.pack(MAGIC, PROTOCOL_VERSION, PRECISIONS[precision], kind, 0,
+                         seq & 0xFFFFFFFF, step & 0xFFFFFFFF, len(alive), 0)
+    ids = world.ids[alive].astype("<u2")
+    types = world.kinds[alive].astype("u1")
+
+    if precision == PRECISION_Q16:
+        scaled = np.rint(positions / float(environment_size) * Q16_MAX)
+        payload = np.clip(scaled, 0, Q16_MAX).astype("<u2")
+    else:
+        payload = positions.astype("<f4")
+
+    return b"".join((header, ids.tobytes(), types.tobytes(), payload.tobytes()))
+
+
+def decode_positions(frame: bytes, environment_size: float) -> Tuple[Dict, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    解码二进制位置帧（用于测试和离线工具）
+
+    Returns:
+        Tuple: (头部字典, ids, types, positions (N, 2) float64)
+    """
+    magic, version, precision, kind, _, seq, step, count, _ = HEADER.unpack_from(frame, 0)
+    if magic != MAGIC:
+        raise ValueError("Invalid frame magic")
+
+    offset = HEADER.size
+    ids = np.frombuffer(frame, dtype="<u2", count=count, offset=offset)
+    offset += 2 * count
+    types = np.frombuffer(frame, dtype="u1", count=count, offset=offset)
+    offset += count
+
+    if precision == PRECISIONS[PRECISION_Q16]:
+        raw = np.frombuffer(frame, dtype="<u2", count=2 * count, offset=offset)
+        positions = raw.astype(float) / Q16_MAX * environment_size
+    else:
+        positions = np.frombuffer(frame, dtype="<f4", count=2 * count, offset=offset).astype(float)
+
+    header = {"version": version, "precision": precision, "kind": kind, "seq": seq, "step": step, "count": count}
+    return header, ids, types, positions.reshape(-1, 2)
+
+
+def binary_format(precision: str) -> str:
+    """二进制订阅在调度器中的格式标识"""
+    return f"{ENCODING_BINARY}:{precision}"
+
+
+def parse_binary_format(subscription_format: str):
+    """解析格式标识，非二进制格式返回None，否则返回精度"""
+    encoding, _, precision = subscription_format.partition(":")
+    return precision if encoding == ENCODING_BINARY else None
+
+
+def split_delta(delta: Dict) -> Dict:
+    """从增量帧中去掉位置数据，剩余部分仅在有状态变化或事件时以JSON发送"""
+    return {key: value for key, value in delta.items() if key not in ("ids", "positions")}
+
+
+def delta_has_changes(meta: Dict) -> bool:
+    """判断去掉位置后的增量帧是否仍需发送"""
+    events = meta.get("events", {})
+    return bool(meta.get("states") or events.get("captured") or events.get("escaped")
+                or not meta.get("status", {}).get("is_running", True))
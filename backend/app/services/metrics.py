@@ -0,0 +1,226 @@
+"""
+运行指标与分阶段步进耗时
+
+计数器和直方图保存在进程内，由 /api/metrics 以 Prometheus 文本格式（0.0.4）输出。
+分阶段耗时默认关闭（PROFILING_ENABLED），关闭时 Profiler 的计时方法返回 None，
+热路径上只多一次 None 判断。指标在事件循环线程中更新和读取；持久化写入线程只更新按表计数的行数。
+"""
+import bisect
+import math
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+# 直方图默认桶上限（秒），覆盖 50 微秒到 1 秒
+DEFAULT_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, float):
+        if math.isinf(value):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(value)
+
+
+class Counter:
+    """只增计数器，按标签值分别计数"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *label_values: str):
+        key = tuple(label_values)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def remove(self, label: str, value: str):
+        """删除某个标签取该值的全部序列（模拟删除后避免标签无限增长）"""
+        index = self.label_names.index(label)
+        for key in [key for key in list(self.values) if key[index] == value]:
+            del self.values[key]
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+                for key, value in sorted(list(self.values.items()))]
+
+
+class Histogram:
+    """累积桶直方图，按标签值分别统计"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        # 标签值 -> [各桶（非累积）计数..., +Inf桶计数, 总和]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def remove(self, label: str, value: str):
+        """删除某个标签取该值的全部序列"""
+        index = self.label_names.index(label)
+        for key in [key for key in list(self.values) if key[index] == value]:
+            del self.values[key]
+
+    def samples(self) -> List[str]:
+        lines = []
+        for key, series in sorted(list(self.values.items())):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric:
+    """输出时才读取的指标（如队列深度、已有的统计字段），callback 返回数值"""
+
+    def __init__(self, name: str, kind: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+
+class MetricsRegistry:
+    """指标注册表，按注册顺序输出"""
+
+    def __init__(self):
+        self.metrics: Dict[str, object] = {}
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def histogram(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def callback(self, name: str, kind: str, documentation: str, callback: Callable[[], float]) -> CallbackMetric:
+        """注册回调指标，同名指标已存在时替换（服务对象重建后重新注册）"""
+        self.metrics.pop(name, None)
+        return self._register(CallbackMetric(name, kind, documentation, callback))
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+class PhaseTimer:
+    """一次步进（或一帧发送）的分阶段计时，mark 记录自上次 mark 以来的耗时"""
+
+    __slots__ = ("histogram", "simulation", "algorithm", "last")
+
+    def __init__(self, histogram: Histogram, simulation: str, algorithm: str):
+        self.histogram = histogram
+        self.simulation = simulation
+        self.algorithm = algorithm
+        self.last = time.perf_counter()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, self.simulation, self.algorithm, phase)
+        self.last = now
+
+    def skip(self):
+        """不记录从上次 mark 到现在的耗时"""
+        self.last = time.perf_counter()
+
+
+class Profiler:
+    """分阶段耗时开关，关闭时计时方法返回 None"""
+
+    def __init__(self, step_histogram: Histogram, websocket_histogram: Histogram, enabled: bool = False):
+        self.step_histogram = step_histogram
+        self.websocket_histogram = websocket_histogram
+        self.enabled = enabled
+
+    def step_timer(self, simulation_id: int, algorithm_type: str) -> Optional[PhaseTimer]:
+        if not self.enabled:
+            return None
+        return PhaseTimer(self.step_histogram, str(simulation_id), algorithm_type)
+
+    def websocket_timer(self, simulation_id: int, algorithm_type: str) -> Optional[PhaseTimer]:
+        if not self.enabled:
+            return None
+        return PhaseTimer(self.websocket_histogram, str(simulation_id), algorithm_type)
+
+    def forget(self, simulation_id: int):
+        """删除模拟的全部耗时序列"""
+        self.step_histogram.remove("simulation", str(simulation_id))
+        self.websocket_histogram.remove("simulation", str(simulation_id))
+
+
+registry = MetricsRegistry()
+
+STEP_PHASE_SECONDS = registry.histogram(
+    "crowdsensing_step_phase_seconds",
+    "Duration of each phase of a simulation step",
+    ("simulation", "algorithm", "phase"))
+WEBSOCKET_PHASE_SECONDS = registry.histogram(
+    "crowdsensing_websocket_phase_seconds",
+    "Duration of encoding and sending a WebSocket frame",
+    ("simulation", "algorithm", "phase"))
+TICKS = registry.counter(
+    "crowdsensing_ticks_total",
+    "Simulation steps advanced by the tick scheduler",
+    ("algorithm",))
+FRAMES_SENT = registry.counter(
+    "crowdsensing_frames_sent_total",
+    "WebSocket frames sent to clients",
+    ("protocol",))
+BYTES_SENT = registry.counter(
+    "crowdsensing_bytes_sent_total",
+    "WebSocket payload bytes sent to clients",
+    ("protocol",))
+DB_ROWS_WRITTEN = registry.counter(
+    "crowdsensing_db_rows_written_total",
+    "Rows committed by the persistence writer",
+    ("table",))
+
+profiler = Profiler(STEP_PHASE_SECONDS, WEBSOCKET_PHASE_SECONDS, settings.PROFILING_ENABLED)
@@ -0,0 +1,212 @@
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import Table
+
+from app.config import settings
+from app.database import SessionLocal
+from app.services.metrics import DB_ROWS_WRITTEN
+
+logger = logging.getLogger(__name__)
+
+# 队列中的停止标记
+_STOP = object()
+
+
+class PersistenceWriter:
+    """
+    后台批量持久化写入器
+
+    模拟步进只把快照、位置和状态更新记录放入有界队列，由独立的写入线程批量取出，
+    在一个事务中写入SQLite：对同一张表的连续插入合并为一次executemany。
+    提交在事件循环中进行，从不阻塞：队列满时直接丢弃记录并计数，事件循环的延迟不取决于磁盘延迟。
+    """
+
+    def __init__(self, session_factory=SessionLocal, max_queue_size: int = None,
+                 flush_size: int = None, flush_interval: float = None):
+        """
+        初始化写入器（首次提交记录时自动启动写入线程）
+
+        Args:
+            session_factory: 数据库会话工厂
+            max_queue_size: 队列最多容纳的写入项数
+            flush_size: 累积的行数达到该值时立即写入
+            flush_interval: 第一项入队后最多等待的秒数
+        """
+        self.session_factory = session_factory
+        self.flush_size = flush_size or settings.PERSISTENCE_FLUSH_SIZE
+        self.flush_interval = flush_interval or settings.PERSISTENCE_FLUSH_INTERVAL
+        self.queue = queue.Queue(maxsize=max_queue_size or settings.PERSISTENCE_QUEUE_SIZE)
+
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = False
+
+        # 指标
+        self.submitted_rows = 0
+        self.written_rows = 0
+        self.dropped_rows = 0
+        self.rejected_submits = 0
+        self._last_rejected_log = 0.0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.max_queue_depth = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    def start(self):
+        """启动写入线程"""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run, name="persistence-writer", daemon=True)
+                self._thread.start()
+                logger.info(f"持久化写入线程已启动，批量 {self.flush_size} 行 / {self.flush_interval} 秒")
+
+    def insert(self, table: Table, rows: List[Dict]) -> bool:
+        """提交一组批量插入"""
+        if not rows:
+            return True
+        return self._submit((table, rows, len(rows)), len(rows))
+
+    def call(self, operation: Callable, rows: int = 1) -> bool:
+        """提交一个在写入线程事务中执行的操作 operation(db)，rows为其写入的行数（用于批量和指标）"""
+        return self._submit((None, operation, rows), rows)
+
+    def stop(self, timeout: float = None) -> bool:
+        """停止接收新记录，写完队列中的剩余记录后结束线程（阻塞调用）"""
+        with self._lock:
+            thread = self._thread
+            if thread is None or not thread.is_alive():
+                return True
+            self._stopping = True
+        self.queue.put(_STOP)
+        thread.join(timeout)
+        drained = not thread.is_alive()
+        logger.info(f"持久化写入线程已停止，剩余队列 {self.queue.qsize()} 项，已写入 {self.written_rows} 行")
+        return drained
+
+    def stats(self) -> Dict:
+        """写入与背压指标"""
+        return {
+            "running": self._thread is not None and self._thread.is_alive(),
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "max_queue_depth": self.max_queue_depth,
+            "submitted_rows": self.submitted_rows,
+            "written_rows": self.written_rows,
+            "dropped_rows": self.dropped_rows,
+            "rejected_submits": self.rejected_submits,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_seconds": self.last_flush_seconds,
+            "total_flush_seconds": self.total_flush_seconds,
+        }
+
+    def _submit(self, item, rows: int) -> bool:
+        if self._stopping:
+            logger.warning("持久化写入器正在停止，丢弃新记录")
+            self.dropped_rows += rows
+            return False
+        self.start()
+
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # 写入线程跟不上时丢弃记录，不能在事件循环中等待队列
+            self.rejected_submits += 1
+            self.dropped_rows += rows
+            now = time.monotonic()
+            if now - self._last_rejected_log >= 1.0:
+                self._last_rejected_log = now
+                logger.warning(f"持久化队列已满，丢弃记录（累计丢弃 {self.dropped_rows} 行）")
+            return False
+
+        self.submitted_rows += rows
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+        return True
+
+    def _run(self):
+        pending = []
+        pending_rows = 0
+        deadline = None
+        stopping = False
+
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                stopping = True
+            elif item is not None:
+                pending.append(item)
+                pending_rows += item[2]
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if pending and (stopping or due or pending_rows >= self.flush_size):
+                self._write(pending, pending_rows)
+                pending, pending_rows, deadline = [], 0, None
+
+            if stopping:
+                return
+
+    def _write(self, items: List, rows: int):
+        """写入一批记录；整批失败时逐项重试，只丢弃出错记录本身"""
+        started = time.perf_counter()
+        try:
+            if self._commit(items):
+                return
+            self.failed_flushes += 1
+            logger.warning(f"批量写入失败，逐项重试 {len(items)} 项")
+            for item in items:
+                if not self._commit([item]):
+                    logger.error(f"写入失败，丢失 {item[2]} 行记录")
+                    self.dropped_rows += item[2]
+        finally:
+            self.last_flush_seconds = time.perf_counter() - started
+            self.total_flush_seconds += self.last_flush_seconds
+
+    def _commit(self, items: List) -> bool:
+        """在一个事务中写入记录，对同一张表的连续插入合并为一次executemany，返回是否成功"""
+        db = self.session_factory()
+        # 按表统计行数，提交成功后计入指标；事务内操作记为 other
+        table_rows = defaultdict(int)
+        try:
+            table, batch = None, []
+            for item_table, payload, item_rows in items:
+                table_rows[item_table.name if item_table is not None else "other"] += item_rows
+                if item_table is not None and item_table is table:
+                    batch.extend(payload)
+                    continue
+                if batch:
+                    db.execute(table.insert(), batch)
+                table, batch = item_table, []
+                if item_table is None:
+                    payload(db)
+                else:
+                    batch = list(payload)
+            if batch:
+                db.execute(table.insert(), batch)
+
+            db.commit()
+        except Exception as e:
+            logger.warning(f"写入事务失败（{len(items)}项）: {str(e)}")
+            db.rollback()
+            return False
+        finally:
+            db.close()
+
+        self.written_rows += sum(table_rows.values())
+        for name, count in table_rows.items():
+            DB_ROWS_WRITTEN.inc(count, name)
+        self.flushes += 1
+        return True
@@ -0,0 +1,107 @@
+"""
+轨迹回放
+
+返回模拟在 [from_step, to_step] 内每个智能体的位置序列，按步长抽取并按点数预算做保形降采样
+（app.services.downsampling）。起点状态由不晚于 from_step 的最近关键帧加其后的增量帧重建，
+位置只解码与范围相交的轨迹块；没有轨迹块的模拟（只写 agent_positions）从位置表按范围读取。
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models.db_models import Agent, AgentPosition
+from app.services.downsampling import METHOD_LTTB, downsample
+from app.services.snapshot_store import reconstruct_snapshot
+from app.services.trajectory_store import read_trajectory, trajectory_bounds
+
+SOURCE_CHUNKS = "chunks"
+SOURCE_ROWS = "rows"
+
+
+def _chunk_series(db: Session, simulation_id: int, from_step: Optional[int],
+                  to_step: Optional[int]) -> List[Tuple[str, int, np.ndarray, np.ndarray]]:
+    trajectory = read_trajectory(db, simulation_id, from_step, to_step)
+    return [(agent_type, agent_id, trajectory.steps, trajectory.positions[:, index])
+            for index, (agent_type, agent_id) in enumerate(trajectory.agents)]
+
+
+def _row_series(db: Session, simulation_id: int, from_step: Optional[int],
+                to_step: Optional[int]) -> List[Tuple[str, int, np.ndarray, np.ndarray]]:
+    series = []
+    for agent_pk, agent_id, agent_type in db.query(Agent.id, Agent.agent_id, Agent.type).filter(
+            Agent.simulation_id == simulation_id).order_by(Agent.id):
+        query = db.query(AgentPosition.step, AgentPosition.position_x, AgentPosition.position_y).filter(
+            AgentPosition.agent_id == agent_pk)
+        if from_step is not None:
+            query = query.filter(AgentPosition.step >= from_step)
+        if to_step is not None:
+            query = query.filter(AgentPosition.step <= to_step)
+        rows = np.array(query.order_by(AgentPosition.step, AgentPosition.id).all(), dtype=np.float64).reshape(-1, 3)
+        # 重置后同一步可能有多条记录，取最后写入的一条
+        steps = rows[:, 0].astype(np.int64)
+        last = len(steps) - 1 - np.unique(steps[::-1], return_index=True)[1]
+        series.append((agent_type, agent_id, steps[last], rows[last, 1:]))
+    return series
+
+
+def load_replay(db: Session, simulation_id: int, from_step: Optional[int] = None, to_step: Optional[int] = None,
+                step: int = 1, max_points: Optional[int] = None, method: str = METHOD_LTTB,
+                epsilon: Optional[float] = None) -> Dict:
+    """
+    读取一段回放数据
+
+    Args:
+        from_step, to_step: 步数范围（闭区间），为空时取已保存轨迹的首/末步
+        step: 先每隔 step 个采样点取一个
+        max_points: 每个智能体最多返回的点数，为空时不降采样
+        method: lttb、douglas-peucker 或 stride
+        epsilon: douglas-peucker 允许的最大偏离距离
+
+    Returns:
+        Dict: 范围、起点状态、每个智能体的步数和位置序列及点数统计
+    """
+    source = SOURCE_CHUNKS
+    bounds = trajectory_bounds(db, simulation_id)
+    if bounds is None:
+        source = SOURCE_ROWS
+    else:
+        from_step = bounds[0] if from_step is None else from_step
+        to_step = bounds[1] if to_step is None else to_step
+
+    series = (_chunk_series if source == SOURCE_CHUNKS else _row_series)(db, simulation_id, from_step, to_step)
+
+    agents = []
+    total_points = returned_points = 0
+    for agent_type, agent_id, steps, positions in series:
+        indices = downsample(positions, method, max_points, step, epsilon) if len(steps) else np.arange(0)
+        total_points += len(steps)
+        returned_points += len(indices)
+        agents.append({
+            "type": agent_type,
+            "id": agent_id,
+            "steps": steps[indices].tolist(),
+            "positions": np.round(positions[indices].astype(np.float64), 3).tolist(),
+        })
+
+    if from_step is None:
+        from_step = min((agent["steps"][0] for agent in agents if agent["steps"]), default=None)
+    if to_step is None:
+        to_step = max((agent["steps"][-1] for agent in agents if agent["steps"]), default=None)
+
+    # 从最近的关键帧重建起点状态
+    state = reconstruct_snapshot(db, simulation_id, from_step) if from_step is not None else None
+    if state is not None and state["timestamp"] is not None:
+        state["timestamp"] = state["timestamp"].isoformat()
+
+    return {
+        "simulation_id": simulation_id,
+        "from_step": from_step,
+        "to_step": to_step,
+        "method": method,
+        "source": source,
+        "state": state,
+        "agents": agents,
+        "total_points": total_points,
+        "returned_points": returned_points,
+    }
@@ -0,0 +1,139 @@
+"""
+模拟列表的键集分页、过滤和列投影
+
+按 (created_at, id) 倒序分页：游标编码上一页最后一行的 (created_at, id)，下一页从其后继续，
+每页的代价与已翻过的页数无关。总数来自按过滤条件缓存的计数，在 ttl 秒内可能略有滞后。
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+
+from app.models.db_models import Simulation
+from app.schemas import SimulationList
+
+# 默认返回的列（与 SimulationList 一致）
+DEFAULT_FIELDS = tuple(SimulationList.model_fields)
+
+# 允许投影的列
+LIST_FIELDS = (
+    "id", "name", "description", "environment_size", "num_hunters", "num_targets", "algorithm_type",
+    "max_steps", "is_captured", "step_count", "start_time", "end_time", "capture_time", "created_at",
+    "updated_at", "captured_targets_count", "escaped_targets_count", "total_targets_count",
+    "obstacle_count", "escaped", "escape_time", "seed",
+)
+
+
+def encode_cursor(created_at: datetime, simulation_id: int) -> str:
+    """把一行的 (created_at, id) 编码为不透明的游标"""
+    payload = json.dumps([created_at.isoformat() if created_at else None, simulation_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """解析游标，格式错误时抛出ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, simulation_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(simulation_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """解析逗号分隔的列名，为空时返回默认列，未知列抛出ValueError"""
+    if not fields:
+        return DEFAULT_FIELDS
+    selected = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in selected if field not in LIST_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return selected
+
+
+def _naive_utc(value: datetime) -> datetime:
+    """数据库中保存的是不带时区的UTC时间"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value.tzinfo else value
+
+
+def _serialize(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class SimulationCountCache:
+    """按过滤条件缓存模拟总数"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._entries: Dict[Tuple, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, filters: Dict, conditions: List) -> int:
+        key = tuple(sorted((name, _serialize(value)) for name, value in filters.items()))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and now - entry[0] < self.ttl:
+            return entry[1]
+
+        count = db.query(func.count(Simulation.id)).filter(*conditions).scalar()
+        with self._lock:
+            self._entries[key] = (now, count)
+        return count
+
+    def invalidate(self):
+        """清空缓存（创建或删除模拟后调用）"""
+        with self._lock:
+            self._entries.clear()
+
+
+def list_simulations(db: Session, count_cache: SimulationCountCache, limit: int, cursor: Optional[str] = None,
+                     fields: Tuple[str, ...] = DEFAULT_FIELDS, **filters) -> Tuple[List[Dict], Optional[str], int]:
+    """
+    按 (created_at, id) 倒序读取一页模拟记录
+
+    Args:
+        limit: 每页行数
+        cursor: 上一页返回的游标
+        fields: 返回的列
+        filters: algorithm_type、is_captured、escaped、created_after、created_before，值为None时不过滤
+
+    Returns:
+        Tuple: (本页记录, 下一页游标（没有更多时为None）, 满足过滤条件的总数（缓存）)
+    """
+    filters = {name: value for name, value in filters.items() if value is not None}
+    conditions = []
+    if "algorithm_type" in filters:
+        conditions.append(Simulation.algorithm_type == filters["algorithm_type"])
+    if "is_captured" in filters:
+        conditions.append(Simulation.is_captured == filters["is_captured"])
+    if "escaped" in filters:
+        conditions.append(Simulation.escaped == filters["escaped"])
+    if "created_after" in filters:
+        conditions.append(Simulation.created_at >= _naive_utc(filters["created_after"]))
+    if "created_before" in filters:
+        conditions.append(Simulation.created_at < _naive_utc(filters["created_before"]))
+
+    total = count_cache.get(db, filters, conditions)
+
+    # 游标需要 created_at 和 id，不论是否被选中都要读取
+    columns = dict.fromkeys(("id", "created_at") + tuple(fields))
+    query = db.query(*[getattr(Simulation, name) for name in columns]).filter(*conditions)
+    if cursor:
+        created_at, simulation_id = decode_cursor(cursor)
+        # 行值比较可直接作为 (created_at, id) 索引上的范围查找；拆成 OR 时SQLite只能从头扫描索引
+        query = query.filter(tuple_(Simulation.created_at, Simulation.id) < tuple_(created_at, simulation_id))
+    rows = query.order_by(Simulation.created_at.desc(), Simulation.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    items = [{name: _serialize(getattr(row, name)) for name in fields} for row in rows]
+    return items, next_cursor, total
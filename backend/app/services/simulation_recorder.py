@@ -0,0 +1,167 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models.db_models import Simulation, Agent, AgentPosition, SimulationSnapshot, TrajectoryChunk
+from app.config import settings
+from app.services.persistence_writer import PersistenceWriter
+from app.services.trajectory_store import TrajectoryChunkWriter, STORAGES, STORAGE_ROWS, STORAGE_CHUNKS
+from app.services.snapshot_store import SnapshotEncoder
+
+logger = logging.getLogger(__name__)
+
+
+def load_agent_keys(db: Session, simulation_id: int) -> Dict[Tuple[str, int], int]:
+    """一次查询取得模拟全部智能体的主键映射 {(类型, agent_id): agents.id}"""
+    return {
+        (agent_type, agent_id): pk
+        for pk, agent_id, agent_type in db.query(Agent.id, Agent.agent_id, Agent.type)
+        .filter(Agent.simulation_id == simulation_id)
+    }
+
+
+class SimulationRecorder:
+    """模拟记录器，按固定步数间隔生成快照、位置历史和状态更新，每步追加轨迹块，交给持久化写入器异步写入"""
+
+    def __init__(self, writer: Optional[PersistenceWriter] = None, snapshot_interval: int = None,
+                 trajectory_storage: str = None, keyframe_interval: int = None):
+        """
+        初始化模拟记录器
+
+        Args:
+            writer: 持久化写入器
+            snapshot_interval: 快照间隔步数
+            trajectory_storage: 位置历史的存储方式，见 app.services.trajectory_store.STORAGES
+            keyframe_interval: 快照关键帧最大间隔步数，见 app.services.snapshot_store
+        """
+        self.writer = writer or PersistenceWriter()
+        self.snapshot_interval = snapshot_interval or settings.SNAPSHOT_INTERVAL
+        self.keyframe_interval = keyframe_interval or settings.SNAPSHOT_KEYFRAME_INTERVAL
+        self.encoders: Dict[int, SnapshotEncoder] = {}
+
+        trajectory_storage = trajectory_storage or settings.TRAJECTORY_STORAGE
+        if trajectory_storage not in STORAGES:
+            raise ValueError(f"Invalid trajectory storage: {trajectory_storage}")
+        self.record_rows = trajectory_storage != STORAGE_CHUNKS
+        # 轨迹块每步记录，不受快照间隔限制
+        self.trajectories = TrajectoryChunkWriter(self.writer) if trajectory_storage != STORAGE_ROWS else None
+
+    def should_record(self, step: int, events: Optional[Dict] = None) -> bool:
+        """判断该步是否需要记录：到达快照间隔，或本步发生了捕获/逃脱事件"""
+        return step % self.snapshot_interval == 0 or bool(events and (events.get("captured") or events.get("escaped")))
+
+    def track(self, simulation_id: int, simulation: Dict):
+        """每步调用，把位置追加到轨迹块"""
+        if self.trajectories is not None:
+            self.trajectories.append(simulation_id, simulation["step_count"], simulation["world"])
+
+    def record(self, simulation_id: int, sim_data: Dict,
+               agent_keys: Optional[Dict[Tuple[str, int], int]] = None):
+        """
+        提交一步的快照（关键帧或增量帧）、位置记录和状态更新
+
+        Args:
+            simulation_id: 模拟ID
+            sim_data: 模拟状态字典
+            agent_keys: 智能体主键映射 {(类型, agent_id): agents.id}；提供时位置记录直接
+                        批量插入，缺省时才在写入线程中查询agents表
+        """
+        now = datetime.utcnow()
+        step = sim_data["step_count"]
+
+        encoder = self.encoders.get(simulation_id)
+        if encoder is None:
+            encoder = self.encoders[simulation_id] = SnapshotEncoder(self.keyframe_interval)
+        self.writer.insert(SimulationSnapshot.__table__, [{
+            "simulation_id": simulation_id,
+            "step": step,
+            "timestamp": now,
+            **encoder.encode(sim_data),
+        }])
+
+        if self.record_rows:
+            self._record_positions(simulation_id, sim_data, step, now, agent_keys)
+
+        is_captured = sim_data["is_captured"]
+        self.writer.call(lambda db: self._update_status(db, simulation_id, step, is_captured, now))
+
+    def finish(self, simulation_id: int, sim_data: Dict):
+        """模拟停止后写出未满的轨迹块、释放快照编码器并更新最终状态"""
+        if self.trajectories is not None:
+            self.trajectories.flush(simulation_id)
+        # 继续运行时重新创建编码器，第一条记录为关键帧
+        self.encoders.pop(simulation_id, None)
+        step = sim_data["step_count"]
+        is_captured = sim_data["is_captured"]
+        self.writer.call(lambda db: self._update_status(db, simulation_id, step, is_captured, datetime.utcnow()))
+
+    def reset(self, simulation_id: int):
+        """
+        模拟重置后调用：删除上一轮的轨迹块、快照和位置记录，换用新的快照编码器使下一条记录为关键帧
+
+        删除经由写入队列执行，排在上一轮已提交的记录之后、新一轮的记录之前，
+        回放和导出因此不会把两轮的步数混在一起
+        """
+        if self.trajectories is not None:
+            self.trajectories.discard(simulation_id)
+        self.encoders[simulation_id] = SnapshotEncoder(self.keyframe_interval)
+        self.writer.call(lambda db: self._delete_history(db, simulation_id))
+
+    def forget(self, simulation_id: int):
+        """模拟删除后调用：丢弃未写出的轨迹块并释放快照编码器"""
+        if self.trajectories is not None:
+            self.trajectories.discard(simulation_id)
+        self.encoders.pop(simulation_id, None)
+
+    def _record_positions(self, simulation_id: int, sim_data: Dict, step: int, now: datetime,
+                          agent_keys: Optional[Dict[Tuple[str, int], int]]):
+        """提交一步的 agent_positions 记录"""
+        positions = [(agent_type, agent["id"], agent["position"][0], agent["position"][1])
+                     for agent_type, agents in (("hunter", sim_data["hunters"]), ("target", sim_data["targets"]))
+                     for agent in agents]
+        if agent_keys is not None:
+            self.writer.insert(AgentPosition.__table__, self._position_rows(agent_keys, step, positions, now))
+        else:
+            self.writer.call(lambda db: self._insert_positions(db, simulation_id, step, positions, now), len(positions))
+
+    @staticmethod
+    def _position_rows(agent_keys: Dict[Tuple[str, int], int], step: int,
+                       positions: List[Tuple[str, int, float, float]], now: datetime) -> List[Dict]:
+        """按主键映射生成位置记录行，没有数据库记录的智能体跳过"""
+        return [
+            {"agent_id": agent_keys[(agent_type, agent_id)], "step": step,
+             "position_x": x, "position_y": y, "timestamp": now}
+            for agent_type, agent_id, x, y in positions
+            if (agent_type, agent_id) in agent_keys
+        ]
+
+    def _insert_positions(self, db: Session, simulation_id: int, step: int,
+                          positions: List[Tuple[str, int, float, float]], now: datetime):
+        """在写入线程中解析智能体主键并批量插入位置记录（未登记主键映射时的回退路径）"""
+        rows = self._position_rows(load_agent_keys(db, simulation_id), step, positions, now)
+        if rows:
+            db.execute(AgentPosition.__table__.insert(), rows)
+
+    @staticmethod
+    def _delete_history(db: Session, simulation_id: int):
+        """在写入线程中删除模拟的全部历史记录"""
+        db.query(TrajectoryChunk).filter(TrajectoryChunk.simulation_id == simulation_id).delete(synchronize_session=False)
+        db.query(SimulationSnapshot).filter(SimulationSnapshot.simulation_id == simulation_id).delete(synchronize_session=False)
+        agent_ids = db.query(Agent.id).filter(Agent.simulation_id == simulation_id)
+        db.query(AgentPosition).filter(AgentPosition.agent_id.in_(agent_ids.scalar_subquery())).delete(synchronize_session=False)
+
+    def _update_status(self, db: Session, simulation_id: int, step: int, is_captured: bool, current_time: datetime):
+        """将内存中的模拟状态同步到数据库记录"""
+        db_simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+        if db_simulation is None:
+            return
+        db_simulation.step_count = step
+        if is_captured and not db_simulation.is_captured:
+            logger.info(f"更新数据库：模拟 {simulation_id} 状态设置为已捕获")
+        db_simulation.is_captured = is_captured
+
+        if is_captured and not db_simulation.end_time:
+            db_simulation.end_time = current_time
+            db_simulation.capture_time = (db_simulation.end_time - db_simulation.start_time).total_seconds() if db_simulation.start_time else None
@@ -4,33 +4,53 @@ import time
 import asyncio
 import json
 import logging
-import random
 import traceback
 
 from app.models.agent import HunterAgent, TargetAgent
-from app.database import SessionLocal
+from app.models.world import WorldState
+from app.models.obstacles import ObstacleSet
+from app.models.random_stream import RandomStream, default_stream, new_seed
+from app.config import settings
 import datetime  
 from app.models.db_models import SimulationSnapshot, Simulation
+from app.services.persistence_writer import PersistenceWriter
+from app.services.metrics import Profiler
+from app.services.snapshot_store import KIND_KEYFRAME
 
 logger = logging.getLogger(__name__)
 
 class SimulationService:
     """模拟服务类，管理多个模拟实例"""
-    def __init__(self):
+    def __init__(self, persistence_writer: Optional[PersistenceWriter] = None, profiler: Optional[Profiler] = None):
         self.simulations = {}
+        # 每个模拟的智能体主键映射 {(类型, agent_id): agents.id}，重置后仍然有效
+        self.agent_keys: Dict[int, Dict[Tuple[str, int], int]] = {}
+        self.persistence_writer = persistence_writer or PersistenceWriter()
+        # 分阶段耗时（为空或未开启时不计时）
+        self.profiler = profiler
     
     def create_simulation(self, simulation_id: int, config: Dict) -> Dict:
-        """创建新的模拟实例"""
+        """
+        创建新的模拟实例
+
+        config 中的 seed 决定本模拟的随机数流（初始位置、障碍物和运动中的随机行为），
+        相同的种子和配置得到相同的运行；未指定时生成一个并写回 config，重置后沿用
+        """
         env_size = config.get("environment_size", 500)
         num_hunters = config.get("num_hunters", 5)
         num_targets = config.get("num_targets", 1)
         algorithm_type = config.get("algorithm_type", "APF")
+        if config.get("seed") is None:
+            config["seed"] = new_seed()
+        rng = RandomStream(config["seed"])
         
         # 设置环境边界
         environment_boundary = (0, 0, env_size, env_size)
         
         # 创建猎手智能体
         hunters = []
+        # 添加适当的随机性，避免完全对称
+        hunter_offsets = rng.uniform(-20, 20, (num_hunters, 2))
         # 分散猎手在环境周围 - 围成圆形
         for i in range(num_hunters):
             angle = 2 * np.pi * i / num_hunters  # 均匀分布在圆周上
@@ -38,9 +58,8 @@ class SimulationService:
             x = env_size / 2 + distance * np.cos(angle)
             y = env_size / 2 + distance * np.sin(angle)
             
-            # 添加适当的随机性，避免完全对称
-            x += np.random.uniform(-20, 20)
-            y += np.random.uniform(-20, 20)
+            x += hunter_offsets[i, 0]
+            y += hunter_offsets[i, 1]
             
             # 确保在边界内
             x = max(10, min(env_size - 10, x))
@@ -52,16 +71,17 @@ class SimulationService:
         
         # 创建目标智能体 - 放在中心位置
         targets = []
+        target_offsets = rng.uniform(-env_size/15, env_size/15, (num_targets, 2))
         for i in range(num_targets):
-            x = env_size / 2 + np.random.uniform(-env_size/15, env_size/15)
-            y = env_size / 2 + np.random.uniform(-env_size/15, env_size/15)
+            x = env_size / 2 + target_offsets[i, 0]
+            y = env_size / 2 + target_offsets[i, 1]
             target = TargetAgent(i + num_hunters, (x, y), vision_range=80.0)
             target.environment_boundary = environment_boundary
             targets.append(target)
         
         # 创建障碍物，确保不与智能体重叠
         num_obstacles = config.get("num_obstacles", 3)  # 默认3个障碍物
-        obstacles = self.generate_obstacles(env_size, num_obstacles, hunters, targets)
+        obstacles = ObstacleSet.from_dicts(self.generate_obstacles(env_size, num_obstacles, hunters, targets, rng))
         
         # 创建模拟对象
         new_simulation = {
@@ -72,6 +92,7 @@ class SimulationService:
             "obstacles": obstacles,
             "environment_size": env_size,
             "algorithm_type": algorithm_type,
+            "seed": config["seed"],
             "step_count": 0,
             "is_running": False,
             "is_captured": False,
@@ -83,7 +104,9 @@ class SimulationService:
             "max_steps": config.get("max_steps", 1000),
             "captured_targets_count": 0,
             "escaped_targets_count": 0,
-            "total_targets_count": num_targets
+            "total_targets_count": num_targets,
+            "end_step": None,
+            "capture_steps": []
         }
         
         # 设置障碍物
@@ -92,11 +115,21 @@ class SimulationService:
         for target in targets:
             target.obstacles = obstacles
         
+        # 构建结构化数组世界状态，智能体对象成为其上的视图
+        trail_length = config.get("trail_length") or settings.DEFAULT_TRAIL_LENGTH
+        world = WorldState(num_hunters + num_targets, environment_boundary, obstacles, trail_length, rng)
+        for hunter in hunters:
+            world.attach(hunter, WorldState.KIND_HUNTER)
+        for target in targets:
+            world.attach(target, WorldState.KIND_TARGET)
+        new_simulation["world"] = world
+        
         self.simulations[simulation_id] = new_simulation
         
         return self._simulation_to_dict(new_simulation)
     
-    def generate_obstacles(self, env_size, num_obstacles, hunters=None, targets=None) -> List[Dict]:
+    def generate_obstacles(self, env_size, num_obstacles, hunters=None, targets=None,
+                           rng: Optional[RandomStream] = None) -> List[Dict]:
         """
         生成静态障碍物，支持传入字典或Agent对象
         
@@ -105,6 +138,7 @@ class SimulationService:
             num_obstacles: 障碍物数量
             hunters: 猎手列表（可以是Agent对象或字典）
             targets: 目标列表（可以是Agent对象或字典）
+            rng: 随机数流，默认使用共享流
         """
         obstacles = []
         num_obstacles = min(num_obstacles, 8)
@@ -134,18 +168,18 @@ class SimulationService:
         # 安全距离设置
         agent_safe_distance = max_radius + 25
         
-        # 生成障碍物的主循环
-        attempts = 0
+        # 一次生成全部候选（半径和位置），按顺序筛选
         max_attempts = 200
-        
-        while len(obstacles) < num_obstacles and attempts < max_attempts:
-            attempts += 1
-            radius = np.random.uniform(min_radius, max_radius)
-            edge_buffer = radius + 10
-            
-            # 在有效区域内生成位置
-            x = np.random.uniform(edge_buffer, env_size - edge_buffer)
-            y = np.random.uniform(edge_buffer, env_size - edge_buffer)
+        candidates = (rng or default_stream).random((max_attempts, 3))
+        radii = min_radius + (max_radius - min_radius) * candidates[:, 0]
+        edge_buffers = radii + 10
+        # 在有效区域内生成位置
+        xs = edge_buffers + (env_size - 2 * edge_buffers) * candidates[:, 1]
+        ys = edge_buffers + (env_size - 2 * edge_buffers) * candidates[:, 2]
+        
+        for radius, x, y in zip(radii, xs, ys):
+            if len(obstacles) >= num_obstacles:
+                break
             
             # 中心区域检查
             if np.sqrt((x - center_x)**2 + (y - center_y)**2) < center_radius:
@@ -163,8 +197,8 @@ class SimulationService:
             
             # 通过检查，添加障碍物
             obstacles.append({
-                'position': [x, y],
-                'radius': radius,
+                'position': [float(x), float(y)],
+                'radius': float(radius),
                 'type': 'circle'
             })
         
@@ -207,7 +241,26 @@ class SimulationService:
         return self.create_simulation(simulation_id, original_config)
     
     async def step_simulation(self, simulation_id: int) -> Dict:
-        """修改的模拟步进方法，支持多目标逐个捕获和目标协作"""
+        """实时模拟步进：推进一步后按实时节奏等待"""
+        simulation = self.advance_simulation(simulation_id)
+        
+        # 控制模拟速度
+        if simulation["is_running"]:
+            await asyncio.sleep(0.05)
+        
+        return self._simulation_to_dict(simulation)
+    
+    def advance_simulation(self, simulation_id: int, persist: bool = True) -> Dict:
+        """
+        全速推进一步模拟，支持多目标逐个捕获和目标协作
+        
+        Args:
+            simulation_id: 模拟ID
+            persist: 模拟结束时是否将最终快照写入数据库（无头批量运行时关闭）
+            
+        Returns:
+            Dict: 内部模拟状态（未序列化）
+        """
         if simulation_id not in self.simulations:
             raise ValueError(f"Simulation {simulation_id} not found")
         
@@ -215,51 +268,43 @@ class SimulationService:
         
         # 如果模拟已结束，不处理新消息
         if not simulation["is_running"]:
-            return self._simulation_to_dict(simulation)
+            return simulation
         
         hunters = simulation["hunters"]
         targets = simulation["targets"]
         algorithm_type = simulation["algorithm_type"]
         env_size = simulation["environment_size"]
         
-        # 更新所有猎手的邻居
-        for hunter in hunters:
-            hunter.update_neighbors(hunters)
+        world = simulation["world"]
+        timer = self.profiler.step_timer(simulation_id, algorithm_type) if self.profiler is not None else None
         
-        # 更新所有目标的邻居（支持目标协作）
-        for target in targets:
-            if hasattr(target, 'update_target_neighbors'):
-                target.update_target_neighbors(targets)
+        # 每步重建一次空间索引，之后的邻居、捕获和视野查询都通过它进行
+        world.rebuild_index()
+        if timer is not None:
+            timer.mark("index")
+        
+        # 批量更新猎手的通信邻居和目标的协作邻居
+        world.update_neighbors()
+        if timer is not None:
+            timer.mark("neighbors")
+        
+        # 本步发生的捕获/逃脱事件（供增量状态流使用）
+        events = {"captured": [], "escaped": []}
+        simulation["last_events"] = events
         
         # 检查是否有目标被捕获
         captured_targets = []
-        for target in targets:
-            is_captured = False
-            
-            # 检查是否有猎手捕获该目标
-            for hunter in hunters:
-                if np.linalg.norm(hunter.position - target.position) <= hunter.capture_range:
-                    is_captured = True
-                    logger.info(f"目标{target.id}被猎手{hunter.id}捕获")
-                    break
-                    
-            # 如果这个目标被捕获，添加到捕获列表
-            if is_captured:
-                captured_targets.append(target)
+        for target_slot, hunter_slot in world.detect_captures():
+            logger.info(f"目标{world.agents[target_slot].id}被猎手{world.agents[hunter_slot].id}捕获")
+            captured_targets.append(world.agents[target_slot])
         
         # 检查是否有目标到达边界逃脱成功
         escaped_targets = []
         border_margin = 10  # 边界安全距离
         
-        for target in targets:
-            # 检查是否接近边界
-            if (target.position[0] <= border_margin or 
-                target.position[0] >= env_size - border_margin or
-                target.position[1] <= border_margin or
-                target.position[1] >= env_size - border_margin):
-                
-                escaped_targets.append(target)
-                logger.info(f"目标{target.id}成功逃脱到边界")
+        for target_slot in world.detect_escapes(env_size, border_margin):
+            escaped_targets.append(world.agents[target_slot])
+            logger.info(f"目标{world.agents[target_slot].id}成功逃脱到边界")
         
         # 处理被捕获的目标
         for target in captured_targets:
@@ -267,10 +312,13 @@ class SimulationService:
             if target in targets:  # 防止重复处理
                 logger.info(f"从列表中移除目标{target.id}，当前剩余目标数: {len(targets)-1}")
                 targets.remove(target)
+                world.kill(target)
+                events["captured"].append(target.id)
                 # 增加捕获计数
                 if "captured_targets_count" not in simulation:
                     simulation["captured_targets_count"] = 0
                 simulation["captured_targets_count"] += 1
+                simulation.setdefault("capture_steps", []).append(simulation["step_count"])
                 logger.info(f"已捕获目标数量: {simulation['captured_targets_count']}, 当前剩余目标数量: {len(targets)}")
         
         # 处理逃脱的目标
@@ -278,20 +326,26 @@ class SimulationService:
             # 避免重复处理
             if target in targets:
                 targets.remove(target)
+                world.kill(target)
+                events["escaped"].append(target.id)
                 # 增加逃脱计数
                 if "escaped_targets_count" not in simulation:
                     simulation["escaped_targets_count"] = 0
                 simulation["escaped_targets_count"] += 1
                 logger.info(f"已逃脱目标数量: {simulation['escaped_targets_count']}")
         
+        if timer is not None:
+            timer.mark("capture")
+        
         # 记录剩余目标数量
         remaining_targets = len(targets)
-        logger.info(f"当前步骤后剩余目标数量: {remaining_targets}, 已捕获: {simulation.get('captured_targets_count', 0)}, 已逃脱: {simulation.get('escaped_targets_count', 0)}")
+        logger.debug(f"当前步骤后剩余目标数量: {remaining_targets}, 已捕获: {simulation.get('captured_targets_count', 0)}, 已逃脱: {simulation.get('escaped_targets_count', 0)}")
         
         # 没有剩余目标了，标记游戏结束
         if remaining_targets == 0:
             logger.info(f"所有目标已处理完毕，结束模拟, 总目标数: {simulation.get('total_targets_count', 0)}")
             simulation["is_running"] = False
+            simulation["end_step"] = simulation["step_count"]
             
             # 判断结束原因
             if simulation.get("captured_targets_count", 0) > 0 and simulation.get("escaped_targets_count", 0) == 0:
@@ -302,38 +356,8 @@ class SimulationService:
                 logger.info(f"所有{simulation.get('captured_targets_count', 0)}个目标已被捕获")
                 
                 # 创建最终快照，包含完整状态信息
-                try:
-                    db = SessionLocal()
-                    final_snapshot = SimulationSnapshot(
-                        simulation_id=simulation_id,
-                        step=simulation["step_count"],
-                        hunters_state=json.dumps([h.to_dict() for h in simulation["hunters"]]),
-                        targets_state=json.dumps([]),  # 空数组，因为所有目标都被捕获
-                        is_final=True,  # 标记为最终快照
-                        captured_targets_count=simulation.get("captured_targets_count", 0),
-                        escaped_targets_count=simulation.get("escaped_targets_count", 0),
-                        timestamp=datetime.datetime.utcnow()
-                    )
-                    db.add(final_snapshot)
-                    
-                    # 更新模拟记录
-                    db_simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
-                    if db_simulation:
-                        db_simulation.is_captured = True
-                        db_simulation.end_time = datetime.datetime.utcnow()
-                        db_simulation.capture_time = (db_simulation.end_time - db_simulation.start_time).total_seconds() if db_simulation.start_time else 0
-                        db_simulation.step_count = simulation["step_count"]
-                        db_simulation.captured_targets_count = simulation.get("captured_targets_count", 0)
-                        db_simulation.escaped_targets_count = simulation.get("escaped_targets_count", 0)
-                        db_simulation.total_targets_count = simulation.get("total_targets_count", 0)
-                    
-                    db.commit()
-                    db.close()
-                except Exception as e:
-                    logger.error(f"保存最终模拟状态失败: {str(e)}")
-                    if 'db' in locals():
-                        db.rollback()
-                        db.close()
+                if persist:
+                    self._save_final_snapshot(simulation_id, simulation)
                     
             elif simulation.get("escaped_targets_count", 0) > 0 and simulation.get("captured_targets_count", 0) == 0:
                 # 全部逃脱
@@ -362,45 +386,57 @@ class SimulationService:
                 
                 # 类似上面，可以添加保存混合状态的代码
                 
-            return self._simulation_to_dict(simulation)
+            return simulation
         
-        # 正常移动猎手
-        for hunter in hunters:
-            if not targets:  # 确保还有目标
-                continue
-                
-            # 选择距离最近的目标
-            nearest_target = min(targets, key=lambda t: np.linalg.norm(hunter.position - t.position))
-            
-            try:
-                if algorithm_type == "APF":
-                    direction = hunter.calculate_direction(nearest_target, hunters)
-                elif algorithm_type == "CONSENSUS":
-                    direction = hunter.calculate_direction_advanced(nearest_target, hunters)
-                elif algorithm_type == "ENCIRCLEMENT":
-                    direction = hunter.encirclement_strategy(nearest_target, hunters)
-                else:
-                    direction = hunter.calculate_direction(nearest_target, hunters)
-                    
-                # 确保direction不为None
-                if direction is None:
-                    direction = np.zeros(2)
-                    
-                hunter.move(direction)
-            except Exception as e:
-                logger.error(f"猎手移动计算错误: {str(e)}")
-                continue
+        # 批量计算猎手方向：每个猎手选择距离最近的目标
+        hunter_slots = world.slots_of(hunters)
+        nearest_slots = world.nearest_targets(hunter_slots, world.slots_of(targets))
         
-        # 移动目标
-        for target in targets:
+        movable = np.ones(len(hunters), dtype=bool)
+        if algorithm_type in ("CONSENSUS", "ENCIRCLEMENT"):
+            directions = np.zeros((len(hunters), 2))
+            for row, hunter in enumerate(hunters):
+                nearest_target = world.agents[nearest_slots[row]]
+                try:
+                    if algorithm_type == "CONSENSUS":
+                        direction = hunter.calculate_direction_advanced(nearest_target, hunters)
+                    else:
+                        direction = hunter.encirclement_strategy(nearest_target, hunters)
+                    # 确保direction不为None
+                    if direction is not None:
+                        directions[row] = direction
+                except Exception as e:
+                    logger.error(f"猎手移动计算错误: {str(e)}")
+                    movable[row] = False
+        else:
+            # APF（默认算法）整体向量化计算
+            directions = world.apf_directions(hunter_slots, nearest_slots)
+        if timer is not None:
+            timer.mark("hunter_decision")
+        
+        world.move_agents(hunter_slots[movable], directions[movable])
+        if timer is not None:
+            timer.mark("hunter_move")
+        
+        # 移动目标（基于猎手移动后的位置）
+        target_slots = world.slots_of(targets)
+        directions = np.zeros((len(targets), 2))
+        movable = np.ones(len(targets), dtype=bool)
+        for row, target in enumerate(targets):
             try:
                 direction = target.calculate_direction_evasion(hunters)
                 # 确保direction不为None
-                if direction is None:
-                    direction = np.zeros(2)
-                target.move(direction)
+                if direction is not None:
+                    directions[row] = direction
             except Exception as e:
                 logger.error(f"目标移动计算错误: {str(e)}")
+                movable[row] = False
+        if timer is not None:
+            timer.mark("evasion")
+        
+        world.move_agents(target_slots[movable], directions[movable])
+        if timer is not None:
+            timer.mark("target_move")
         
         # 更新步数
         simulation["step_count"] += 1
@@ -410,10 +446,41 @@ class SimulationService:
             simulation["is_running"] = False
             logger.info(f"模拟 {simulation_id} 达到最大步数，仍有{len(targets)}个目标未捕获")
         
-        # 控制模拟速度
-        await asyncio.sleep(0.05)
+        return simulation
+    
+    def _save_final_snapshot(self, simulation_id: int, simulation: Dict):
+        """提交全部捕获时的最终快照和模拟记录更新，由持久化写入器异步写入"""
+        now = datetime.datetime.utcnow()
+        self.persistence_writer.insert(SimulationSnapshot.__table__, [{
+            "simulation_id": simulation_id,
+            "step": simulation["step_count"],
+            "kind": KIND_KEYFRAME,  # 最终快照为关键帧，轨迹历史由轨迹块提供
+            "hunters_state": json.dumps([h.to_dict(include_history=False) for h in simulation["hunters"]]),
+            "targets_state": json.dumps([]),  # 空数组，因为所有目标都被捕获
+            "is_final": True,  # 标记为最终快照
+            "captured_targets_count": simulation.get("captured_targets_count", 0),
+            "escaped_targets_count": simulation.get("escaped_targets_count", 0),
+            "timestamp": now
+        }])
         
-        return self._simulation_to_dict(simulation)
+        counts = {
+            "step_count": simulation["step_count"],
+            "captured_targets_count": simulation.get("captured_targets_count", 0),
+            "escaped_targets_count": simulation.get("escaped_targets_count", 0),
+            "total_targets_count": simulation.get("total_targets_count", 0),
+        }
+        
+        def update_simulation(db):
+            # 更新模拟记录
+            db_simulation = db.query(Simulation).filter(Simulation.id == simulation_id).first()
+            if db_simulation:
+                db_simulation.is_captured = True
+                db_simulation.end_time = now
+                db_simulation.capture_time = (db_simulation.end_time - db_simulation.start_time).total_seconds() if db_simulation.start_time else 0
+                for key, value in counts.items():
+                    setattr(db_simulation, key, value)
+        
+        self.persistence_writer.call(update_simulation)
     
     def get_simulation(self, simulation_id: int) -> Dict:
         """获取模拟当前状态"""
@@ -430,8 +497,15 @@ class SimulationService:
         """删除模拟"""
         if simulation_id in self.simulations:
             del self.simulations[simulation_id]
+        self.agent_keys.pop(simulation_id, None)
+        if self.profiler is not None:
+            self.profiler.forget(simulation_id)
+    
+    def set_agent_keys(self, simulation_id: int, agent_keys: Dict[Tuple[str, int], int]) -> None:
+        """登记模拟的智能体主键映射，位置记录直接使用，无需再查询agents表"""
+        self.agent_keys[simulation_id] = dict(agent_keys)
     
-    def _simulation_to_dict(self, simulation) -> Dict:
+    def _simulation_to_dict(self, simulation, include_history: bool = True) -> Dict:
         """将模拟对象转换为字典以便序列化"""
         # 确保hunters和targets是有效数组
         hunters = simulation["hunters"] if "hunters" in simulation else []
@@ -439,10 +513,11 @@ class SimulationService:
         result = {
             "id": simulation.get("id", 0),
             "config": simulation.get("config", {}),
-            "hunters": [hunter.to_dict() for hunter in hunters],
-            "targets": [target.to_dict() for target in targets],
+            "hunters": [hunter.to_dict(include_history) for hunter in hunters],
+            "targets": [target.to_dict(include_history) for target in targets],
             "environment_size": simulation.get("environment_size", 500),
             "algorithm_type": simulation.get("algorithm_type", "APF"),
+            "seed": simulation.get("seed"),
             "step_count": simulation.get("step_count", 0),
             "is_running": simulation.get("is_running", False),
             "is_captured": simulation.get("is_captured", False),
@@ -452,7 +527,7 @@ class SimulationService:
             "capture_time": simulation.get("capture_time"),
             "escape_time": simulation.get("escape_time"),
             "max_steps": simulation.get("max_steps", 1000),
-            "obstacles": simulation.get("obstacles", []),
+            "obstacles": ObstacleSet.coerce(simulation.get("obstacles")).to_dicts(),
             "captured_targets_count": simulation.get("captured_targets_count", 0),
             "escaped_targets_count": simulation.get("escaped_targets_count", 0),
             "total_targets_count": simulation.get("total_targets_count", 
@@ -463,13 +538,22 @@ class SimulationService:
         }
         return result
     
+    def random_stream(self, simulation_id: int) -> RandomStream:
+        """模拟专用的随机数流"""
+        if simulation_id not in self.simulations:
+            raise ValueError(f"Simulation {simulation_id} not found")
+        return self.simulations[simulation_id]["world"].rng
+    
     def update_simulation_obstacles(self, simulation_id: int, obstacles: List[Dict]) -> Dict:
-        """更新模拟的障碍物"""
+        """更新模拟的障碍物（构建新版本的障碍物集合，由世界状态和所有智能体共享）"""
         if simulation_id not in self.simulations:
             raise ValueError(f"Simulation {simulation_id} not found")
         
         simulation = self.simulations[simulation_id]
+        obstacles = ObstacleSet.from_dicts(obstacles)
         simulation["obstacles"] = obstacles
+        if "world" in simulation:
+            simulation["world"].set_obstacles(obstacles)
         
         # 更新猎手和目标智能体的障碍物引用
         for hunter in simulation["hunters"]:
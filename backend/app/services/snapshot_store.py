@@ -0,0 +1,176 @@
+"""
+关键帧 + 增量快照格式
+
+simulation_snapshots 每行的 kind 决定 hunters_state / targets_state 的含义：
+- keyframe: 该类型全部存活智能体的状态列表（不含history）；
+- delta:    相对上一条记录的变化列表，每项为 {"id": ..., <变化的字段>...}，
+            被移除（捕获/逃脱）的智能体为 {"id": ..., "removed": true}；
+- 空（旧版本）: 完整状态，智能体带有从第0步开始的完整history，按关键帧处理。
+
+每个模拟第一次记录、距上一关键帧达到 keyframe_interval 步、发生捕获或逃脱、或模拟被重置时
+写关键帧，其余写增量帧。任意一步的状态由不晚于该步的最近关键帧依次应用其后的增量帧得到。
+轨迹历史不再嵌入快照，需要时由轨迹块（app.services.trajectory_store）补充。
+"""
+import json
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.db_models import SimulationSnapshot
+from app.services.trajectory_store import read_trajectory
+
+KIND_KEYFRAME = "keyframe"
+KIND_DELTA = "delta"
+
+AGENT_STATES = (("hunter", "hunters_state", "hunters"), ("target", "targets_state", "targets"))
+
+
+def strip_history(agents: List[Dict]) -> List[Dict]:
+    """去掉智能体状态中的history"""
+    return [{key: value for key, value in agent.items() if key != "history"} for agent in agents]
+
+
+def diff_agents(previous: List[Dict], current: List[Dict]) -> List[Dict]:
+    """计算智能体状态列表的变化"""
+    before = {agent["id"]: agent for agent in previous}
+    changes = []
+    for agent in current:
+        old = before.pop(agent["id"], None)
+        if old is None:
+            changes.append(dict(agent))
+            continue
+        changed = {key: value for key, value in agent.items() if old.get(key) != value}
+        if changed:
+            changes.append({"id": agent["id"], **changed})
+    changes.extend({"id": agent_id, "removed": True} for agent_id in before)
+    return changes
+
+
+def apply_agent_diff(agents: List[Dict], changes: List[Dict]) -> List[Dict]:
+    """把变化列表应用到智能体状态列表，返回新列表（保持原有顺序，新增的追加在末尾）"""
+    result = {agent["id"]: dict(agent) for agent in agents}
+    for change in changes:
+        if change.get("removed"):
+            result.pop(change["id"], None)
+        else:
+            result.setdefault(change["id"], {}).update(change)
+    return list(result.values())
+
+
+class SnapshotEncoder:
+    """单个模拟的快照编码器，记住上一条记录的状态以生成增量帧"""
+
+    def __init__(self, keyframe_interval: int = None):
+        self.keyframe_interval = keyframe_interval or settings.SNAPSHOT_KEYFRAME_INTERVAL
+        self._last: Optional[Dict] = None
+        self._keyframe_step: Optional[int] = None
+
+    def encode(self, sim_data: Dict) -> Dict:
+        """
+        把一步的模拟状态编码为快照行的字段
+
+        Returns:
+            Dict: kind、hunters_state、targets_state、captured_targets_count、escaped_targets_count
+        """
+        step = sim_data["step_count"]
+        current = {
+            "step": step,
+            "hunters": strip_history(sim_data["hunters"]),
+            "targets": strip_history(sim_data["targets"]),
+            "captured_targets_count": sim_data.get("captured_targets_count", 0),
+            "escaped_targets_count": sim_data.get("escaped_targets_count", 0),
+        }
+        last = self._last
+        keyframe = (
+            last is None
+            or step <= last["step"]
+            or step - self._keyframe_step >= self.keyframe_interval
+            # 捕获或逃脱事件
+            or current["captured_targets_count"] != last["captured_targets_count"]
+            or current["escaped_targets_count"] != last["escaped_targets_count"]
+            or len(current["targets"]) != len(last["targets"])
+        )
+        self._last = current
+
+        if keyframe:
+            self._keyframe_step = step
+            hunters, targets = current["hunters"], current["targets"]
+        else:
+            hunters = diff_agents(last["hunters"], current["hunters"])
+            targets = diff_agents(last["targets"], current["targets"])
+        return {
+            "kind": KIND_KEYFRAME if keyframe else KIND_DELTA,
+            "hunters_state": json.dumps(hunters),
+            "targets_state": json.dumps(targets),
+            "captured_targets_count": current["captured_targets_count"],
+            "escaped_targets_count": current["escaped_targets_count"],
+        }
+
+
+def _load_state(state: str) -> List[Dict]:
+    try:
+        return json.loads(state)
+    except (TypeError, ValueError):
+        return []
+
+
+def reconstruct_snapshot(db: Session, simulation_id: int, step: Optional[int] = None) -> Optional[Dict]:
+    """
+    重建模拟在某一步（为空时为最新记录）的快照状态
+
+    取不晚于该步、最新写入的关键帧，再按写入顺序应用其后不晚于该步的增量帧。
+
+    Returns:
+        Dict: step、hunters、targets、捕获/逃脱计数、is_final、timestamp；没有快照时返回None
+    """
+    query = db.query(SimulationSnapshot).filter(
+        SimulationSnapshot.simulation_id == simulation_id,
+        (SimulationSnapshot.kind == KIND_KEYFRAME) | SimulationSnapshot.kind.is_(None)
+    )
+    if step is not None:
+        query = query.filter(SimulationSnapshot.step <= step)
+    keyframe = query.order_by(SimulationSnapshot.id.desc()).first()
+    if keyframe is None:
+        return None
+
+    deltas = db.query(SimulationSnapshot).filter(
+        SimulationSnapshot.simulation_id == simulation_id,
+        SimulationSnapshot.kind == KIND_DELTA,
+        SimulationSnapshot.id > keyframe.id,
+        SimulationSnapshot.step > keyframe.step,
+    )
+    if step is not None:
+        deltas = deltas.filter(SimulationSnapshot.step <= step)
+
+    latest = keyframe
+    state = {key: _load_state(getattr(keyframe, column)) for _, column, key in AGENT_STATES}
+    for delta in deltas.order_by(SimulationSnapshot.id):
+        for _, column, key in AGENT_STATES:
+            state[key] = apply_agent_diff(state[key], _load_state(getattr(delta, column)))
+        latest = delta
+
+    return {
+        "step": latest.step,
+        "hunters": state["hunters"],
+        "targets": state["targets"],
+        "captured_targets_count": latest.captured_targets_count,
+        "escaped_targets_count": latest.escaped_targets_count,
+        "is_final": bool(latest.is_final),
+        "timestamp": latest.timestamp,
+    }
+
+
+def attach_history(db: Session, simulation_id: int, snapshot: Dict, trail_length: int = None) -> Dict:
+    """从轨迹块为快照中的智能体补充截至快照步数的最近 trail_length 个轨迹点（已有history的保持不变）"""
+    trail_length = trail_length or settings.DEFAULT_TRAIL_LENGTH
+    agents = [(agent_type, agent) for agent_type, _, key in AGENT_STATES for agent in snapshot[key]
+              if "history" not in agent]
+    if not agents:
+        return snapshot
+
+    trajectory = read_trajectory(db, simulation_id, max(0, snapshot["step"] - trail_length + 1), snapshot["step"])
+    for agent_type, agent in agents:
+        if [agent_type, agent["id"]] in trajectory.agents:
+            agent["history"] = trajectory.agent(agent_type, agent["id"]).tolist()
+    return snapshot
@@ -0,0 +1,99 @@
+"""
+WebSocket增量状态流协议
+
+连接时通过查询参数 ?protocol=delta 协商（默认 full 为兼容的完整状态帧）：
+- 首先发送关键帧 {"type": "keyframe", "v": 1, "seq": N, "step": ..., "state": {...}, "states": {...}}，
+  state 与完整状态帧相同但不含 history，states 为每个存活猎手当前的状态名 {id: 状态}；
+  关键帧加上其后的增量帧即为完整状态；
+- 之后每步发送增量帧 {"type": "delta", "v": 1, "seq": N+1, ...}，只包含存活智能体的新位置、
+  发生变化的猎手状态、本步的捕获/逃脱事件以及模拟状态标志；
+- 客户端发现 seq 不连续时发送 {"type": "resync"}，服务端回复新的关键帧；
+  客户端应丢弃 seq 不大于当前关键帧 seq 的增量帧。
+"""
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.models.world import WorldState
+
+PROTOCOL_VERSION = 1
+
+# 协商的协议类型
+PROTOCOL_FULL = "full"
+PROTOCOL_DELTA = "delta"
+PROTOCOLS = (PROTOCOL_FULL, PROTOCOL_DELTA)
+
+# 状态编码 -> 状态名
+STATE_NAMES = {code: name for name, code in WorldState.STATE_CODES.items()}
+
+
+def simulation_status(simulation: Dict) -> Dict:
+    """增量帧中携带的模拟状态标志"""
+    return {
+        "is_running": simulation.get("is_running", False),
+        "is_captured": simulation.get("is_captured", False),
+        "escaped": simulation.get("escaped", False),
+        "captured_targets_count": simulation.get("captured_targets_count", 0),
+        "escaped_targets_count": simulation.get("escaped_targets_count", 0),
+        "remaining_targets_count": len(simulation.get("targets", [])),
+    }
+
+
+class StateStream:
+    """单个模拟的增量状态流，维护序列号并生成关键帧和增量帧"""
+
+    def __init__(self):
+        self.seq = 0
+        self._world: Optional[WorldState] = None
+        self._last_states: Optional[np.ndarray] = None
+
+    def keyframe(self, simulation: Dict, state: Dict) -> Dict:
+        """
+        生成当前序列号的关键帧（不推进序列号）
+
+        Args:
+            simulation: 内部模拟状态
+            state: 不含history的序列化模拟状态
+        """
+        world = simulation["world"]
+        count = len(world.agents)
+        hunters = np.flatnonzero(world.alive[:count] & (world.kinds[:count] == WorldState.KIND_HUNTER))
+        return {
+            "type": "keyframe",
+            "v": PROTOCOL_VERSION,
+            "seq": self.seq,
+            "step": simulation["step_count"],
+            "state": state,
+            # 增量帧只发送变化的猎手状态，关键帧必须带上全部当前状态
+            "states": {int(world.ids[slot]): STATE_NAMES[int(world.states[slot])] for slot in hunters},
+        }
+
+    def delta(self, simulation: Dict, include_events: bool = True) -> Dict:
+        """生成下一帧增量并推进序列号"""
+        world = simulation["world"]
+        count = len(world.agents)
+        states = world.states[:count]
+
+        # 模拟被重置后世界状态会被替换，状态基线随之重置
+        if self._world is not world:
+            self._world = world
+            self._last_states = np.full(count, -1, dtype=states.dtype)
+
+        changed = np.flatnonzero((states != self._last_states) & (world.kinds[:count] == WorldState.KIND_HUNTER))
+        self._last_states = states.copy()
+
+        alive = np.flatnonzero(world.alive[:count])
+        events = (include_events and simulation.get("last_events")) or {"captured": [], "escaped": []}
+
+        self.seq += 1
+        return {
+            "type": "delta",
+            "v": PROTOCOL_VERSION,
+            "seq": self.seq,
+            "step": simulation["step_count"],
+            "ids": world.ids[alive].tolist(),
+            "positions": world.positions[alive].tolist(),
+            "states": {int(world.ids[slot]): STATE_NAMES[int(states[slot])] for slot in changed},
+            "events": {"captured": list(events["captured"]), "escaped": list(events["escaped"])},
+            "status": simulation_status(simulation),
+        }
@@ -0,0 +1,322 @@
+"""
+参数扫描任务
+
+把参数网格（或显式的配置列表）展开为若干参数组合，每个组合重复运行 repetitions 次。
+运行被切分为每份 SWEEP_RUNS_PER_TASK 次的任务，提交到服务内共享、大小固定的进程池，
+在工作进程中用 run_headless 全速运行。某个组合的全部运行完成后立即汇总并写入 sweep_results，
+任务进度保存在内存中并推送给订阅者，同时定期写回 sweep_jobs；任务结束后只保留数据库中的记录。
+服务重启时仍未结束的任务不会再有进度，启动时由 fail_orphaned_sweeps 标记为失败。
+"""
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import run_db
+from app.models.db_models import SweepJob, SweepResult
+from app.services.batch_service import run_headless, summarize_runs
+
+logger = logging.getLogger(__name__)
+
+# 可以扫描的参数及其默认值
+SWEEP_PARAMETERS = {
+    "algorithm_type": "APF",
+    "num_hunters": 5,
+    "num_targets": 1,
+    "environment_size": 500,
+    "num_obstacles": 3,
+    "max_steps": 1000,
+}
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_COMPLETED = "completed"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+FINISHED_STATUSES = (STATUS_COMPLETED, STATUS_FAILED, STATUS_CANCELLED)
+
+
+def expand_cells(grid: Optional[Dict[str, List[Any]]] = None, configs: Optional[List[Dict]] = None,
+                 base: Optional[Dict] = None) -> List[Dict]:
+    """
+    展开参数组合
+
+    Args:
+        grid: 参数名 -> 取值列表，取笛卡尔积
+        configs: 显式的参数组合列表（与grid二选一）
+        base: 所有组合共用的参数
+
+    Returns:
+        List[Dict]: 完整的模拟配置列表，未知参数抛出ValueError
+    """
+    if grid:
+        names = list(grid)
+        cells = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    else:
+        cells = [dict(config) for config in (configs or [])]
+    if not cells:
+        raise ValueError("Sweep has no parameter combinations")
+
+    result = []
+    for cell in cells:
+        config = {**SWEEP_PARAMETERS, **(base or {}), **cell}
+        unknown = [name for name in config if name not in SWEEP_PARAMETERS]
+        if unknown:
+            raise ValueError(f"Unknown sweep parameters: {', '.join(unknown)}")
+        result.append(config)
+    return result
+
+
+def aggregate_runs(runs: List[Dict]) -> Dict:
+    """汇总一个参数组合的运行结果（在summarize_runs基础上加入捕获步数的分位数）"""
+    succeeded = [run for run in runs if "error" not in run]
+    summary = summarize_runs(succeeded)
+    capture_steps = np.array([run["capture_step"] for run in succeeded if run["capture_step"] is not None], dtype=float)
+    percentiles = np.percentile(capture_steps, [10, 25, 75, 90]) if len(capture_steps) else [None] * 4
+    return {
+        "runs": len(succeeded),
+        "failed_runs": len(runs) - len(succeeded),
+        "capture_rate": summary["capture_rate"],
+        "mean_steps": summary["mean_steps"],
+        "mean_capture_step": summary["mean_capture_step"],
+        "median_capture_step": summary["median_capture_step"],
+        "p10_capture_step": None if percentiles[0] is None else float(percentiles[0]),
+        "p25_capture_step": None if percentiles[1] is None else float(percentiles[1]),
+        "p75_capture_step": None if percentiles[2] is None else float(percentiles[2]),
+        "p90_capture_step": None if percentiles[3] is None else float(percentiles[3]),
+        "mean_wall_time": float(np.mean([run["wall_time"] for run in succeeded])) if succeeded else None,
+    }
+
+
+def run_sweep_task(config: Dict, run_indices: List[int]) -> List[Dict]:
+    """在工作进程中运行一个组合的若干次重复，单次失败不影响其他运行"""
+    runs = []
+    for run_index in run_indices:
+        try:
+            runs.append(run_headless(config, run_index))
+        except Exception as e:
+            runs.append({"run_index": run_index, "error": str(e)})
+    return runs
+
+
+def _insert_job(db: Session, name: Optional[str], cells: List[Dict], repetitions: int, seed: Optional[int]) -> Dict:
+    job = SweepJob(name=name, status=STATUS_PENDING, cells=json.dumps(cells), repetitions=repetitions,
+                   seed=seed, total_runs=len(cells) * repetitions)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job.to_dict()
+
+
+def _update_job(db: Session, sweep_id: int, **fields):
+    db.query(SweepJob).filter(SweepJob.id == sweep_id).update(fields)
+    db.commit()
+
+
+def _insert_result(db: Session, sweep_id: int, cell_index: int, config: Dict, aggregate: Dict):
+    db.add(SweepResult(
+        sweep_id=sweep_id,
+        cell_index=cell_index,
+        config=json.dumps(config),
+        algorithm_type=config["algorithm_type"],
+        num_hunters=config["num_hunters"],
+        num_targets=config["num_targets"],
+        environment_size=config["environment_size"],
+        num_obstacles=config["num_obstacles"],
+        **aggregate,
+    ))
+    db.commit()
+
+
+def fail_orphaned_sweeps(db: Session) -> int:
+    """把上次服务退出时仍处于 pending/running 的任务标记为失败，返回标记的任务数"""
+    count = db.query(SweepJob).filter(SweepJob.status.in_((STATUS_PENDING, STATUS_RUNNING))).update(
+        {"status": STATUS_FAILED, "error": "服务重启时任务未完成", "finished_at": datetime.utcnow()},
+        synchronize_session=False)
+    db.commit()
+    return count
+
+
+def load_sweep(db: Session, sweep_id: int) -> Optional[Dict]:
+    """读取扫描任务及已完成组合的结果，不存在时返回None"""
+    job = db.query(SweepJob).filter(SweepJob.id == sweep_id).first()
+    if job is None:
+        return None
+    result = job.to_dict()
+    result["results"] = [row.to_dict() for row in db.query(SweepResult).filter(
+        SweepResult.sweep_id == sweep_id).order_by(SweepResult.cell_index)]
+    return result
+
+
+def list_sweeps(db: Session, limit: int = 100) -> List[Dict]:
+    """最近的扫描任务（不含参数组合和结果）"""
+    jobs = db.query(SweepJob).order_by(SweepJob.id.desc()).limit(limit)
+    return [{key: value for key, value in job.to_dict().items() if key != "cells"} for job in jobs]
+
+
+async def _tagged(cell_index: int, future) -> Tuple[int, List[Dict]]:
+    return cell_index, await future
+
+
+class SweepService:
+    """参数扫描服务，所有任务共享一个固定大小的进程池"""
+
+    def __init__(self, max_workers: Optional[int] = None, runs_per_task: Optional[int] = None):
+        self.max_workers = max_workers or settings.SWEEP_MAX_WORKERS or multiprocessing.cpu_count()
+        self.runs_per_task = runs_per_task or settings.SWEEP_RUNS_PER_TASK
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.progress: Dict[int, Dict] = {}  # 未结束任务的进度，结束后移除
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._subscribers: Dict[int, List[asyncio.Queue]] = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # 使用spawn避免在多线程服务进程中fork
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    async def submit(self, cells: List[Dict], repetitions: int, seed: Optional[int] = None,
+                     name: Optional[str] = None) -> Dict:
+        """创建扫描任务并在后台开始运行，返回任务记录"""
+        total = len(cells) * repetitions
+        if total > settings.SWEEP_MAX_RUNS:
+            raise ValueError(f"Sweep has {total} runs, the limit is {settings.SWEEP_MAX_RUNS}")
+        job = await run_db(_insert_job, name, cells, repetitions, seed)
+        sweep_id = job["id"]
+        self.progress[sweep_id] = {
+            "id": sweep_id,
+            "status": STATUS_PENDING,
+            "total_cells": len(cells),
+            "completed_cells": 0,
+            "total_runs": total,
+            "completed_runs": 0,
+            "failed_runs": 0,
+            "elapsed_seconds": 0.0,
+            "runs_per_second": 0.0,
+        }
+        self._tasks[sweep_id] = asyncio.create_task(self._run(sweep_id, cells, repetitions, seed))
+        return job
+
+    def _task_arguments(self, cells: List[Dict], repetitions: int, seed: Optional[int]) -> List[Tuple[int, Dict, List[int]]]:
+        """把每个组合的重复运行切分为 (组合序号, 配置, 运行序号列表) 任务"""
+        tasks = []
+        for cell_index, config in enumerate(cells):
+            if seed is not None:
+                # run_headless 对第r次运行使用 config["seed"] + r
+                config = {**config, "seed": seed + cell_index * repetitions}
+            for start in range(0, repetitions, self.runs_per_task):
+                tasks.append((cell_index, config, list(range(start, min(start + self.runs_per_task, repetitions)))))
+        return tasks
+
+    async def _run(self, sweep_id: int, cells: List[Dict], repetitions: int, seed: Optional[int]):
+        progress = self.progress[sweep_id]
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        last_saved = started
+        futures = []
+        try:
+            progress["status"] = STATUS_RUNNING
+            await run_db(_update_job, sweep_id, status=STATUS_RUNNING, started_at=datetime.utcnow())
+            self._publish(sweep_id)
+            logger.info(f"参数扫描{sweep_id}开始: {len(cells)}个组合 x {repetitions}次, 进程数 {self.max_workers}")
+
+            pool = self._get_pool()
+            cell_runs: Dict[int, List[Dict]] = {index: [] for index in range(len(cells))}
+            futures = [(cell_index, asyncio.wrap_future(pool.submit(run_sweep_task, config, indices)))
+                       for cell_index, config, indices in self._task_arguments(cells, repetitions, seed)]
+
+            for next_done in asyncio.as_completed([_tagged(cell_index, future) for cell_index, future in futures]):
+                cell_index, runs = await next_done
+                cell_runs[cell_index].extend(runs)
+                progress["completed_runs"] += len(runs)
+                progress["failed_runs"] += sum(1 for run in runs if "error" in run)
+                elapsed = time.monotonic() - started
+                progress["elapsed_seconds"] = round(elapsed, 3)
+                progress["runs_per_second"] = round(progress["completed_runs"] / elapsed, 2) if elapsed else 0.0
+
+                if len(cell_runs[cell_index]) == repetitions:
+                    await run_db(_insert_result, sweep_id, cell_index, cells[cell_index],
+                                 aggregate_runs(cell_runs.pop(cell_index)))
+                    progress["completed_cells"] += 1
+                if time.monotonic() - last_saved >= settings.SWEEP_PROGRESS_INTERVAL:
+                    last_saved = time.monotonic()
+                    await run_db(_update_job, sweep_id, completed_runs=progress["completed_runs"],
+                                 failed_runs=progress["failed_runs"])
+                self._publish(sweep_id)
+
+            progress["status"] = STATUS_COMPLETED
+            await self._finish(sweep_id, STATUS_COMPLETED)
+            logger.info(f"参数扫描{sweep_id}完成: {progress['completed_runs']}次运行, 耗时 {progress['elapsed_seconds']}秒")
+        except asyncio.CancelledError:
+            for _, future in futures:
+                future.cancel()
+            progress["status"] = STATUS_CANCELLED
+            await self._finish(sweep_id, STATUS_CANCELLED)
+            logger.info(f"参数扫描{sweep_id}已取消")
+        except Exception as e:
+            for _, future in futures:
+                future.cancel()
+            progress["status"] = STATUS_FAILED
+            progress["error"] = str(e)
+            await self._finish(sweep_id, STATUS_FAILED, error=str(e))
+            logger.error(f"参数扫描{sweep_id}失败: {str(e)}")
+        finally:
+            self._tasks.pop(sweep_id, None)
+            # 最后一次进度已推送给订阅者，之后以数据库记录为准
+            self.progress.pop(sweep_id, None)
+
+    async def _finish(self, sweep_id: int, status: str, error: Optional[str] = None):
+        progress = self.progress[sweep_id]
+        await run_db(_update_job, sweep_id, status=status, error=error, finished_at=datetime.utcnow(),
+                     completed_runs=progress["completed_runs"], failed_runs=progress["failed_runs"])
+        self._publish(sweep_id)
+
+    def cancel(self, sweep_id: int) -> bool:
+        """取消运行中的扫描任务（已在工作进程中执行的任务会运行完但结果被丢弃）"""
+        task = self._tasks.get(sweep_id)
+        if task is None:
+            return False
+        task.cancel()
+        return True
+
+    def subscribe(self, sweep_id: int) -> asyncio.Queue:
+        """订阅任务进度，队列中是进度字典；任务结束后推送最后一次进度"""
+        queue = asyncio.Queue(maxsize=settings.SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(sweep_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, sweep_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(sweep_id, [])
+        if queue in subscribers:
+            subscribers.remove(queue)
+        if not subscribers:
+            self._subscribers.pop(sweep_id, None)
+
+    def _publish(self, sweep_id: int):
+        state = dict(self.progress[sweep_id])
+        for queue in self._subscribers.get(sweep_id, []):
+            if queue.full():
+                # 慢订阅者只需要最新进度，丢弃最旧的一条
+                queue.get_nowait()
+            queue.put_nowait(state)
+
+    async def shutdown(self):
+        """取消运行中的任务并关闭进程池"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,231 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Optional
+
+from app.config import settings
+from app.services.simulation_recorder import SimulationRecorder
+from app.services.metrics import TICKS, PhaseTimer
+from app.services.state_stream import StateStream, PROTOCOL_FULL, PROTOCOL_DELTA
+from app.services.frame_codec import encode_positions, parse_binary_format, split_delta, delta_has_changes
+
+logger = logging.getLogger(__name__)
+
+
+class TickScheduler:
+    """
+    服务端模拟调度器
+
+    为每个运行中的模拟启动一个固定时间步长的asyncio任务，独立于WebSocket连接推进模拟；
+    WebSocket处理器只订阅每一步的结果。
+    """
+
+    def __init__(self, simulation_service, recorder: Optional[SimulationRecorder] = None,
+                 tick_rate: float = None, max_catchup_steps: int = None,
+                 poll_interval: float = None, subscriber_queue_size: int = None):
+        """
+        初始化调度器
+
+        Args:
+            simulation_service: 模拟服务实例
+            recorder: 模拟记录器，负责快照和位置历史的持久化
+            tick_rate: 每秒步数
+            max_catchup_steps: 落后时单次最多补跑的步数，超过则丢弃积压
+            poll_interval: 检查新运行模拟的间隔（秒）
+            subscriber_queue_size: 每个订阅者的帧队列长度，满时丢弃最旧的帧
+        """
+        self.simulation_service = simulation_service
+        self.recorder = recorder or SimulationRecorder()
+        self.tick_rate = tick_rate or settings.SIMULATION_TICK_RATE
+        self.max_catchup_steps = max_catchup_steps or settings.SIMULATION_MAX_CATCHUP_STEPS
+        self.poll_interval = poll_interval or settings.SCHEDULER_POLL_INTERVAL
+        self.subscriber_queue_size = subscriber_queue_size or settings.SUBSCRIBER_QUEUE_SIZE
+
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.subscribers: Dict[int, Dict[asyncio.Queue, str]] = defaultdict(dict)
+        self.streams: Dict[int, StateStream] = {}
+        self.dropped_ticks = 0
+        self._supervisor: Optional[asyncio.Task] = None
+
+    def start(self):
+        """启动调度器（需在事件循环中调用）"""
+        if self._supervisor is None or self._supervisor.done():
+            self._supervisor = asyncio.create_task(self._supervise())
+            logger.info(f"模拟调度器已启动，步进频率 {self.tick_rate} 步/秒")
+
+    async def stop(self):
+        """停止调度器及所有模拟任务"""
+        tasks = list(self.tasks.values())
+        if self._supervisor is not None:
+            tasks.append(self._supervisor)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._supervisor = None
+        logger.info("模拟调度器已停止")
+
+    def subscribe(self, simulation_id: int, protocol: str = PROTOCOL_FULL) -> asyncio.Queue:
+        """
+        订阅模拟的步进结果
+
+        Args:
+            protocol: 完整状态帧、增量帧，或二进制位置帧格式（见frame_codec.binary_format）
+
+        Returns:
+            asyncio.Queue: 帧队列，每项为一条消息（dict或bytes）或一步内的消息列表
+        """
+        queue = asyncio.Queue(maxsize=self.subscriber_queue_size)
+        self.subscribers[simulation_id][queue] = protocol
+        return queue
+
+    def unsubscribe(self, simulation_id: int, queue: asyncio.Queue):
+        """取消订阅"""
+        queues = self.subscribers.get(simulation_id)
+        if queues is not None:
+            queues.pop(queue, None)
+            if not queues:
+                del self.subscribers[simulation_id]
+
+    def publish(self, simulation_id: int, frame: Dict, protocol: Optional[str] = None):
+        """向订阅者发布一帧（protocol为空时发给所有订阅者），慢速订阅者丢弃最旧的帧"""
+        for queue, subscribed_protocol in list(self.subscribers.get(simulation_id, {}).items()):
+            if protocol is not None and subscribed_protocol != protocol:
+                continue
+            if queue.full():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+            queue.put_nowait(frame)
+
+    def keyframe(self, simulation_id: int) -> Dict:
+        """生成增量协议的关键帧"""
+        simulation = self.simulation_service.simulations.get(simulation_id)
+        if simulation is None:
+            raise ValueError(f"Simulation {simulation_id} not found")
+        stream = self.streams.setdefault(simulation_id, StateStream())
+        return stream.keyframe(simulation, self.simulation_service._simulation_to_dict(simulation, include_history=False))
+
+    async def _supervise(self):
+        """为每个运行中的模拟维持一个步进任务"""
+        while True:
+            try:
+                for simulation_id, simulation in list(self.simulation_service.simulations.items()):
+                    if simulation["is_running"] and simulation_id not in self.tasks:
+                        self.tasks[simulation_id] = asyncio.create_task(self._run(simulation_id))
+            except Exception as e:
+                logger.error(f"调度器检查模拟时出错: {str(e)}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _run(self, simulation_id: int):
+        """固定时间步长推进单个模拟，落后时补跑，落后过多时丢弃积压"""
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.tick_rate
+        next_tick = loop.time()
+        logger.info(f"模拟 {simulation_id} 开始由调度器步进")
+
+        try:
+            while self._is_running(simulation_id):
+                now = loop.time()
+                if now < next_tick:
+                    await asyncio.sleep(next_tick - now)
+                    continue
+
+                behind = int((now - next_tick) / interval) + 1
+                steps = min(behind, self.max_catchup_steps)
+                for _ in range(steps):
+                    if not self._tick(simulation_id):
+                        break
+                    next_tick += interval
+
+                if behind > self.max_catchup_steps:
+                    # 落后过多，放弃积压的步数以免雪崩
+                    self.dropped_ticks += behind - steps
+                    logger.debug(f"模拟 {simulation_id} 落后 {behind} 步，丢弃 {behind - steps} 步积压")
+                    next_tick = loop.time() + interval
+
+                # 让出事件循环，避免补跑时饿死其他任务
+                await asyncio.sleep(0)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"模拟 {simulation_id} 调度任务出错: {str(e)}")
+        finally:
+            self.tasks.pop(simulation_id, None)
+            self._finish(simulation_id)
+            logger.info(f"模拟 {simulation_id} 停止由调度器步进")
+
+    def _is_running(self, simulation_id: int) -> bool:
+        simulation = self.simulation_service.simulations.get(simulation_id)
+        return simulation is not None and simulation["is_running"]
+
+    def _tick(self, simulation_id: int) -> bool:
+        """推进一步并发布结果，返回模拟是否仍在运行"""
+        try:
+            simulation = self.simulation_service.advance_simulation(simulation_id)
+        except Exception as step_error:
+            logger.error(f"步进模拟时出错: {str(step_error)}")
+            # 停止模拟，避免继续尝试
+            try:
+                self.simulation_service.stop_simulation(simulation_id)
+            except Exception:
+                pass
+            self.publish(simulation_id, {
+                "error": f"模拟步进失败: {str(step_error)}",
+                "id": simulation_id,
+                "is_running": False
+            })
+            return False
+
+        TICKS.inc(1, simulation["algorithm_type"])
+        profiler = self.simulation_service.profiler
+        timer = profiler.step_timer(simulation_id, simulation["algorithm_type"]) if profiler is not None else None
+        self.recorder.track(simulation_id, simulation)
+        if timer is not None:
+            timer.mark("trajectory")
+        self._publish_tick(simulation_id, simulation,
+                           self.recorder.should_record(simulation["step_count"], simulation.get("last_events")), timer=timer)
+        return simulation["is_running"]
+
+    def _publish_tick(self, simulation_id: int, simulation: Dict, record: bool = False, include_events: bool = True,
+                      timer: Optional[PhaseTimer] = None):
+        """按订阅协议序列化一次并发布，完整状态帧与增量帧都只计算一次"""
+        protocols = set(self.subscribers.get(simulation_id, {}).values())
+        if record or PROTOCOL_FULL in protocols:
+            sim_data = self.simulation_service._simulation_to_dict(simulation)
+            if timer is not None:
+                timer.mark("serialize")
+            if record:
+                self.recorder.record(simulation_id, sim_data,
+                                     self.simulation_service.agent_keys.get(simulation_id))
+                if timer is not None:
+                    timer.mark("snapshot")
+            self.publish(simulation_id, sim_data, PROTOCOL_FULL)
+        protocols.discard(PROTOCOL_FULL)
+        if protocols:
+            stream = self.streams.setdefault(simulation_id, StateStream())
+            delta = stream.delta(simulation, include_events)
+            if timer is not None:
+                timer.mark("delta")
+            if PROTOCOL_DELTA in protocols:
+                self.publish(simulation_id, delta, PROTOCOL_DELTA)
+
+            # 二进制订阅者：位置编码为二进制帧，状态变化和事件仍以JSON发送
+            meta = split_delta(delta)
+            for protocol in protocols:
+                precision = parse_binary_format(protocol)
+                if precision is None:
+                    continue
+                frame = encode_positions(simulation["world"], delta["seq"], delta["step"],
+                                         simulation["environment_size"], precision)
+                self.publish(simulation_id, [frame, meta] if delta_has_changes(meta) else frame, protocol)
+
+    def _finish(self, simulation_id: int):
+        """模拟停止后保存剩余记录并发布最终状态"""
+        simulation = self.simulation_service.simulations.get(simulation_id)
+        if simulation is None:
+            self.streams.pop(simulation_id, None)
+            return
+        self.recorder.finish(simulation_id, self.simulation_service._simulation_to_dict(simulation))
+        # 最终状态帧的事件已在最后一步发布过
+        self._publish_tick(simulation_id, simulation, include_events=False)
@@ -0,0 +1,225 @@
+"""
+压缩轨迹块存储
+
+agent_positions 每个智能体每个采样步一行，两个浮点数要付出六十多字节加索引的代价。
+轨迹块把一个模拟连续 chunk_steps 步、全部智能体的位置保存为 trajectory_chunks 的一行：
+
+    steps:     int32 步数差分，zlib压缩
+    positions: float32 (步数, 智能体数, 2)；沿时间轴对相邻步的位逐位异或（平滑轨迹的高位大多为0），
+               再按字节重排（把每个float的同一字节放在一起），最后zlib压缩。编码无损。
+
+按步数范围读取只需解码与范围相交的少数几行。
+
+默认只写轨迹块（TRAJECTORY_STORAGE=chunks）。回放、导出和最终快照的轨迹历史都优先读取轨迹块，
+没有轨迹块的旧模拟仍从 agent_positions 读取，因此已有数据无需迁移；旧行随数据清理自然淘汰。
+"""
+import json
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.db_models import TrajectoryChunk
+from app.models.world import WorldState
+from app.services.persistence_writer import PersistenceWriter
+
+CODEC = "xor-shuffle-zlib"
+
+# 位置历史的存储方式
+STORAGE_ROWS = "rows"  # 只写 agent_positions
+STORAGE_CHUNKS = "chunks"  # 只写 trajectory_chunks
+STORAGE_BOTH = "both"
+STORAGES = (STORAGE_ROWS, STORAGE_CHUNKS, STORAGE_BOTH)
+
+AGENT_TYPES = {WorldState.KIND_HUNTER: "hunter", WorldState.KIND_TARGET: "target"}
+
+
+def encode_chunk(steps: np.ndarray, positions: np.ndarray, level: int = 6) -> Tuple[bytes, bytes]:
+    """
+    编码一个轨迹块
+
+    Args:
+        steps: (T,) 递增的步数
+        positions: (T, N, 2) 位置
+        level: zlib压缩级别
+
+    Returns:
+        Tuple: (步数数据, 位置数据)
+    """
+    steps = np.asarray(steps, dtype=np.int64)
+    step_deltas = np.diff(steps, prepend=0).astype("<i4")
+
+    bits = np.ascontiguousarray(positions, dtype="<f4").view("<u4").reshape(len(steps), -1)
+    residuals = bits.copy()
+    residuals[1:] ^= bits[:-1]
+    shuffled = residuals.view(np.uint8).reshape(-1, 4).T
+
+    return zlib.compress(step_deltas.tobytes(), level), zlib.compress(shuffled.tobytes(), level)
+
+
+def decode_chunk(steps_data: bytes, positions_data: bytes, num_agents: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    解码一个轨迹块
+
+    Returns:
+        Tuple: (步数 (T,), 位置 (T, N, 2) float32)
+    """
+    steps = np.cumsum(np.frombuffer(zlib.decompress(steps_data), dtype="<i4"), dtype=np.int64)
+
+    shuffled = np.frombuffer(zlib.decompress(positions_data), dtype=np.uint8).reshape(4, -1)
+    residuals = np.ascontiguousarray(shuffled.T).view("<u4").reshape(len(steps), num_agents * 2)
+    bits = np.bitwise_xor.accumulate(residuals, axis=0)
+    return steps, bits.view("<f4").reshape(len(steps), num_agents, 2).astype(np.float32)
+
+
+class _ChunkBuffer:
+    """一个模拟正在累积的轨迹块"""
+
+    def __init__(self, world: WorldState, capacity: int):
+        count = len(world.agents)
+        self.world = world
+        self.agents = [[AGENT_TYPES[int(kind)], int(agent_id)]
+                       for kind, agent_id in zip(world.kinds[:count], world.ids[:count])]
+        self.steps = np.zeros(capacity, dtype=np.int64)
+        self.positions = np.zeros((capacity, count, 2), dtype=np.float32)
+        self.size = 0
+
+    def full(self) -> bool:
+        return self.size == len(self.steps)
+
+
+class TrajectoryChunkWriter:
+    """
+    轨迹块写入器
+
+    每步把世界状态的位置数组复制进内存中的块缓冲区，攒满 chunk_steps 步后编码为一行，
+    交给持久化写入器。模拟重置（世界状态被替换）或步数回退时先写出当前块。
+    """
+
+    def __init__(self, writer: PersistenceWriter, chunk_steps: int = None, compression_level: int = None):
+        """
+        初始化轨迹块写入器
+
+        Args:
+            writer: 持久化写入器
+            chunk_steps: 每块的步数
+            compression_level: zlib压缩级别
+        """
+        self.writer = writer
+        self.chunk_steps = chunk_steps or settings.TRAJECTORY_CHUNK_STEPS
+        self.compression_level = compression_level if compression_level is not None else settings.TRAJECTORY_COMPRESSION_LEVEL
+        self._buffers: Dict[int, _ChunkBuffer] = {}
+
+    def append(self, simulation_id: int, step: int, world: WorldState):
+        """记录一步全部智能体的位置"""
+        buffer = self._buffers.get(simulation_id)
+        if buffer is not None and buffer.world is world and buffer.size and step == buffer.steps[buffer.size - 1]:
+            # 同一步再次记录（例如结束后的最终状态），覆盖最后一行
+            buffer.positions[buffer.size - 1] = world.positions[:len(buffer.agents)]
+            return
+        if buffer is not None and (buffer.world is not world or (buffer.size and step < buffer.steps[buffer.size - 1])):
+            self.flush(simulation_id)
+            buffer = None
+        if buffer is None:
+            buffer = self._buffers[simulation_id] = _ChunkBuffer(world, self.chunk_steps)
+
+        buffer.steps[buffer.size] = step
+        buffer.positions[buffer.size] = world.positions[:len(buffer.agents)]
+        buffer.size += 1
+        if buffer.full():
+            self.flush(simulation_id)
+
+    def flush(self, simulation_id: int):
+        """写出模拟未满的轨迹块"""
+        buffer = self._buffers.pop(simulation_id, None)
+        if buffer is None or not buffer.size:
+            return
+        steps = buffer.steps[:buffer.size]
+        steps_data, positions_data = encode_chunk(steps, buffer.positions[:buffer.size], self.compression_level)
+        self.writer.insert(TrajectoryChunk.__table__, [{
+            "simulation_id": simulation_id,
+            "start_step": int(steps[0]),
+            "end_step": int(steps[-1]),
+            "num_steps": buffer.size,
+            "num_agents": len(buffer.agents),
+            "agents": json.dumps(buffer.agents),
+            "codec": CODEC,
+            "steps": steps_data,
+            "positions": positions_data,
+        }])
+
+    def discard(self, simulation_id: int):
+        """丢弃模拟未写出的轨迹块（模拟已删除）"""
+        self._buffers.pop(simulation_id, None)
+
+    def flush_all(self):
+        """写出所有模拟未满的轨迹块"""
+        for simulation_id in list(self._buffers):
+            self.flush(simulation_id)
+
+
+class Trajectory:
+    """解码后的一段轨迹"""
+
+    def __init__(self, steps: np.ndarray, positions: np.ndarray, agents: List[List]):
+        self.steps = steps  # (T,)
+        self.positions = positions  # (T, N, 2) float32
+        self.agents = agents  # [[类型, agent_id], ...]，与positions第二维对应
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def agent(self, agent_type: str, agent_id: int) -> np.ndarray:
+        """单个智能体的轨迹 (T, 2)"""
+        return self.positions[:, self.agents.index([agent_type, agent_id])]
+
+
+def read_trajectory(db: Session, simulation_id: int,
+                    from_step: Optional[int] = None, to_step: Optional[int] = None) -> Trajectory:
+    """
+    读取并解码模拟在 [from_step, to_step] 范围内的轨迹
+
+    只查询与范围相交的轨迹块。模拟重置时记录器会删除上一轮的轨迹块；同一步仍有多份记录时
+    （重置前写入的旧数据）取最新写入的一份，智能体布局以最新的块为准，布局不同的旧块被忽略。
+    """
+    query = db.query(TrajectoryChunk).filter(TrajectoryChunk.simulation_id == simulation_id)
+    if from_step is not None:
+        query = query.filter(TrajectoryChunk.end_step >= from_step)
+    if to_step is not None:
+        query = query.filter(TrajectoryChunk.start_step <= to_step)
+    chunks = query.order_by(TrajectoryChunk.id.desc()).all()
+    if not chunks:
+        return Trajectory(np.zeros(0, dtype=np.int64), np.zeros((0, 0, 2), dtype=np.float32), [])
+
+    agents = json.loads(chunks[0].agents)
+    steps, positions = [], []
+    for chunk in chunks:
+        if json.loads(chunk.agents) != agents:
+            continue
+        chunk_steps, chunk_positions = decode_chunk(chunk.steps, chunk.positions, chunk.num_agents)
+        keep = np.ones(len(chunk_steps), dtype=bool)
+        if from_step is not None:
+            keep &= chunk_steps >= from_step
+        if to_step is not None:
+            keep &= chunk_steps <= to_step
+        steps.append(chunk_steps[keep])
+        positions.append(chunk_positions[keep])
+
+    steps = np.concatenate(steps)
+    positions = np.concatenate(positions)
+    # 块按写入时间倒序排列，np.unique 取每一步第一次出现（即最新）的记录并按步数排序
+    steps, first = np.unique(steps, return_index=True)
+    return Trajectory(steps, positions[first], agents)
+
+
+def trajectory_bounds(db: Session, simulation_id: int) -> Optional[Tuple[int, int]]:
+    """模拟已保存轨迹的步数范围 (首步, 末步)，没有轨迹时返回None"""
+    first, last = db.query(
+        func.min(TrajectoryChunk.start_step), func.max(TrajectoryChunk.end_step)
+    ).filter(TrajectoryChunk.simulation_id == simulation_id).one()
+    if first is None:
+        return None
+    return int(first), int(last)
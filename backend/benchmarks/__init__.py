@@ -0,0 +1,16 @@
+"""
+模拟性能基准测试
+
+在 backend 目录下运行：
+
+    python -m benchmarks                          # quick 配置，结果打印到终端
+    python -m benchmarks --profile full -o results.json
+    python -m benchmarks -o results.json --baseline benchmarks/baseline.json --fail-on-regression
+
+分三组测量，分别定位耗时：
+    step           SimulationService.advance_simulation（不含实时节奏的sleep）的吞吐、单步延迟分位数和峰值内存
+    serialization  _simulation_to_dict 及其JSON编码
+    persistence    SimulationRecorder 生成快照/位置记录的耗时和 PersistenceWriter 写入临时SQLite库的吞吐
+
+所有场景使用固定种子，同一机器上的结果可以和保存的基线逐项比较。
+"""
@@ -0,0 +1,157 @@
+"""基准测试命令行入口：python -m benchmarks --help"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.cases import ALGORITHMS, DEFAULT_SEED, PROFILES, build_cases, profile
+from benchmarks.compare import compare, format_comparisons
+from benchmarks.measure import measure_persistence, measure_serialization, measure_steps
+
+GROUPS = ("step", "serialization", "persistence")
+
+# 序列化和持久化与算法无关，只按规模测量，使用该障碍物数量
+FIXED_OBSTACLES = 8
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def _str_list(value: str) -> List[str]:
+    return [item.strip().upper() for item in value.split(",") if item.strip()]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _max_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux以KB为单位，macOS以字节为单位
+    return usage if sys.platform == "darwin" else usage * 1024
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="模拟步进、序列化和持久化的性能基准")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="quick", help="预设的场景规模")
+    parser.add_argument("--groups", type=lambda value: value.split(","), default=list(GROUPS),
+                        help=f"要运行的测量组，逗号分隔: {','.join(GROUPS)}")
+    parser.add_argument("--algorithms", type=_str_list, default=list(ALGORITHMS), help="逗号分隔的算法")
+    parser.add_argument("--sizes", type=_int_list, help="逗号分隔的智能体总数，覆盖预设")
+    parser.add_argument("--obstacles", type=_int_list, help="逗号分隔的障碍物数量，覆盖预设")
+    parser.add_argument("--steps", type=int, help="每个场景计时的步数，覆盖预设")
+    parser.add_argument("--max-seconds", type=float, help="每个场景计时的时间上限，覆盖预设")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="场景随机种子")
+    parser.add_argument("-o", "--output", help="结果JSON的保存路径")
+    parser.add_argument("--baseline", help="用于比较的基线JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判为回退的相对变差比例")
+    parser.add_argument("--fail-on-regression", action="store_true", help="有回退时以非零状态退出")
+    args = parser.parse_args(argv)
+
+    unknown = [group for group in args.groups if group not in GROUPS]
+    if unknown:
+        parser.error(f"unknown groups: {','.join(unknown)}")
+    unknown = [algorithm for algorithm in args.algorithms if algorithm not in ALGORITHMS]
+    if unknown:
+        parser.error(f"unknown algorithms: {','.join(unknown)}")
+    return args
+
+
+def run(args: argparse.Namespace) -> Dict:
+    """按参数运行各测量组，返回完整结果"""
+    options = profile(args.profile, {"sizes": args.sizes, "obstacles": args.obstacles,
+                                     "steps": args.steps, "max_seconds": args.max_seconds})
+    results = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "profile": args.profile,
+            "options": options,
+            "seed": args.seed,
+        }
+    }
+
+    if "step" in args.groups:
+        results["step"] = []
+        for case in build_cases(args.algorithms, options["sizes"], options["obstacles"]):
+            record = measure_steps(case, options["steps"], options["max_seconds"], options["memory_steps"], args.seed)
+            results["step"].append(record)
+            print(f"step           {case.name:<36}{record['steps_per_second']:>10.1f} steps/s"
+                  f"  p50 {record['p50_ms']:.3f} ms  p99 {record['p99_ms']:.3f} ms"
+                  f"  peak {record['peak_memory_bytes'] / 2 ** 20:.1f} MiB", flush=True)
+
+    fixed_cases = build_cases(["APF"], options["sizes"], [FIXED_OBSTACLES])
+    if "serialization" in args.groups:
+        results["serialization"] = []
+        for case in fixed_cases:
+            record = measure_serialization(case, options["serialization_repeats"], args.seed)
+            results["serialization"].append(record)
+            print(f"serialization  {case.name:<36}to_dict {record['to_dict']['mean_ms']:.3f} ms"
+                  f"  without history {record['to_dict_without_history']['mean_ms']:.3f} ms"
+                  f"  json {record['json_encode']['mean_ms']:.3f} ms  {record['payload_bytes']} bytes", flush=True)
+
+    if "persistence" in args.groups:
+        results["persistence"] = []
+        for case in fixed_cases:
+            record = measure_persistence(case, options["persistence_steps"], args.seed)
+            results["persistence"].append(record)
+            rows_per_second = record["rows_per_second"] or 0.0
+            print(f"persistence    {case.name:<36}record {(record['record'] or {}).get('mean_ms', 0.0):.3f} ms"
+                  f"  {record['written_rows']} rows @ {rows_per_second:.0f} rows/s"
+                  f"  dropped {record['dropped_rows']}", flush=True)
+
+    results["meta"]["max_rss_bytes"] = _max_rss_bytes()
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    # 模拟中的捕获/逃脱日志会淹没输出
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    started = time.perf_counter()
+    results = run(args)
+    results["meta"]["duration_seconds"] = round(time.perf_counter() - started, 3)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"结果已保存到 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        comparisons = compare(results, baseline, args.threshold)
+        print(format_comparisons(comparisons))
+        regressions = [item for item in comparisons if item["regression"]]
+        print(f"{len(comparisons)}项比较，{len(regressions)}项回退（阈值 {args.threshold:.0%}）")
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
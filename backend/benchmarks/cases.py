@@ -0,0 +1,87 @@
+"""基准场景定义"""
+import itertools
+import math
+from typing import Dict, List, Optional
+
+ALGORITHMS = ("APF", "CONSENSUS", "ENCIRCLEMENT")
+
+# 预设配置：quick 用于日常对比，full 覆盖到2000个智能体和16个障碍物
+PROFILES = {
+    "quick": {
+        "sizes": [5, 50, 200],
+        "obstacles": [0, 8],
+        "steps": 200,
+        "max_seconds": 10.0,
+        "memory_steps": 20,
+        "serialization_repeats": 50,
+        "persistence_steps": 200,
+    },
+    "full": {
+        "sizes": [5, 50, 200, 1000, 2000],
+        "obstacles": [0, 3, 8, 16],
+        "steps": 500,
+        "max_seconds": 30.0,
+        "memory_steps": 50,
+        "serialization_repeats": 100,
+        "persistence_steps": 500,
+    },
+}
+
+DEFAULT_SEED = 20240601
+
+
+class Case:
+    """一个基准场景：算法、智能体总数和障碍物数量"""
+
+    def __init__(self, algorithm_type: str, agents: int, num_obstacles: int):
+        self.algorithm_type = algorithm_type
+        self.agents = agents
+        self.num_obstacles = num_obstacles
+
+    @property
+    def num_targets(self) -> int:
+        # 约每5个智能体中1个目标，至少1个
+        return max(1, self.agents // 5)
+
+    @property
+    def num_hunters(self) -> int:
+        return self.agents - self.num_targets
+
+    @property
+    def environment_size(self) -> int:
+        # 智能体增多时扩大环境，保持密度与默认配置（500x500内6个智能体）同一量级
+        return max(500, int(math.sqrt(self.agents / 6) * 500))
+
+    @property
+    def name(self) -> str:
+        return f"{self.algorithm_type}/n={self.agents}/obstacles={self.num_obstacles}"
+
+    def config(self, seed: int, max_steps: int) -> Dict:
+        """create_simulation 使用的配置"""
+        return {
+            "environment_size": self.environment_size,
+            "num_hunters": self.num_hunters,
+            "num_targets": self.num_targets,
+            "algorithm_type": self.algorithm_type,
+            "num_obstacles": self.num_obstacles,
+            "max_steps": max_steps,
+            "seed": seed,
+        }
+
+
+def build_cases(algorithms: List[str], sizes: List[int], obstacles: List[int]) -> List[Case]:
+    """算法 x 规模 x 障碍物数量的全部组合"""
+    for agents in sizes:
+        if agents < 2:
+            raise ValueError(f"A case needs at least 2 agents, got {agents}")
+    return [Case(algorithm, agents, num_obstacles)
+            for algorithm, agents, num_obstacles in itertools.product(algorithms, sizes, obstacles)]
+
+
+def profile(name: str, overrides: Optional[Dict] = None) -> Dict:
+    """读取预设配置并应用命令行覆盖（值为None的项忽略）"""
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile: {name}")
+    result = dict(PROFILES[name])
+    result.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    return result
@@ -0,0 +1,68 @@
+"""与基线结果比较"""
+from typing import Dict, List, Optional
+
+# 每组结果用于比较的指标：(指标路径, 越大越好)
+METRICS = {
+    "step": [("steps_per_second", True), ("p99_ms", False), ("peak_memory_bytes", False)],
+    "serialization": [("to_dict.mean_ms", False), ("to_dict_without_history.mean_ms", False),
+                      ("json_encode.mean_ms", False)],
+    "persistence": [("record.mean_ms", False), ("rows_per_second", True)],
+}
+
+
+def _metric(record: Dict, path: str) -> Optional[float]:
+    value = record
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(results: Dict, baseline: Dict, threshold: float) -> List[Dict]:
+    """
+    逐项比较结果与基线
+
+    Args:
+        results: 本次结果
+        baseline: 基线结果（同样格式）
+        threshold: 允许的相对变差比例，如0.2表示变差超过20%判为回退
+
+    Returns:
+        List[Dict]: 每个可比较指标的 group、name、metric、baseline、current、change 和 regression；
+                    change 为相对变化，正数表示变好
+    """
+    comparisons = []
+    for group, metrics in METRICS.items():
+        previous = {record["name"]: record for record in baseline.get(group, [])}
+        for record in results.get(group, []):
+            base_record = previous.get(record["name"])
+            if base_record is None:
+                continue
+            for path, higher_is_better in metrics:
+                current, reference = _metric(record, path), _metric(base_record, path)
+                if current is None or not reference:
+                    continue
+                change = (current - reference) / reference
+                if not higher_is_better:
+                    change = -change
+                comparisons.append({
+                    "group": group,
+                    "name": record["name"],
+                    "metric": path,
+                    "baseline": reference,
+                    "current": current,
+                    "change": change,
+                    "regression": change < -threshold,
+                })
+    return comparisons
+
+
+def format_comparisons(comparisons: List[Dict]) -> str:
+    """比较结果的文本表格，回退项标记为 REGRESSION"""
+    lines = [f"{'group':<14}{'case':<36}{'metric':<34}{'baseline':>14}{'current':>14}{'change':>9}"]
+    for item in comparisons:
+        flag = "  REGRESSION" if item["regression"] else ""
+        lines.append(f"{item['group']:<14}{item['name']:<36}{item['metric']:<34}"
+                     f"{item['baseline']:>14.4g}{item['current']:>14.4g}{item['change']:>+9.1%}{flag}")
+    return "\n".join(lines)
@@ -0,0 +1,229 @@
+"""
+基准测量
+
+每个函数返回一条结果记录（纯字典，可直接写入JSON），name 字段在同一组内唯一，用于与基线对应。
+"""
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, apply_sqlite_pragmas
+from app.models.db_models import Agent, Simulation
+from app.services.persistence_writer import PersistenceWriter
+from app.services.simulation_recorder import SimulationRecorder, load_agent_keys
+from app.services.simulation_service import SimulationService
+
+from benchmarks.cases import Case
+
+# 达到时间预算后，至少也要测够的步数
+MIN_STEPS = 10
+
+# 序列化和持久化测量前先运行的步数，使轨迹历史达到稳定长度
+WARMUP_STEPS = 50
+
+SIMULATION_ID = 1
+
+
+def latency_summary(seconds: List[float]) -> Dict:
+    """延迟样本（秒）的毫秒统计"""
+    values = np.asarray(seconds) * 1000.0
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(p50),
+        "p90_ms": float(p90),
+        "p99_ms": float(p99),
+        "max_ms": float(values.max()),
+    }
+
+
+def _start(service: SimulationService, case: Case, seed: int, max_steps: int) -> Dict:
+    service.create_simulation(SIMULATION_ID, case.config(seed, max_steps))
+    service.start_simulation(SIMULATION_ID)
+    return service.simulations[SIMULATION_ID]
+
+
+def _advance(service: SimulationService, case: Case, seed: int, max_steps: int, restarts: int) -> int:
+    """推进一步；模拟已结束时先用下一个种子重新创建，返回累计重建次数"""
+    if not service.simulations[SIMULATION_ID]["is_running"]:
+        restarts += 1
+        _start(service, case, seed + restarts, max_steps)
+    service.advance_simulation(SIMULATION_ID, persist=False)
+    return restarts
+
+
+def measure_steps(case: Case, steps: int, max_seconds: float, memory_steps: int, seed: int) -> Dict:
+    """
+    测量 advance_simulation 的吞吐和单步延迟，另起一轮在 tracemalloc 下测峰值内存
+
+    模拟提前结束（全部捕获或逃脱）时用下一个种子重建后继续计时，重建本身不计入；
+    超过 max_seconds 后停止（至少 MIN_STEPS 步）
+    """
+    service = SimulationService()
+    _start(service, case, seed, steps + 1)
+    latencies = []
+    restarts = 0
+    started = time.perf_counter()
+    deadline = started + max_seconds
+    while len(latencies) < steps:
+        if not service.simulations[SIMULATION_ID]["is_running"]:
+            restarts += 1
+            _start(service, case, seed + restarts, steps + 1)
+        step_started = time.perf_counter()
+        service.advance_simulation(SIMULATION_ID, persist=False)
+        step_finished = time.perf_counter()
+        latencies.append(step_finished - step_started)
+        if step_finished > deadline and len(latencies) >= MIN_STEPS:
+            break
+
+    # 峰值内存包括创建模拟和推进 memory_steps 步，tracemalloc 会拖慢执行，因此与计时分开
+    tracemalloc.start()
+    try:
+        service = SimulationService()
+        _start(service, case, seed, memory_steps + 1)
+        memory_restarts = 0
+        for _ in range(memory_steps):
+            memory_restarts = _advance(service, case, seed, memory_steps + 1, memory_restarts)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    total = sum(latencies)
+    return {
+        "name": case.name,
+        "algorithm_type": case.algorithm_type,
+        "agents": case.agents,
+        "num_hunters": case.num_hunters,
+        "num_targets": case.num_targets,
+        "num_obstacles": case.num_obstacles,
+        "environment_size": case.environment_size,
+        "steps": len(latencies),
+        "restarts": restarts,
+        "steps_per_second": len(latencies) / total if total else None,
+        **latency_summary(latencies),
+        "peak_memory_bytes": peak,
+    }
+
+
+def measure_serialization(case: Case, repeats: int, seed: int) -> Dict:
+    """测量 _simulation_to_dict（含/不含轨迹历史）和完整状态的JSON编码"""
+    service = SimulationService()
+    _start(service, case, seed, WARMUP_STEPS + 1)
+    restarts = 0
+    for _ in range(WARMUP_STEPS):
+        restarts = _advance(service, case, seed, WARMUP_STEPS + 1, restarts)
+    simulation = service.simulations[SIMULATION_ID]
+
+    with_history, without_history, encode = [], [], []
+    payload = b""
+    for _ in range(repeats):
+        started = time.perf_counter()
+        sim_data = service._simulation_to_dict(simulation)
+        with_history.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        service._simulation_to_dict(simulation, include_history=False)
+        without_history.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        payload = json.dumps(sim_data).encode()
+        encode.append(time.perf_counter() - started)
+
+    return {
+        "name": case.name,
+        "agents": case.agents,
+        "num_obstacles": case.num_obstacles,
+        "repeats": repeats,
+        "to_dict": latency_summary(with_history),
+        "to_dict_without_history": latency_summary(without_history),
+        "json_encode": latency_summary(encode),
+        "payload_bytes": len(payload),
+    }
+
+
+def _prepare_database(engine, case: Case, simulation: Dict) -> None:
+    """建表并写入模拟和智能体记录（位置记录需要智能体主键）"""
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        db.add(Simulation(id=SIMULATION_ID, name=case.name, environment_size=case.environment_size,
+                          num_hunters=case.num_hunters, num_targets=case.num_targets,
+                          algorithm_type=case.algorithm_type))
+        for agent_type, agents in (("hunter", simulation["hunters"]), ("target", simulation["targets"])):
+            for agent in agents:
+                db.add(Agent(simulation_id=SIMULATION_ID, agent_id=agent.id, type=agent_type,
+                             start_position_x=float(agent.position[0]), start_position_y=float(agent.position[1])))
+        db.commit()
+    finally:
+        db.close()
+
+
+def measure_persistence(case: Case, steps: int, seed: int) -> Dict:
+    """
+    按调度器的方式记录 steps 步：每步追加轨迹块，到达快照间隔时写快照和位置记录
+
+    record_ms 为推进线程上记录器的耗时（不含序列化），写入吞吐来自写入线程写临时SQLite库的统计
+    """
+    service = SimulationService()
+    simulation = _start(service, case, seed, steps + 1)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "benchmark.db")
+        engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+        event.listen(engine, "connect", apply_sqlite_pragmas)
+        try:
+            _prepare_database(engine, case, simulation)
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            db = session_factory()
+            try:
+                agent_keys = load_agent_keys(db, SIMULATION_ID)
+            finally:
+                db.close()
+
+            writer = PersistenceWriter(session_factory=session_factory)
+            recorder = SimulationRecorder(writer)
+            track, record = [], []
+            for _ in range(steps):
+                if not simulation["is_running"]:
+                    break
+                service.advance_simulation(SIMULATION_ID, persist=False)
+
+                started = time.perf_counter()
+                recorder.track(SIMULATION_ID, simulation)
+                track.append(time.perf_counter() - started)
+
+                if recorder.should_record(simulation["step_count"], simulation.get("last_events")):
+                    sim_data = service._simulation_to_dict(simulation)
+                    started = time.perf_counter()
+                    recorder.record(SIMULATION_ID, sim_data, agent_keys)
+                    record.append(time.perf_counter() - started)
+
+            recorder.finish(SIMULATION_ID, service._simulation_to_dict(simulation))
+            writer.stop()
+            stats = writer.stats()
+            database_bytes = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        finally:
+            engine.dispose()
+
+    return {
+        "name": case.name,
+        "agents": case.agents,
+        "num_obstacles": case.num_obstacles,
+        "steps": len(track),
+        "snapshots": len(record),
+        "track": latency_summary(track) if track else None,
+        "record": latency_summary(record) if record else None,
+        "written_rows": stats["written_rows"],
+        "dropped_rows": stats["dropped_rows"],
+        "flushes": stats["flushes"],
+        "flush_seconds": stats["total_flush_seconds"],
+        "rows_per_second": stats["written_rows"] / stats["total_flush_seconds"] if stats["total_flush_seconds"] else None,
+        "database_bytes": database_bytes,
+    }
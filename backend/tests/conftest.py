@@ -0,0 +1,31 @@
+"""
+测试公共设置
+
+app.db_config 中的数据库路径由部署脚本生成，测试在导入 app 之前改用临时目录中的数据库文件。
+"""
+import os
+import shutil
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+_db_dir = tempfile.mkdtemp(prefix="crowdsensing-tests-")
+os.environ["SIMULATION_DB_FILE"] = os.path.join(_db_dir, "simulation.db")
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_db_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    """临时数据库（最新结构）的会话工厂"""
+    from app.database import Base
+    from app.models import db_models  # noqa: F401  注册全部表
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    engine.dispose()
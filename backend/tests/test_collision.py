@@ -0,0 +1,86 @@
+"""earliest_hits 的解析求交：长步长穿过障碍物（隧穿）也必须检出"""
+import numpy as np
+import pytest
+
+from app.models.collision import earliest_hits
+
+
+def sampled_first_hit(start, end, centers, radii, samples=4001):
+    """沿线段密集采样求最早进入任一障碍物的时刻，作为参照"""
+    t = np.linspace(0.0, 1.0, samples)
+    points = start + t[:, None] * (end - start)
+    inside = (np.linalg.norm(points[:, None, :] - centers[None, :, :], axis=2) <= radii[None, :]).any(axis=1)
+    return t[np.argmax(inside)] if inside.any() else np.inf
+
+
+def test_segment_tunnelling_through_small_obstacle_is_detected():
+    # 两端都在障碍物外，且步长远大于障碍物直径
+    starts = np.array([[0.0, 0.0]])
+    ends = np.array([[100.0, 0.0]])
+    centers = np.array([[50.0, 0.5]])
+    radii = np.array([2.0])
+
+    hit, time, obstacle, contacts, normals = earliest_hits(starts, ends, centers, radii)
+    assert hit[0] and obstacle[0] == 0
+    expected = (50.0 - np.sqrt(2.0 ** 2 - 0.5 ** 2)) / 100.0
+    assert time[0] == pytest.approx(expected)
+    assert np.linalg.norm(contacts[0] - centers[0]) == pytest.approx(radii[0])
+    np.testing.assert_allclose(normals[0], (contacts[0] - centers[0]) / radii[0])
+
+
+def test_earliest_of_several_obstacles():
+    starts = np.array([[0.0, 0.0]])
+    ends = np.array([[100.0, 0.0]])
+    centers = np.array([[80.0, 0.0], [30.0, 0.0], [55.0, 0.0]])
+    radii = np.array([5.0, 5.0, 5.0])
+
+    hit, time, obstacle, _, _ = earliest_hits(starts, ends, centers, radii)
+    assert hit[0] and obstacle[0] == 1
+    assert time[0] == pytest.approx(0.25)
+
+
+def test_start_inside_obstacle_hits_at_zero():
+    starts = np.array([[1.0, 0.0], [1.0, 0.0]])
+    ends = np.array([[50.0, 0.0], [1.0, 0.0]])
+    hit, time, _, contacts, _ = earliest_hits(starts, ends, np.array([[0.0, 0.0]]), np.array([3.0]))
+    assert hit.all()
+    np.testing.assert_array_equal(time, [0.0, 0.0])
+    np.testing.assert_array_equal(contacts, starts)
+
+
+def test_misses_keep_the_planned_end():
+    starts = np.array([[0.0, 0.0], [0.0, 0.0], [0.0, 0.0]])
+    ends = np.array([[100.0, 10.0], [40.0, 0.0], [0.0, 0.0]])
+    # 第一条从旁边经过，第二条停在障碍物前，第三条不移动
+    hit, time, _, contacts, normals = earliest_hits(starts, ends, np.array([[50.0, 0.0]]), np.array([3.0]))
+    assert not hit.any()
+    assert np.isinf(time).all()
+    np.testing.assert_array_equal(contacts, ends)
+    np.testing.assert_array_equal(normals, np.zeros((3, 2)))
+
+
+def test_no_obstacles_or_paths():
+    hit, time, _, contacts, _ = earliest_hits(np.ones((2, 2)), np.full((2, 2), 5.0), np.zeros((0, 2)), np.zeros(0))
+    assert not hit.any() and np.isinf(time).all()
+    np.testing.assert_array_equal(contacts, np.full((2, 2), 5.0))
+    hit, _, _, _, _ = earliest_hits(np.zeros((0, 2)), np.zeros((0, 2)), np.ones((1, 2)), np.ones(1))
+    assert hit.shape == (0,)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_dense_sampling(seed):
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(0, 500, size=(200, 2))
+    # 步长最长约150，远大于最小的障碍物
+    ends = starts + rng.uniform(-150, 150, size=(200, 2))
+    centers = rng.uniform(0, 500, size=(12, 2))
+    radii = rng.uniform(2, 30, size=12)
+
+    hit, time, _, _, _ = earliest_hits(starts, ends, centers, radii)
+    for row in range(len(starts)):
+        expected = sampled_first_hit(starts[row], ends[row], centers, radii)
+        if np.isinf(expected):
+            assert not hit[row]
+        else:
+            assert hit[row]
+            assert time[row] == pytest.approx(expected, abs=3e-4)
@@ -0,0 +1,87 @@
+"""轨迹降采样：始终保留首尾两点，下标升序且不重复"""
+import numpy as np
+import pytest
+
+from app.services.downsampling import METHODS, douglas_peucker, downsample, lttb, stride
+
+
+def random_walk(count, seed=0):
+    return np.cumsum(np.random.default_rng(seed).normal(0, 1, size=(count, 2)), axis=0)
+
+
+def assert_valid(indices, count, max_points=None):
+    assert indices.dtype.kind == "i"
+    if count:
+        assert indices[0] == 0 and indices[-1] == count - 1
+    assert np.all(np.diff(indices) > 0)
+    if max_points is not None:
+        assert len(indices) <= max(max_points, min(count, 2))
+
+
+COUNTS = [0, 1, 2, 3, 4, 10, 101, 1000]
+MAX_POINTS = [0, 1, 2, 3, 5, 50, 999, 1000, 5000]
+
+
+@pytest.mark.parametrize("count", COUNTS)
+@pytest.mark.parametrize("max_points", MAX_POINTS)
+def test_lttb_keeps_endpoints(count, max_points):
+    indices = lttb(random_walk(count), max_points)
+    assert_valid(indices, count, max_points)
+    if max_points >= count:
+        np.testing.assert_array_equal(indices, np.arange(count))
+
+
+@pytest.mark.parametrize("count", COUNTS)
+@pytest.mark.parametrize("max_points", MAX_POINTS)
+def test_douglas_peucker_keeps_endpoints(count, max_points):
+    indices = douglas_peucker(random_walk(count), max_points)
+    assert_valid(indices, count, max_points)
+
+
+@pytest.mark.parametrize("count", [2, 3, 10, 1000])
+@pytest.mark.parametrize("step", [1, 2, 7, 5000])
+def test_stride_keeps_endpoints(count, step):
+    assert_valid(stride(count, step), count)
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("step", [1, 3, 10])
+def test_downsample_keeps_endpoints(method, step):
+    indices = downsample(random_walk(1001, seed=3), method, max_points=40, step=step)
+    assert_valid(indices, 1001, None if method == "stride" else 40)
+
+
+def test_lttb_keeps_a_spike():
+    points = np.stack([np.arange(500.0), np.zeros(500)], axis=1)
+    points[250, 1] = 100.0
+    assert 250 in lttb(points, 20)
+
+
+def test_douglas_peucker_keeps_corners():
+    # 一条折线上的三个拐点
+    x = np.arange(300.0)
+    points = np.stack([x, np.where(x < 100, x, np.where(x < 200, 200 - x, x - 200))], axis=1)
+    np.testing.assert_array_equal(douglas_peucker(points, 4), [0, 100, 200, 299])
+    np.testing.assert_array_equal(douglas_peucker(points, epsilon=1e-9), [0, 100, 200, 299])
+
+
+@pytest.mark.parametrize("epsilon", [0.5, 2.0, 10.0])
+def test_douglas_peucker_epsilon_bounds_dropped_points(epsilon):
+    points = random_walk(500, seed=5)
+    indices = douglas_peucker(points, epsilon=epsilon)
+    assert_valid(indices, len(points))
+    for start, end in zip(indices[:-1], indices[1:]):
+        a, b = points[start], points[end]
+        inner = points[start + 1:end]
+        direction = b - a
+        length = np.hypot(*direction)
+        if length == 0:
+            distances = np.hypot(*(inner - a).T)
+        else:
+            distances = np.abs(direction[0] * (inner[:, 1] - a[1]) - direction[1] * (inner[:, 0] - a[0])) / length
+        assert np.all(distances <= epsilon)
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample(random_walk(10), "median")
@@ -0,0 +1,58 @@
+"""分阶段耗时与Prometheus文本输出"""
+from app.services.metrics import Histogram, MetricsRegistry, Profiler
+from app.services.simulation_service import SimulationService
+
+STEP_PHASES = {"index", "neighbors", "capture", "hunter_decision", "hunter_move", "evasion", "target_move"}
+
+
+def make_profiler():
+    registry = MetricsRegistry()
+    labels = ("simulation", "algorithm", "phase")
+    return registry, Profiler(registry.histogram("step_seconds", "step", labels),
+                              registry.histogram("websocket_seconds", "websocket", labels), enabled=True)
+
+
+def test_each_phase_is_observed_once_per_step():
+    _, profiler = make_profiler()
+    service = SimulationService(profiler=profiler)
+    service.create_simulation(1, {"environment_size": 300, "num_hunters": 5, "num_targets": 2,
+                                  "algorithm_type": "APF", "max_steps": 100, "seed": 3})
+    service.start_simulation(1)
+    steps = 0
+    while service.simulations[1]["is_running"] and steps < 10:
+        service.advance_simulation(1, persist=False)
+        steps += 1
+
+    counts = {key[2]: sum(series[:-1]) for key, series in profiler.step_histogram.values.items()}
+    assert counts == {phase: steps for phase in STEP_PHASES}
+
+
+def test_disabled_profiler_returns_no_timer():
+    _, profiler = make_profiler()
+    profiler.enabled = False
+    assert profiler.step_timer(1, "APF") is None
+    assert profiler.websocket_timer(1, "APF") is None
+
+
+def test_histogram_render_and_forget():
+    registry, profiler = make_profiler()
+    profiler.step_histogram.observe(0.002, "1", "APF", "index")
+    profiler.step_histogram.observe(0.3, "1", "APF", "index")
+    profiler.step_histogram.observe(0.002, "2", "APF", "index")
+    text = registry.render()
+    assert '# TYPE step_seconds histogram' in text
+    assert 'step_seconds_bucket{simulation="1",algorithm="APF",phase="index",le="0.0025"} 1' in text
+    assert 'step_seconds_bucket{simulation="1",algorithm="APF",phase="index",le="+Inf"} 2' in text
+    assert 'step_seconds_count{simulation="1",algorithm="APF",phase="index"} 2' in text
+
+    profiler.forget(1)
+    assert 'simulation="1"' not in registry.render()
+    assert 'simulation="2"' in registry.render()
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("h", "doc", buckets=(1.0, 2.0))
+    for value in (0.5, 1.0, 1.5, 3.0):
+        histogram.observe(value)
+    assert histogram.samples() == ['h_bucket{le="1.0"} 2', 'h_bucket{le="2.0"} 3', 'h_bucket{le="+Inf"} 4',
+                                   'h_sum 6.0', 'h_count 4']
@@ -0,0 +1,171 @@
+"""数据库迁移：旧数据库上的迁移与执行计划、迁移失败时的启动行为、auto_vacuum 转换"""
+import sqlite3
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, MIGRATIONS, apply_migrations, schema_version
+from app.models import db_models  # noqa: F401  注册全部表
+from app.services.export_service import fetch_position_page, fetch_snapshot_page
+from app.services.simulation_recorder import load_agent_keys
+from app.services.snapshot_store import reconstruct_snapshot
+
+# 迁移添加的索引和列；旧数据库中没有这些结构
+MIGRATION_INDEXES = [
+    "ix_agent_positions_agent_step",
+    "ix_simulation_snapshots_simulation_step",
+    "ix_agents_simulation_agent_type",
+    "ix_simulations_created_at_id",
+]
+MIGRATION_COLUMNS = [
+    ("simulation_snapshots", "kind"),
+    ("simulations", "seed"),
+    ("simulations", "trail_length"),
+]
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    """迁移前结构（user_version 为0）的数据库"""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as connection:
+        for index in MIGRATION_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX {index}")
+        for table, column in MIGRATION_COLUMNS:
+            connection.exec_driver_sql(f"ALTER TABLE {table} DROP COLUMN {column}")
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+    yield engine
+    engine.dispose()
+
+
+def query_plans(engine, operation):
+    """执行 operation(db)，返回其间每条SELECT语句的 EXPLAIN QUERY PLAN 明细"""
+    plans = []
+
+    def explain(connection, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            rows = cursor.connection.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            plans.append(" | ".join(row[-1] for row in rows))
+
+    event.listen(engine, "before_cursor_execute", explain)
+    db = sessionmaker(bind=engine)()
+    try:
+        operation(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", explain)
+    return plans
+
+
+# (名称, 查询, 应使用的索引)
+HISTORY_QUERIES = [
+    ("final snapshot", lambda db: reconstruct_snapshot(db, 1), "ix_simulation_snapshots_simulation_step"),
+    ("position export page", lambda db: fetch_position_page(db, 1, (10, 100), 500), "ix_agent_positions_agent_step"),
+    ("snapshot export page", lambda db: fetch_snapshot_page(db, 1, (10, 100), 500),
+     "ix_simulation_snapshots_simulation_step"),
+    ("agent keys", lambda db: load_agent_keys(db, 1), "ix_agents_simulation_agent_type"),
+]
+
+
+def schema(engine):
+    """(索引名集合, {表: 列名集合})"""
+    with engine.connect() as connection:
+        indexes = {row[0] for row in connection.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        columns = {table: {row[1] for row in connection.exec_driver_sql(f"PRAGMA table_info({table})")}
+                   for table, _ in MIGRATION_COLUMNS}
+    return indexes, columns
+
+
+def test_migrations_bring_legacy_database_to_latest_version(legacy_engine):
+    indexes, columns = schema(legacy_engine)
+    assert not indexes & set(MIGRATION_INDEXES)
+    assert not any(column in columns[table] for table, column in MIGRATION_COLUMNS)
+
+    assert apply_migrations(legacy_engine) == MIGRATIONS[-1][0]
+    assert schema_version(legacy_engine) == MIGRATIONS[-1][0]
+    indexes, columns = schema(legacy_engine)
+    assert set(MIGRATION_INDEXES) <= indexes
+    assert all(column in columns[table] for table, column in MIGRATION_COLUMNS)
+
+    # 再次执行不做任何事
+    assert apply_migrations(legacy_engine) == MIGRATIONS[-1][0]
+
+
+@pytest.mark.parametrize("name, operation, index", HISTORY_QUERIES, ids=[query[0] for query in HISTORY_QUERIES])
+def test_history_queries_search_migrated_indexes(legacy_engine, name, operation, index):
+    apply_migrations(legacy_engine)
+    plans = query_plans(legacy_engine, operation)
+    assert any(plan.startswith("SEARCH") and (f"USING INDEX {index}" in plan or f"USING COVERING INDEX {index}" in plan)
+               for plan in plans), plans
+
+
+def test_locked_migration_aborts_startup_without_dropping_tables(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from app import database
+    from app.config import settings
+    from app.main import app
+    from app.models.db_models import Simulation
+
+    assert database.init_db()
+    db = database.SessionLocal()
+    db.add(Simulation(name="kept"))
+    db.commit()
+    db.close()
+    with database.engine.begin() as connection:
+        connection.exec_driver_sql("PRAGMA user_version = 0")
+
+    # 另一个连接持有写锁超过 busy_timeout
+    monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT_MS", 100)
+    database.engine.dispose()
+    blocker = sqlite3.connect(database.db_file, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(Exception, match="locked"):
+            with TestClient(app):
+                pass
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+        database.engine.dispose()
+
+    db = database.SessionLocal()
+    try:
+        assert db.query(Simulation).filter(Simulation.name == "kept").count() == 1
+    finally:
+        db.close()
+    assert schema_version() == 0
+    assert apply_migrations() == MIGRATIONS[-1][0]
+
+
+def test_new_database_gets_configured_auto_vacuum():
+    from app import database
+    from app.config import settings
+
+    assert database.init_db()
+    assert database.auto_vacuum_mode() == settings.SQLITE_AUTO_VACUUM.upper()
+    assert database.check_auto_vacuum()
+
+
+def test_auto_vacuum_conversion_is_explicit(tmp_path):
+    from app import database
+    from app.config import settings
+
+    # 旧数据库：未设置 auto_vacuum（NONE）就已建表
+    engine = create_engine(f"sqlite:///{tmp_path / 'none.db'}")
+    Base.metadata.create_all(bind=engine)
+    event.listen(engine, "connect", database.apply_sqlite_pragmas)
+    engine.dispose()
+    try:
+        # 连接时不改变已有数据库的模式，启动检查只报告
+        assert database.auto_vacuum_mode(engine) == "NONE"
+        assert not database.check_auto_vacuum(engine)
+        assert database.auto_vacuum_mode(engine) == "NONE"
+
+        assert database.convert_auto_vacuum(engine)
+        assert database.auto_vacuum_mode(engine) == settings.SQLITE_AUTO_VACUUM.upper()
+        assert not database.convert_auto_vacuum(engine)
+    finally:
+        engine.dispose()
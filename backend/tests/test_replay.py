@@ -0,0 +1,168 @@
+"""轨迹回放：数据来源的选择、默认范围、起点状态重建与参数校验"""
+import numpy as np
+import pytest
+
+from app.models.db_models import Agent, Simulation
+from app.services.persistence_writer import PersistenceWriter
+from app.services.replay_service import SOURCE_CHUNKS, SOURCE_ROWS, load_replay
+from app.services.simulation_recorder import SimulationRecorder, load_agent_keys
+from app.services.simulation_service import SimulationService
+from tests.test_snapshot_store import SIMULATION_ID, agent_state, run_recorded, start
+
+STEPS = 25
+
+
+def replay(session_factory, **kwargs):
+    db = session_factory()
+    try:
+        return load_replay(db, SIMULATION_ID, **kwargs)
+    finally:
+        db.close()
+
+
+def recorded_positions(recorded, agent):
+    """记录时该智能体在回放各步的位置"""
+    positions = []
+    for step in agent["steps"]:
+        agents = {item["id"]: item for item in recorded[step][f"{agent['type']}s"]}
+        positions.append(agents[agent["id"]]["position"])
+    return positions
+
+
+@pytest.fixture
+def chunk_run(session_factory):
+    """按轨迹块记录 STEPS 步（关键帧间隔 10），返回 {步数: 记录时的状态}"""
+    writer = PersistenceWriter(session_factory=session_factory)
+    recorder = SimulationRecorder(writer, snapshot_interval=1, trajectory_storage="chunks", keyframe_interval=10)
+    recorder.trajectories.chunk_steps = 8
+    service = SimulationService()
+    start(service)
+    recorded = run_recorded(service, recorder, steps=STEPS)
+    recorder.finish(SIMULATION_ID, service._simulation_to_dict(service.simulations[SIMULATION_ID]))
+    writer.stop()
+    return recorded
+
+
+def test_chunk_replay_defaults_to_saved_range(session_factory, chunk_run):
+    result = replay(session_factory, max_points=None)
+
+    assert result["source"] == SOURCE_CHUNKS
+    assert (result["from_step"], result["to_step"]) == (1, STEPS)
+    assert result["agents"]
+    assert result["total_points"] == result["returned_points"] == STEPS * len(result["agents"])
+    for agent in result["agents"]:
+        assert agent["steps"] == list(range(1, STEPS + 1))
+        np.testing.assert_allclose(agent["positions"], recorded_positions(chunk_run, agent), atol=1e-3)
+    assert result["state"]["step"] == 1
+    assert agent_state(result["state"]["hunters"]) == agent_state(chunk_run[1]["hunters"])
+
+
+@pytest.mark.parametrize("from_step, to_step", [(14, 20), (10, None), (12, STEPS)])
+def test_state_is_rebuilt_at_from_step(session_factory, chunk_run, from_step, to_step):
+    result = replay(session_factory, from_step=from_step, to_step=to_step, max_points=None)
+
+    expected_to = STEPS if to_step is None else to_step
+    assert (result["from_step"], result["to_step"]) == (from_step, expected_to)
+    for agent in result["agents"]:
+        assert agent["steps"] == list(range(from_step, expected_to + 1))
+    # 关键帧在第 1、11、21 步，from_step 处的状态由关键帧加增量帧重建
+    state = result["state"]
+    assert state["step"] == from_step
+    assert agent_state(state["hunters"]) == agent_state(chunk_run[from_step]["hunters"])
+    assert agent_state(state["targets"]) == agent_state(chunk_run[from_step]["targets"])
+    assert state["captured_targets_count"] == chunk_run[from_step]["captured_targets_count"]
+
+
+def test_downsampling_keeps_range_endpoints(session_factory, chunk_run):
+    result = replay(session_factory, max_points=5)
+
+    assert result["total_points"] == STEPS * len(result["agents"])
+    for agent in result["agents"]:
+        assert len(agent["steps"]) == 5
+        assert (agent["steps"][0], agent["steps"][-1]) == (1, STEPS)
+        np.testing.assert_allclose(agent["positions"], recorded_positions(chunk_run, agent), atol=1e-3)
+
+
+def test_replay_after_reset_only_covers_new_run(session_factory):
+    writer = PersistenceWriter(session_factory=session_factory)
+    recorder = SimulationRecorder(writer, snapshot_interval=1, trajectory_storage="chunks", keyframe_interval=10)
+    recorder.trajectories.chunk_steps = 2
+    service = SimulationService()
+    start(service)
+    run_recorded(service, recorder, steps=7)
+    service.reset_simulation(SIMULATION_ID)
+    recorder.reset(SIMULATION_ID)
+    service.start_simulation(SIMULATION_ID)
+    recorded = run_recorded(service, recorder, steps=3)
+    recorder.finish(SIMULATION_ID, service._simulation_to_dict(service.simulations[SIMULATION_ID]))
+    writer.stop()
+
+    result = replay(session_factory, max_points=None)
+    assert (result["from_step"], result["to_step"]) == (1, 3)
+    for agent in result["agents"]:
+        assert agent["steps"] == [1, 2, 3]
+        np.testing.assert_allclose(agent["positions"], recorded_positions(recorded, agent), atol=1e-3)
+    assert agent_state(result["state"]["hunters"]) == agent_state(recorded[1]["hunters"])
+
+
+def test_row_replay_without_chunks(session_factory):
+    service = SimulationService()
+    start(service)
+    sim_data = service._simulation_to_dict(service.simulations[SIMULATION_ID])
+    db = session_factory()
+    db.add(Simulation(id=SIMULATION_ID, name="rows"))
+    db.add_all([Agent(simulation_id=SIMULATION_ID, agent_id=agent["id"], type=agent_type,
+                      start_position_x=agent["position"][0], start_position_y=agent["position"][1])
+                for agent_type, agents in (("hunter", sim_data["hunters"]), ("target", sim_data["targets"]))
+                for agent in agents])
+    db.commit()
+    agent_keys = load_agent_keys(db, SIMULATION_ID)
+    db.close()
+
+    writer = PersistenceWriter(session_factory=session_factory)
+    recorder = SimulationRecorder(writer, snapshot_interval=1, trajectory_storage="rows", keyframe_interval=10)
+    recorded = {}
+    simulation = service.simulations[SIMULATION_ID]
+    for _ in range(12):
+        service.advance_simulation(SIMULATION_ID, persist=False)
+        sim_data = service._simulation_to_dict(simulation)
+        recorder.record(SIMULATION_ID, sim_data, agent_keys)
+        recorded[sim_data["step_count"]] = sim_data
+    writer.stop()
+
+    result = replay(session_factory, max_points=None)
+    assert result["source"] == SOURCE_ROWS
+    assert (result["from_step"], result["to_step"]) == (1, 12)
+    assert len(result["agents"]) == len(agent_keys)
+    for agent in result["agents"]:
+        assert agent["steps"] == list(range(1, 13))
+        np.testing.assert_allclose(agent["positions"], recorded_positions(recorded, agent), atol=1e-3)
+
+    result = replay(session_factory, from_step=5, to_step=8, max_points=None)
+    assert (result["from_step"], result["to_step"]) == (5, 8)
+    assert all(agent["steps"] == [5, 6, 7, 8] for agent in result["agents"])
+    assert result["state"]["step"] == 5
+    assert agent_state(result["state"]["hunters"]) == agent_state(recorded[5]["hunters"])
+
+
+def test_replay_without_history(session_factory):
+    result = replay(session_factory)
+    assert result["source"] == SOURCE_ROWS
+    assert result["from_step"] is result["to_step"] is result["state"] is None
+    assert result["agents"] == [] and result["total_points"] == 0
+
+
+def test_unknown_method_is_rejected(session_factory, chunk_run):
+    with pytest.raises(ValueError):
+        replay(session_factory, method="nearest")
+
+
+@pytest.mark.parametrize("query", ["method=nearest", "from_step=9&to_step=3"])
+def test_replay_route_rejects_bad_parameters(query):
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    # 参数在访问数据库之前校验，不需要启动应用
+    response = TestClient(app).get(f"/api/v1/simulations/{SIMULATION_ID}/replay?{query}")
+    assert response.status_code == 400
@@ -0,0 +1,104 @@
+"""相同种子和配置的模拟逐步相同"""
+import numpy as np
+import pytest
+
+from app.models.random_stream import MAX_SEED, RandomStream, new_seed
+from app.services.batch_service import run_headless
+from app.services.simulation_service import SimulationService
+
+ALGORITHMS = ("APF", "CONSENSUS", "ENCIRCLEMENT")
+
+
+def config(algorithm_type, seed):
+    return {"environment_size": 300, "num_hunters": 5, "num_targets": 2, "algorithm_type": algorithm_type,
+            "max_steps": 80, "seed": seed}
+
+
+def trajectory(service, simulation_id, steps=80):
+    """推进至结束或 steps 步，返回每步全部智能体的位置"""
+    simulation = service.simulations[simulation_id]
+    service.start_simulation(simulation_id)
+    frames = [simulation["world"].positions.copy()]
+    while simulation["is_running"] and len(frames) <= steps:
+        service.advance_simulation(simulation_id, persist=False)
+        frames.append(simulation["world"].positions.copy())
+    return frames
+
+
+def assert_same_frames(first, second):
+    assert len(first) == len(second)
+    for a, b in zip(first, second):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize("algorithm_type", ALGORITHMS)
+def test_same_seed_same_run(algorithm_type):
+    runs = []
+    for _ in range(2):
+        service = SimulationService()
+        service.create_simulation(1, config(algorithm_type, 1234))
+        runs.append((trajectory(service, 1), service._simulation_to_dict(service.simulations[1], include_history=False)))
+    assert_same_frames(runs[0][0], runs[1][0])
+    assert runs[0][1]["obstacles"] == runs[1][1]["obstacles"]
+
+
+@pytest.mark.parametrize("algorithm_type", ALGORITHMS)
+def test_interleaved_simulations_do_not_share_randomness(algorithm_type):
+    alone = SimulationService()
+    alone.create_simulation(1, config(algorithm_type, 77))
+    expected = trajectory(alone, 1)
+
+    # 同一服务中交替推进两个模拟
+    service = SimulationService()
+    service.create_simulation(1, config(algorithm_type, 77))
+    service.create_simulation(2, config(algorithm_type, 78))
+    service.start_simulation(1)
+    service.start_simulation(2)
+    frames = [service.simulations[1]["world"].positions.copy()]
+    while service.simulations[1]["is_running"] and len(frames) <= 80:
+        service.advance_simulation(1, persist=False)
+        frames.append(service.simulations[1]["world"].positions.copy())
+        if service.simulations[2]["is_running"]:
+            service.advance_simulation(2, persist=False)
+    assert_same_frames(frames, expected)
+
+
+def test_different_seeds_differ():
+    frames = []
+    for seed in (1, 2):
+        service = SimulationService()
+        service.create_simulation(1, config("APF", seed))
+        frames.append(service.simulations[1]["world"].positions.copy())
+    assert not np.array_equal(frames[0], frames[1])
+
+
+def test_generated_seed_is_recorded_and_replays():
+    service = SimulationService()
+    sim_data = service.create_simulation(1, config("APF", None))
+    assert 0 <= sim_data["seed"] <= MAX_SEED
+
+    replay = SimulationService()
+    replay.create_simulation(1, config("APF", sim_data["seed"]))
+    assert_same_frames(trajectory(service, 1), trajectory(replay, 1))
+
+
+def test_headless_runs_repeat_with_seed():
+    first, second = run_headless(config("CONSENSUS", 5), 3), run_headless(config("CONSENSUS", 5), 3)
+    first.pop("wall_time")
+    second.pop("wall_time")
+    assert first == second
+    assert first["seed"] == 8
+
+
+def test_random_stream_sequence_does_not_depend_on_batching():
+    small, large = RandomStream(99, batch_size=4), RandomStream(99, batch_size=1000)
+    sizes = [1, 3, None, 17, 250, 2, None, 40]
+    for size in sizes:
+        np.testing.assert_array_equal(small.random(size), large.random(size))
+    np.testing.assert_array_equal(small.unit_vectors(5), large.unit_vectors(5))
+
+
+def test_new_seed_range():
+    seeds = {new_seed() for _ in range(20)}
+    assert len(seeds) == 20
+    assert all(0 <= seed <= MAX_SEED for seed in seeds)
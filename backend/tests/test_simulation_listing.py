@@ -0,0 +1,94 @@
+"""模拟列表的键集分页"""
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.db_models import Simulation
+from app.services.simulation_listing import (
+    DEFAULT_FIELDS, SimulationCountCache, decode_cursor, encode_cursor, list_simulations, parse_fields,
+)
+from tests.test_migrations import query_plans
+
+BASE_TIME = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def db(session_factory):
+    db = session_factory()
+    # 每三条共用一个创建时间，检验 id 作为次序键
+    db.add_all([Simulation(id=index, name=f"sim {index}", algorithm_type="APF" if index % 2 else "ACO",
+                           created_at=BASE_TIME + timedelta(minutes=index // 3))
+                for index in range(1, 58)])
+    db.commit()
+    yield db
+    db.close()
+
+
+def expected_order(db, **filters):
+    query = db.query(Simulation.id).filter_by(**filters)
+    return [row.id for row in query.order_by(Simulation.created_at.desc(), Simulation.id.desc())]
+
+
+def all_pages(db, limit, **filters):
+    cache = SimulationCountCache(30.0)
+    ids, cursor, pages = [], None, 0
+    while True:
+        items, cursor, total = list_simulations(db, cache, limit, cursor, ("id",), **filters)
+        ids.extend(item["id"] for item in items)
+        pages += 1
+        if cursor is None:
+            return ids, pages, total
+
+
+@pytest.mark.parametrize("limit", [1, 3, 10, 57, 100])
+def test_pages_cover_every_row_once_in_order(db, limit):
+    ids, pages, total = all_pages(db, limit)
+    assert ids == expected_order(db)
+    assert total == 57
+    assert pages == max(1, -(-57 // limit))
+
+
+def test_pages_with_filter(db):
+    ids, _, total = all_pages(db, 4, algorithm_type="ACO")
+    assert ids == expected_order(db, algorithm_type="ACO")
+    assert total == len(ids) == 28
+
+
+def test_rows_created_between_pages_do_not_shift_later_pages(db):
+    cache = SimulationCountCache(30.0)
+    first, cursor, _ = list_simulations(db, cache, 10, None, ("id",))
+    db.add(Simulation(id=100, name="new", created_at=BASE_TIME + timedelta(days=1)))
+    db.commit()
+    second, _, _ = list_simulations(db, cache, 10, cursor, ("id",))
+    assert [item["id"] for item in first + second] == expected_order(db)[1:21]
+
+
+def test_cursor_page_searches_index(db, session_factory):
+    cursor = encode_cursor(BASE_TIME + timedelta(minutes=10), 31)
+    plans = query_plans(session_factory.kw["bind"],
+                        lambda session: list_simulations(session, SimulationCountCache(30.0), 10, cursor))
+    assert any(plan.startswith("SEARCH simulations USING INDEX ix_simulations_created_at_id") for plan in plans), plans
+
+
+def test_cursor_round_trip_and_errors():
+    created_at = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+def test_parse_fields():
+    assert parse_fields(None) == DEFAULT_FIELDS
+    assert parse_fields("id, name,id") == ("id", "name")
+    with pytest.raises(ValueError):
+        parse_fields("id,password")
+
+
+def test_count_cache_until_invalidated(db):
+    cache = SimulationCountCache(300.0)
+    assert list_simulations(db, cache, 5)[2] == 57
+    db.add(Simulation(id=200, name="new", created_at=BASE_TIME))
+    db.commit()
+    assert list_simulations(db, cache, 5)[2] == 57
+    cache.invalidate()
+    assert list_simulations(db, cache, 5)[2] == 58
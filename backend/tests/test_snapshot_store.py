@@ -0,0 +1,147 @@
+"""关键帧 + 增量快照：记录后重建的状态与记录时一致"""
+import json
+
+import numpy as np
+import pytest
+
+from app.models.db_models import SimulationSnapshot
+from app.services.persistence_writer import PersistenceWriter
+from app.services.simulation_recorder import SimulationRecorder
+from app.services.simulation_service import SimulationService
+from app.services.snapshot_store import (
+    KIND_DELTA, KIND_KEYFRAME, SnapshotEncoder, apply_agent_diff, diff_agents, reconstruct_snapshot, strip_history,
+)
+from app.services.trajectory_store import read_trajectory, trajectory_bounds
+
+SIMULATION_ID = 1
+CONFIG = {"environment_size": 300, "num_hunters": 6, "num_targets": 3, "algorithm_type": "APF",
+          "max_steps": 120, "seed": 11}
+
+
+def agent_state(agents):
+    """与JSON往返后的快照状态可比较的形式 {id: 状态}"""
+    return {agent["id"]: agent for agent in json.loads(json.dumps(strip_history(agents)))}
+
+
+def run_recorded(service, recorder, steps=None):
+    """推进模拟并逐步记录，返回 {步数: 记录时的状态}"""
+    simulation = service.simulations[SIMULATION_ID]
+    recorded = {}
+    while simulation["is_running"] and (steps is None or len(recorded) < steps):
+        service.advance_simulation(SIMULATION_ID, persist=False)
+        recorder.track(SIMULATION_ID, simulation)
+        sim_data = service._simulation_to_dict(simulation)
+        recorder.record(SIMULATION_ID, sim_data, {})
+        recorded[sim_data["step_count"]] = sim_data
+    return recorded
+
+
+def start(service):
+    service.create_simulation(SIMULATION_ID, dict(CONFIG))
+    service.start_simulation(SIMULATION_ID)
+
+
+@pytest.fixture
+def recorder(session_factory):
+    writer = PersistenceWriter(session_factory=session_factory)
+    yield SimulationRecorder(writer, snapshot_interval=1, keyframe_interval=10)
+    writer.stop()
+
+
+def snapshot_kinds(session_factory):
+    db = session_factory()
+    try:
+        return [kind for kind, in db.query(SimulationSnapshot.kind).order_by(SimulationSnapshot.id)]
+    finally:
+        db.close()
+
+
+def test_reconstruct_matches_every_recorded_step(session_factory, recorder):
+    service = SimulationService()
+    start(service)
+    recorded = run_recorded(service, recorder)
+    recorder.writer.stop()
+
+    kinds = snapshot_kinds(session_factory)
+    assert kinds[0] == KIND_KEYFRAME and KIND_DELTA in kinds
+    db = session_factory()
+    try:
+        for step, sim_data in recorded.items():
+            snapshot = reconstruct_snapshot(db, SIMULATION_ID, step)
+            assert snapshot["step"] == step
+            assert agent_state(snapshot["hunters"]) == agent_state(sim_data["hunters"])
+            assert agent_state(snapshot["targets"]) == agent_state(sim_data["targets"])
+            assert snapshot["captured_targets_count"] == sim_data["captured_targets_count"]
+            assert snapshot["escaped_targets_count"] == sim_data["escaped_targets_count"]
+        assert reconstruct_snapshot(db, SIMULATION_ID)["step"] == max(recorded)
+        assert reconstruct_snapshot(db, SIMULATION_ID, 0) is None
+    finally:
+        db.close()
+
+
+def test_reset_replaces_previous_run(session_factory, recorder):
+    # 小轨迹块，使上一轮的块在重置前已经写出
+    recorder.trajectories.chunk_steps = 2
+    service = SimulationService()
+    start(service)
+    run_recorded(service, recorder, steps=7)
+    service.reset_simulation(SIMULATION_ID)
+    recorder.reset(SIMULATION_ID)
+    service.start_simulation(SIMULATION_ID)
+    recorded = run_recorded(service, recorder, steps=3)
+    simulation = service.simulations[SIMULATION_ID]
+    recorder.finish(SIMULATION_ID, service._simulation_to_dict(simulation))
+    recorder.writer.stop()
+
+    # 只剩新一轮的记录，且从关键帧开始
+    assert snapshot_kinds(session_factory) == [KIND_KEYFRAME] + [KIND_DELTA] * 2
+    db = session_factory()
+    try:
+        snapshot = reconstruct_snapshot(db, SIMULATION_ID)
+        assert trajectory_bounds(db, SIMULATION_ID) == (1, 3)
+        trajectory = read_trajectory(db, SIMULATION_ID)
+    finally:
+        db.close()
+    assert snapshot["step"] == max(recorded)
+    assert agent_state(snapshot["hunters"]) == agent_state(recorded[max(recorded)]["hunters"])
+    np.testing.assert_array_equal(trajectory.steps, [1, 2, 3])
+    np.testing.assert_array_equal(trajectory.positions[-1],
+                                  simulation["world"].positions[:len(trajectory.agents)].astype(np.float32))
+
+
+def test_encoders_are_released(recorder):
+    service = SimulationService()
+    start(service)
+    run_recorded(service, recorder, steps=2)
+    simulation = service.simulations[SIMULATION_ID]
+    recorder.finish(SIMULATION_ID, service._simulation_to_dict(simulation))
+    assert SIMULATION_ID not in recorder.encoders
+
+    run_recorded(service, recorder, steps=1)
+    assert SIMULATION_ID in recorder.encoders
+    recorder.forget(SIMULATION_ID)
+    assert SIMULATION_ID not in recorder.encoders
+
+
+def test_keyframe_interval_and_events():
+    encoder = SnapshotEncoder(keyframe_interval=3)
+    hunters = [{"id": 1, "position": [0.0, 0.0]}]
+    targets = [{"id": 1, "position": [5.0, 5.0]}, {"id": 2, "position": [9.0, 9.0]}]
+
+    def encode(step, captured=0, alive=targets):
+        return encoder.encode({"step_count": step, "hunters": hunters, "targets": alive,
+                               "captured_targets_count": captured, "escaped_targets_count": 0})["kind"]
+
+    assert [encode(step) for step in (1, 2, 3, 4)] == [KIND_KEYFRAME, KIND_DELTA, KIND_DELTA, KIND_KEYFRAME]
+    # 捕获事件立即写关键帧
+    assert encode(5, captured=1, alive=targets[1:]) == KIND_KEYFRAME
+    assert encode(6, captured=1, alive=targets[1:]) == KIND_DELTA
+
+
+def test_agent_diff_round_trip():
+    previous = [{"id": 1, "position": [0, 0], "status": "a"}, {"id": 2, "position": [1, 1]}]
+    current = [{"id": 1, "position": [0, 3], "status": "a"}, {"id": 3, "position": [2, 2]}]
+    changes = diff_agents(previous, current)
+    assert {"id": 1, "position": [0, 3]} in changes
+    assert {"id": 2, "removed": True} in changes
+    assert apply_agent_diff(previous, changes) == current
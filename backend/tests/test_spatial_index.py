@@ -0,0 +1,71 @@
+"""SpatialGrid 半径查询与暴力计算的对照"""
+import numpy as np
+import pytest
+
+from app.models.spatial_index import SpatialGrid
+
+
+def brute_force(points, positions, radii):
+    """全部 (查询点行号, 被索引点下标, 距离)，按行号和下标排序"""
+    distances = np.linalg.norm(points[:, None, :] - positions[None, :, :], axis=2)
+    rows, indices = np.nonzero(distances <= np.asarray(radii)[:, None])
+    return rows, indices, distances[rows, indices]
+
+
+def assert_same_pairs(actual, expected):
+    for actual_values, expected_values in zip(actual, expected):
+        np.testing.assert_allclose(actual_values, expected_values)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("cell_size, radius", [(50.0, 50.0), (50.0, 120.0), (200.0, 30.0)])
+def test_query_pairs_matches_brute_force(seed, cell_size, radius):
+    rng = np.random.default_rng(seed)
+    # 包含负坐标和网格边界上的点
+    positions = rng.uniform(-300, 700, size=(400, 2))
+    positions[:10] = np.round(positions[:10] / cell_size) * cell_size
+    points = rng.uniform(-350, 750, size=(60, 2))
+
+    grid = SpatialGrid(positions, cell_size)
+    radii = np.full(len(points), radius)
+    assert_same_pairs(grid.query_pairs(points, radius), brute_force(points, positions, radii))
+
+
+def test_per_point_radii():
+    rng = np.random.default_rng(7)
+    positions = rng.uniform(0, 500, size=(300, 2))
+    points = rng.uniform(0, 500, size=(40, 2))
+    radii = rng.uniform(0, 150, size=len(points))
+
+    grid = SpatialGrid(positions, 100.0)
+    assert_same_pairs(grid.query_pairs(points, radii), brute_force(points, positions, radii))
+
+
+def test_slack_covers_points_moved_after_indexing():
+    rng = np.random.default_rng(3)
+    positions = rng.uniform(0, 500, size=(300, 2))
+    slack = 15.0
+    angles = rng.uniform(0, 2 * np.pi, size=len(positions))
+    moved = positions + slack * np.stack([np.cos(angles), np.sin(angles)], axis=1)
+    points = rng.uniform(0, 500, size=(50, 2))
+
+    grid = SpatialGrid(positions, 40.0, slack=slack)
+    radii = np.full(len(points), 40.0)
+    assert_same_pairs(grid.query_pairs(points, 40.0, moved), brute_force(points, moved, radii))
+
+
+def test_single_point_query():
+    positions = np.array([[0.0, 0.0], [3.0, 4.0], [10.0, 0.0], [-5.0, 0.0]])
+    grid = SpatialGrid(positions, 5.0)
+    np.testing.assert_array_equal(grid.query(np.array([0.0, 0.0]), 5.0), [0, 1, 3])
+
+
+def test_empty_index_and_empty_queries():
+    grid = SpatialGrid(np.zeros((0, 2)), 10.0)
+    assert len(grid) == 0
+    rows, indices, distances = grid.query_pairs(np.array([[1.0, 1.0]]), 10.0)
+    assert len(rows) == len(indices) == len(distances) == 0
+
+    grid = SpatialGrid(np.array([[1.0, 1.0]]), 10.0)
+    rows, _, _ = grid.query_pairs(np.zeros((0, 2)), 10.0)
+    assert len(rows) == 0
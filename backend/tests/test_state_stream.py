@@ -0,0 +1,55 @@
+"""增量状态流：关键帧加其后的增量帧即为完整状态"""
+from app.services.simulation_service import SimulationService
+from app.services.state_stream import STATE_NAMES, StateStream
+
+CONFIG = {"environment_size": 300, "num_hunters": 5, "num_targets": 2, "algorithm_type": "CONSENSUS",
+          "max_steps": 200, "seed": 21}
+
+
+def hunter_states(simulation):
+    world = simulation["world"]
+    return {hunter.id: STATE_NAMES[int(world.states[world.slots_of([hunter])[0]])]
+            for hunter in simulation["hunters"]}
+
+
+def apply(view, frame):
+    """客户端按协议维护的猎手状态"""
+    if frame["type"] == "keyframe":
+        view.clear()
+    view.update(frame["states"])
+    return view
+
+
+def test_late_keyframe_plus_deltas_has_every_hunter_state():
+    service = SimulationService()
+    service.create_simulation(1, dict(CONFIG))
+    service.start_simulation(1)
+    simulation = service.simulations[1]
+    stream = StateStream()
+
+    early, late = {}, None
+    apply(early, stream.keyframe(simulation, {}))
+    for step in range(40):
+        service.advance_simulation(1, persist=False)
+        frame = stream.delta(simulation)
+        apply(early, frame)
+        if late is not None:
+            apply(late, frame)
+        elif step == 15:
+            # 中途加入（或重新同步）的客户端
+            late = apply({}, stream.keyframe(simulation, {}))
+            assert late == hunter_states(simulation)
+        if not simulation["is_running"]:
+            break
+        assert early == hunter_states(simulation)
+        if late is not None:
+            assert late == early
+
+
+def test_keyframe_does_not_advance_sequence():
+    service = SimulationService()
+    service.create_simulation(1, dict(CONFIG))
+    stream = StateStream()
+    assert stream.keyframe(service.simulations[1], {})["seq"] == 0
+    assert stream.delta(service.simulations[1])["seq"] == 1
+    assert stream.keyframe(service.simulations[1], {})["seq"] == 1
@@ -0,0 +1,84 @@
+"""参数扫描任务的进度：结束后释放、重启后遗留的任务"""
+import asyncio
+import json
+
+import pytest
+
+from app.models.db_models import SweepJob
+from app.services.sweep_service import (
+    STATUS_COMPLETED, STATUS_FAILED, STATUS_PENDING, STATUS_RUNNING, FINISHED_STATUSES, SweepService, expand_cells,
+    fail_orphaned_sweeps,
+)
+
+
+@pytest.fixture
+def app_db():
+    """应用自身的数据库（测试临时目录中）"""
+    from app import database
+
+    assert database.init_db()
+    return database
+
+
+def add_job(session_factory, status):
+    db = session_factory()
+    try:
+        job = SweepJob(status=status, cells="[]", repetitions=1, total_runs=4, completed_runs=1)
+        db.add(job)
+        db.commit()
+        return job.id
+    finally:
+        db.close()
+
+
+def test_orphaned_jobs_are_marked_failed(session_factory):
+    statuses = [STATUS_PENDING, STATUS_RUNNING, *FINISHED_STATUSES]
+    ids = [add_job(session_factory, status) for status in statuses]
+
+    db = session_factory()
+    try:
+        assert fail_orphaned_sweeps(db) == 2
+        jobs = {job.id: job for job in db.query(SweepJob)}
+    finally:
+        db.close()
+    assert [jobs[job_id].status for job_id in ids] == [STATUS_FAILED, STATUS_FAILED, *FINISHED_STATUSES]
+    assert all(jobs[job_id].error and jobs[job_id].finished_at for job_id in ids[:2])
+    assert all(jobs[job_id].error is None for job_id in ids[2:])
+
+
+def test_progress_is_released_after_final_publish(app_db):
+    async def run():
+        service = SweepService(max_workers=1, runs_per_task=1)
+        try:
+            job = await service.submit(expand_cells(configs=[{"max_steps": 20}]), repetitions=2)
+            queue = service.subscribe(job["id"])
+            updates = []
+            while not updates or updates[-1]["status"] not in FINISHED_STATUSES:
+                updates.append(await asyncio.wait_for(queue.get(), 60))
+            await asyncio.sleep(0)
+            return job["id"], updates, dict(service.progress)
+        finally:
+            await service.shutdown()
+
+    sweep_id, updates, progress = asyncio.run(run())
+    assert updates[-1]["status"] == STATUS_COMPLETED and updates[-1]["completed_runs"] == 2
+    assert progress == {}
+    db = app_db.SessionLocal()
+    try:
+        assert db.query(SweepJob).filter(SweepJob.id == sweep_id).one().status == STATUS_COMPLETED
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("status", [STATUS_RUNNING, STATUS_FAILED])
+def test_progress_stream_without_live_progress_closes(app_db, status):
+    from fastapi.testclient import TestClient
+
+    from app.config import settings
+    from app.main import app
+
+    sweep_id = add_job(app_db.SessionLocal, status)
+    with TestClient(app).stream("GET", f"{settings.API_PREFIX}{settings.API_V1_STR}/sweeps/{sweep_id}/progress",
+                                timeout=10) as response:
+        events = [line for line in response.iter_lines() if line]
+    assert [json.loads(event[len("data: "):])["status"] for event in events] == [status]
@@ -0,0 +1,62 @@
+"""TrajectoryBuffer 与 deque(maxlen) 的逐点对照"""
+from collections import deque
+
+import numpy as np
+import pytest
+
+from app.models.trajectory import INITIAL_ALLOCATION, TrajectoryBuffer
+
+
+def points(count, start=0):
+    return [np.array([float(i), float(-i)]) for i in range(start, start + count)]
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 5, INITIAL_ALLOCATION, INITIAL_ALLOCATION + 1, 100])
+def test_ring_keeps_most_recent_points_in_order(capacity):
+    buffer = TrajectoryBuffer(capacity)
+    expected = deque(maxlen=capacity)
+    for point in points(3 * capacity + 7):
+        buffer.append(point)
+        expected.append(point)
+        assert len(buffer) == len(expected)
+        np.testing.assert_array_equal(buffer.view(), np.array(expected))
+    assert buffer.tolist() == [list(point) for point in expected]
+
+
+def test_last_returns_contiguous_view_without_copy():
+    buffer = TrajectoryBuffer(8)
+    for point in points(21):
+        buffer.append(point)
+    recent = buffer.last(3)
+    np.testing.assert_array_equal(recent, [[18, -18], [19, -19], [20, -20]])
+    assert np.shares_memory(recent, buffer._data)
+    assert buffer.last(0).shape == (0, 2)
+    assert len(buffer.last(100)) == 8
+
+
+def test_append_copies_the_position():
+    buffer = TrajectoryBuffer(4)
+    position = np.array([1.0, 2.0])
+    buffer.append(position)
+    position[0] = 99.0
+    np.testing.assert_array_equal(buffer[-1], [1.0, 2.0])
+
+
+def test_initial_position():
+    buffer = TrajectoryBuffer(4, np.array([3.0, 4.0]))
+    assert buffer.tolist() == [[3.0, 4.0]]
+
+
+@pytest.mark.parametrize("new_capacity", [1, 3, 10, 50])
+def test_resize_keeps_most_recent_points(new_capacity):
+    buffer = TrajectoryBuffer(10)
+    for point in points(25):
+        buffer.append(point)
+    buffer.resize(new_capacity)
+    expected = deque(points(25)[-10:], maxlen=new_capacity)
+    np.testing.assert_array_equal(buffer.view(), np.array(expected))
+
+    for point in points(60, start=25):
+        buffer.append(point)
+        expected.append(point)
+    np.testing.assert_array_equal(buffer.view(), np.array(expected))
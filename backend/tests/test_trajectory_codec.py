@@ -0,0 +1,56 @@
+"""轨迹块编码的无损往返"""
+import numpy as np
+import pytest
+
+from app.services.trajectory_store import decode_chunk, encode_chunk
+
+
+def random_walk(rng, steps, agents):
+    start = rng.uniform(0, 500, size=(1, agents, 2))
+    return (start + np.cumsum(rng.normal(0, 3, size=(steps, agents, 2)), axis=0)).astype(np.float32)
+
+
+def assert_round_trip(steps, positions, level=6):
+    steps_data, positions_data = encode_chunk(steps, positions, level)
+    decoded_steps, decoded_positions = decode_chunk(steps_data, positions_data, positions.shape[1])
+    np.testing.assert_array_equal(decoded_steps, steps)
+    assert decoded_positions.dtype == np.float32
+    # 逐位相同（包括 -0.0 和 NaN）
+    np.testing.assert_array_equal(decoded_positions.view(np.uint32),
+                                  np.asarray(positions, dtype=np.float32).view(np.uint32))
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("steps, agents", [(1, 1), (2, 3), (256, 6), (300, 50)])
+def test_random_walk_round_trip(seed, steps, agents):
+    rng = np.random.default_rng(seed)
+    assert_round_trip(np.arange(10, 10 + steps), random_walk(rng, steps, agents))
+
+
+def test_irregular_steps_round_trip():
+    rng = np.random.default_rng(1)
+    steps = np.cumsum(rng.integers(1, 50, size=100)) + 1000
+    assert_round_trip(steps, random_walk(rng, 100, 4))
+
+
+@pytest.mark.parametrize("level", [0, 1, 9])
+def test_compression_levels_round_trip(level):
+    assert_round_trip(np.arange(64), random_walk(np.random.default_rng(2), 64, 5), level)
+
+
+def test_special_values_round_trip():
+    positions = np.array([[[0.0, -0.0]], [[np.nan, np.inf]], [[-np.inf, 1e-45]], [[3.4e38, -1.0]]], dtype=np.float32)
+    assert_round_trip(np.arange(4), positions)
+
+
+def test_float64_input_is_stored_as_float32():
+    positions = np.random.default_rng(3).uniform(0, 500, size=(8, 2, 2))
+    steps_data, positions_data = encode_chunk(np.arange(8), positions)
+    _, decoded = decode_chunk(steps_data, positions_data, 2)
+    np.testing.assert_array_equal(decoded, positions.astype(np.float32))
+
+
+def test_smooth_trajectory_compresses():
+    positions = random_walk(np.random.default_rng(4), 256, 20)
+    _, positions_data = encode_chunk(np.arange(256), positions)
+    assert len(positions_data) < positions.nbytes